@@ -5,25 +5,106 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+import time
+
 from flask import Flask
-from database import init_database, add_sample_data
+from database import init_database, add_sample_data, use_patron_triggers
 from routes import register_blueprints
+from cli import register_commands
+from instrumentation import install_perf_hooks, DEFAULT_RING_SIZE
+from metrics import install_metrics_hooks
+import sqltrace
+import db_writer
+import scheduler
+from services import search_index
+
 
+def _env_flag(name: str, default: str = '') -> bool:
+    return os.environ.get(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
 
-def create_app():
+
+def create_app(config=None):
     """
     Application factory function to create and configure Flask app.
+    `config` (optional dict) overrides the defaults below, e.g. in tests.
     """
+    started = time.perf_counter()
+    timings = {}
+    mark = started
+
+    def _lap(phase):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[phase] = round((now - mark) * 1000.0, 3)
+        mark = now
+
     app = Flask(__name__)
     # Minimal secret key for flash messages (not security critical in coursework)
     app.config['SECRET_KEY'] = 'dev-secret-key'
+    # Seed the demo books into an empty catalog on startup (opt-in; see `flask seed-sample`)
+    app.config['SEED_SAMPLE_DATA'] = _env_flag('LIBRARY_SEED_SAMPLE_DATA')
+    # Per-request timing hooks, /debug/perf and Server-Timing headers (opt-in)
+    app.config['PERF_INSTRUMENTATION'] = _env_flag('LIBRARY_PERF_INSTRUMENTATION')
+    app.config['PERF_RING_SIZE'] = int(os.environ.get('LIBRARY_PERF_RING_SIZE', DEFAULT_RING_SIZE))
+    # Prometheus /metrics endpoint and request/DB latency recording (on by default)
+    app.config['METRICS_ENABLED'] = _env_flag('LIBRARY_METRICS', '1')
+    # SQL tracing, slow-query log and /debug/sql statement stats (opt-in)
+    app.config['SQL_TRACE'] = _env_flag('LIBRARY_SQL_TRACE')
+    app.config['SQL_SLOW_MS'] = float(os.environ.get('LIBRARY_SQL_SLOW_MS', sqltrace.DEFAULT_SLOW_MS))
+    # Engine behind /search: 'scan' (filter every book) or 'index' (in-memory inverted index)
+    app.config['SEARCH_ENGINE'] = os.environ.get('LIBRARY_SEARCH_ENGINE', 'scan')
+    # Build the in-memory search index now instead of on the first suggestion (serve.py turns this on)
+    app.config['SEARCH_INDEX_PRELOAD'] = _env_flag('LIBRARY_SEARCH_INDEX_PRELOAD')
+    # Route borrow/return/availability writes through one group-commit writer thread (opt-in)
+    app.config['GROUP_COMMIT'] = _env_flag('LIBRARY_GROUP_COMMIT')
+    # Keep patrons.active_loans/outstanding_fees current in the borrow/return writes ('app')
+    # or with SQLite triggers ('triggers'); every process sharing the database must agree
+    app.config['PATRON_COUNTERS'] = os.environ.get('LIBRARY_PATRON_COUNTERS', 'app')
+    # Run the maintenance jobs (scheduler.default_jobs) in a background thread; with several
+    # workers only the one holding the scheduler lease runs them (opt-in)
+    app.config['SCHEDULER'] = _env_flag('LIBRARY_SCHEDULER')
+    if config:
+        app.config.update(config)
+    _lap('config')
+
+    # Bring the schema up to date (a single PRAGMA read when it already is). Pre-forked
+    # workers skip this: serve.py initializes the schema once in the master process.
+    if app.config.get('INIT_DATABASE', True):
+        init_database()
+    use_patron_triggers(app.config['PATRON_COUNTERS'] == 'triggers', install=app.config.get('INIT_DATABASE', True))
+    _lap('schema')
+    if app.config['SEED_SAMPLE_DATA']:
+        add_sample_data()
+    _lap('seed')
+    if app.config['SEARCH_INDEX_PRELOAD']:
+        stats = search_index.get_index().stats()
+        app.logger.info('search index: %d titles, %d authors, %.1f MB', stats['titles'], stats['authors'],
+                        sum(stats['memory_bytes'].values()) / 1e6)
+    _lap('search_index')
 
-    # Ensure DB exists and has sample data
-    init_database()
-    add_sample_data()
+    if app.config['METRICS_ENABLED']:
+        install_metrics_hooks(app)
+    if app.config['PERF_INSTRUMENTATION']:
+        install_perf_hooks(app, app.config['PERF_RING_SIZE'])
+    if app.config['SQL_TRACE']:
+        sqltrace.enable(app.config['SQL_SLOW_MS'])
+    if app.config['GROUP_COMMIT']:
+        # Started after the hooks so its connection is observed by metrics/tracing.
+        db_writer.start()
+    if app.config['SCHEDULER']:
+        scheduler.start()
+    _lap('hooks')
 
     # Register blueprints
     register_blueprints(app)
+    register_commands(app)
+    _lap('blueprints')
+
+    timings['total'] = round((mark - started) * 1000.0, 3)
+    app.extensions['startup_timings'] = timings
+    app.logger.info('startup took %.1f ms (%s)', timings['total'],
+                    ', '.join(f'{k}={v:.1f}ms' for k, v in timings.items() if k != 'total'))
     return app
 
 
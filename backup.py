@@ -0,0 +1,203 @@
+"""
+backup.py
+Online backups and restores of the library database.
+
+backup_database copies the live database with sqlite3.Connection.backup, a batch of
+pages per step with a short sleep in between, so writers keep committing while it
+runs. The source connection holds one read transaction for the whole copy: in WAL mode
+that pins a snapshot, so the copy is consistent and concurrent commits do not force
+the backup API to restart from page 0 (which, under steady borrow traffic, it
+otherwise does on nearly every step). The copy is checked with PRAGMA integrity_check
+and can be stored zlib-compressed (gzip framing, so `gunzip` reads it too).
+
+restore_database verifies a snapshot and moves it into place; it is meant for a
+stopped app or a fresh container (serve.py restores LIBRARY_RESTORE_FROM on startup
+while the database is still empty).
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import database
+
+BACKUP_PAGES = 256      # pages copied per step
+BACKUP_SLEEP = 0.005    # seconds between steps
+COMPRESS_LEVEL = 6
+_CHUNK = 1 << 20
+_GZIP_MAGIC = b'\x1f\x8b'
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+# Same expression migration 2 seeds catalog_version with.
+_NOW_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+def is_empty_database(path: str) -> bool:
+    """True for a missing file or a database without books or borrow records (e.g. schema only)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    conn = sqlite3.connect(path)
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return all(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is None
+                   for table in ('books', 'borrow_records') if table in tables)
+    except sqlite3.DatabaseError:
+        return False  # not a database we can read: never overwrite it implicitly
+    finally:
+        conn.close()
+
+
+def _integrity_check(path: str) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        conn.close()
+    return '; '.join(r[0] for r in rows)
+
+
+def _compress(src: str, dest: str, level: int) -> None:
+    comp = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(_CHUNK), b''):
+            fout.write(comp.compress(chunk))
+        fout.write(comp.flush())
+
+
+def _decompress(src: str, dest: str) -> None:
+    decomp = zlib.decompressobj(_GZIP_WBITS)
+    with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(_CHUNK), b''):
+            fout.write(decomp.decompress(chunk))
+        fout.write(decomp.flush())
+    if not decomp.eof:
+        raise ValueError(f'{src} is truncated')
+
+
+def is_compressed(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(2) == _GZIP_MAGIC
+
+
+def backup_database(dest: str, compress: bool = False, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP,
+                    verify: bool = True, source: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Snapshot `source` (default database.DATABASE) into `dest` while the app keeps running.
+    The file appears at `dest` only once it is complete (and verified). Raises ValueError
+    if the integrity check fails. Returns stats: pages, steps, bytes, stored_bytes, seconds.
+    """
+    source = source or database.DATABASE
+    started = time.perf_counter()
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.backup-', suffix='.db', dir=dest_dir)
+    os.close(fd)
+    steps = 0
+    total_pages = 0
+
+    def _progress(status, remaining, total):
+        nonlocal steps, total_pages
+        steps += 1
+        total_pages = total
+
+    try:
+        src = database.get_db_connection(source)
+        dst = sqlite3.connect(tmp)
+        try:
+            # Pin one snapshot for the whole copy (see module docstring).
+            src.execute('BEGIN')
+            src.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+            src.backup(dst, pages=pages, progress=_progress, sleep=sleep)
+            src.rollback()
+            # A standalone file: no -wal sidecar to lose when it is copied or compressed.
+            dst.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            dst.close()
+            src.close()
+        if verify:
+            result = _integrity_check(tmp)
+            if result != 'ok':
+                raise ValueError(f'backup failed integrity_check: {result}')
+        size = os.path.getsize(tmp)
+        if compress:
+            packed = tmp + '.gz'
+            try:
+                _compress(tmp, packed, COMPRESS_LEVEL)
+                os.replace(packed, dest)
+            finally:
+                if os.path.exists(packed):
+                    os.remove(packed)
+        else:
+            os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {
+        'path': dest,
+        'pages': total_pages,
+        'steps': steps,
+        'bytes': size,
+        'stored_bytes': os.path.getsize(dest),
+        'compressed': compress,
+        'verified': verify,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def restore_database(src: str, dest: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    Verify the snapshot `src` (plain or compressed) and install it as `dest` (default
+    database.DATABASE), then bring its schema up to date. Refuses to replace a database
+    holding books or loans unless `force` (a schema-only one, as create_app leaves behind,
+    is replaced); stop the app first, since open connections keep using the old file.
+    Returns stats: path, bytes, migrations applied, seconds.
+    """
+    dest = dest or database.DATABASE
+    started = time.perf_counter()
+    if not force and not is_empty_database(dest):
+        raise FileExistsError(f'{dest} already holds data; use force to replace it')
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.restore-', suffix='.db', dir=dest_dir)
+    os.close(fd)
+    try:
+        if is_compressed(src):
+            _decompress(src, tmp)
+        else:
+            shutil.copyfile(src, tmp)
+        result = _integrity_check(tmp)
+        if result != 'ok':
+            raise ValueError(f'{src} failed integrity_check: {result}')
+        # WAL/SHM files of the database being replaced describe the old file.
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(dest + suffix):
+                os.remove(dest + suffix)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    database.close_read_connections()
+    previous, database.DATABASE = database.DATABASE, dest
+    try:
+        migrated = database.init_database()
+        # The snapshot's catalog version may be older than ETags clients have already seen
+        # for this database; move it past them as a newly created database would.
+        conn = database.get_db_connection()
+        try:
+            conn.execute(f"UPDATE catalog_version SET version = MAX(version + 1, {_NOW_MS}) WHERE id = 1")
+            conn.commit()
+        finally:
+            conn.close()
+    finally:
+        database.DATABASE = previous
+    return {
+        'path': dest,
+        'bytes': os.path.getsize(dest),
+        'migrations': migrated,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,4 @@
+"""
+benchmarks package
+Performance benchmarks for the Library Management System (run as modules, not collected by pytest).
+"""
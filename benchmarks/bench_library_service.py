@@ -0,0 +1,212 @@
+"""
+benchmarks/bench_library_service.py
+Scale benchmarks for the library_service hot paths.
+
+Builds a catalog and loan history of the requested size in a scratch SQLite
+database, times the service functions against it, writes the results as JSON
+and optionally compares them with a saved baseline (exit code 1 on regression).
+
+Usage:
+    python -m benchmarks.bench_library_service --scale small --out bench.json
+    python -m benchmarks.bench_library_service --books 100000 --loans 2000000 \\
+        --baseline benchmarks/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import database
+import datagen
+from services import library_service
+
+SCALES = {
+    'small': {'books': 10_000, 'loans': 100_000},
+    'medium': {'books': 100_000, 'loans': 1_000_000},
+    'large': {'books': 1_000_000, 'loans': 10_000_000},
+}
+
+LOANS_PER_PATRON = 20
+
+# Absolute slowdowns below this are treated as noise when comparing to a baseline.
+NOISE_FLOOR_MS = 0.05
+
+
+# ---------- Fixture building ----------
+
+def build_database(path: str, books: int, loans: int, seed: int = 327) -> List[str]:
+    """Create a synthetic database at `path` and return its patron ids."""
+    patrons = min(900_000, max(1, loans // LOANS_PER_PATRON))
+    datagen.generate_dataset(path, books=books, patrons=patrons, loans=loans, seed=seed, force=True)
+    database.DATABASE = path
+    return datagen.patron_ids(patrons, seed)
+
+
+# ---------- Timing ----------
+
+def _time_op(fn: Callable[[int], Any], iterations: int, time_limit: float) -> Dict[str, float]:
+    """Call fn(i) up to `iterations` times (at least 3, at most `time_limit` seconds) and summarize."""
+    samples: List[float] = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        if i >= 2 and time.perf_counter() - started > time_limit:
+            break
+    samples.sort()
+    total = sum(samples)
+    return {
+        'runs': len(samples),
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'mean_ms': round(total / len(samples), 4),
+        'ops_per_sec': round(len(samples) / (total / 1000.0), 2) if total else 0.0,
+    }
+
+
+def run_benchmarks(books: int, patrons: List[str], iterations: int, time_limit: float,
+                   seed: int = 327) -> Dict[str, Any]:
+    """Time each hot path against the current database.DATABASE (already built)."""
+    rng = random.Random(seed + 1)
+    results: Dict[str, Dict[str, float]] = {}
+
+    # Patron ids without any loans, so the borrow limit is never hit.
+    known = set(patrons)
+    borrowers = [pid for pid in (str(n) for n in range(100_000, 1_000_000)) if pid not in known][:iterations]
+    borrowed: List[tuple] = []
+
+    results['add_book_to_catalog'] = _time_op(
+        lambda i: library_service.add_book_to_catalog(
+            f'Benchmark Book {i}', 'Benchmark Author', f'{9790000000000 + i}', 2),
+        iterations, time_limit)
+
+    def _borrow(i):
+        book_id = rng.randint(1, books)
+        ok, _ = library_service.borrow_book_by_patron(borrowers[i], book_id)
+        if ok:
+            borrowed.append((borrowers[i], book_id))
+    results['borrow_book_by_patron'] = _time_op(_borrow, iterations, time_limit)
+
+    results['return_book_by_patron'] = _time_op(
+        lambda i: library_service.return_book_by_patron(*borrowed[i % len(borrowed)]) if borrowed else None,
+        len(borrowed) or 3, time_limit)
+
+    results['search_books_in_catalog'] = _time_op(
+        lambda i: library_service.search_books_in_catalog(f'title {rng.randint(1, books)}', 'title'),
+        iterations, time_limit)
+
+    results['calculate_late_fee_for_book'] = _time_op(
+        lambda i: library_service.calculate_late_fee_for_book(rng.choice(patrons), rng.randint(1, books)),
+        iterations, time_limit)
+
+    results['get_patron_status_report'] = _time_op(
+        lambda i: library_service.get_patron_status_report(rng.choice(patrons)),
+        iterations, time_limit)
+
+    return results
+
+
+# ---------- Baseline comparison ----------
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Return a list of regression descriptions (empty when none).
+    An operation regresses when its median exceeds the baseline median by more
+    than `tolerance` (a fraction) and by more than NOISE_FLOOR_MS.
+    """
+    regressions = []
+    for op, base in baseline.get('results', {}).items():
+        cur = current.get('results', {}).get(op)
+        if cur is None:
+            continue
+        limit = base['median_ms'] * (1.0 + tolerance)
+        if cur['median_ms'] > limit and cur['median_ms'] - base['median_ms'] > NOISE_FLOOR_MS:
+            regressions.append(
+                f"{op}: median {cur['median_ms']:.3f} ms > baseline {base['median_ms']:.3f} ms "
+                f"(+{tolerance:.0%} allowed)"
+            )
+    return regressions
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--books', type=int, help='override the number of books for --scale')
+    parser.add_argument('--loans', type=int, help='override the number of loans for --scale')
+    parser.add_argument('--iterations', type=int, default=200, help='max calls per operation')
+    parser.add_argument('--time-limit', type=float, default=10.0, help='max seconds per operation')
+    parser.add_argument('--db', help='database path to build (default: a temporary file)')
+    parser.add_argument('--reuse', action='store_true', help='reuse --db if it exists instead of rebuilding')
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--out', help='write results JSON to this file')
+    parser.add_argument('--baseline', help='compare against this results JSON; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs baseline (fraction)')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    books = args.books or SCALES[args.scale]['books']
+    loans = args.loans if args.loans is not None else SCALES[args.scale]['loans']
+
+    tmpdir = None
+    path = args.db
+    if not path:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, 'bench.db')
+
+    t0 = time.perf_counter()
+    if args.reuse and os.path.exists(path):
+        database.DATABASE = path
+        patrons = datagen.patron_ids(min(900_000, max(1, loans // LOANS_PER_PATRON)), args.seed)
+    else:
+        patrons = build_database(path, books, loans, args.seed)
+    build_seconds = time.perf_counter() - t0
+
+    results = run_benchmarks(books, patrons, args.iterations, args.time_limit, args.seed)
+    report = {
+        'meta': {
+            'books': books,
+            'loans': loans,
+            'build_seconds': round(build_seconds, 2),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline.get('meta', {}).get('books'), baseline.get('meta', {}).get('loans')) != (books, loans):
+            print('warning: baseline was recorded at a different scale', file=sys.stderr)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for r in regressions:
+            print(f'REGRESSION {r}', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+benchmarks/bench_search_index.py
+Latency of the in-memory search indexes at catalog scale.
+
+For each requested catalog size, generates a synthetic database, builds the
+services.search_index catalog index and times prefix suggestions, multi-term
+inverted-index search and fuzzy (trigram) search with misspelled queries. The
+full-scan engine is timed alongside for comparison (--scan-queries to limit it).
+
+Usage:
+    python -m benchmarks.bench_search_index --books 100000 1000000
+    python -m benchmarks.bench_search_index --books 100000 --out search.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import database
+import datagen
+from benchmarks.bench_library_service import _time_op
+from services import library_service, search_index
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """One random deletion, transposition or substitution (words of 4+ letters)."""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(('delete', 'swap', 'replace'))
+    if edit == 'delete':
+        return word[:i] + word[i + 1:]
+    if edit == 'swap':
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice('aeiourstln') + word[i + 1:]
+
+
+def make_queries(books: int, count: int, rng: random.Random) -> List[Dict[str, str]]:
+    """Queries drawn from random books: a title prefix, two title words, and a misspelled word."""
+    queries = []
+    for row in database.get_books_by_ids([rng.randint(1, books) for _ in range(count)]):
+        words = search_index.normalize(row['title']).split()
+        long_words = [w for w in words + search_index.normalize(row['author']).split() if len(w) >= 4]
+        queries.append({
+            'prefix': search_index.normalize(row['title'])[:rng.randint(2, 6)],
+            'terms': ' '.join(rng.sample(words, min(2, len(words)))),
+            'fuzzy': misspell(rng.choice(long_words), rng) if long_words else words[0],
+        })
+    return queries
+
+
+def bench_size(books: int, iterations: int, time_limit: float, scan_queries: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    tmpdir = tempfile.TemporaryDirectory()
+    try:
+        path = os.path.join(tmpdir.name, 'search.db')
+        datagen.generate_dataset(path, books=books, patrons=100, loans=0, seed=seed, force=True)
+        database.DATABASE = path
+        search_index.reset_index()
+        index = search_index.get_index()
+        queries = make_queries(books, iterations, rng)
+
+        results = {
+            'suggest_titles': _time_op(
+                lambda i: index.suggest_titles(queries[i]['prefix']), iterations, time_limit),
+            'inverted_search': _time_op(
+                lambda i: index.search(queries[i]['terms']), iterations, time_limit),
+            'fuzzy_search': _time_op(
+                lambda i: index.fuzzy(queries[i]['fuzzy'], 20), iterations, time_limit),
+            'fuzzy_search_service': _time_op(
+                lambda i: library_service.search_books_in_catalog(queries[i]['fuzzy'], 'fuzzy'),
+                iterations, time_limit),
+            'scan_search_service': _time_op(
+                lambda i: library_service.search_books_in_catalog(queries[i]['terms'], 'title', engine='scan'),
+                max(3, scan_queries), time_limit),
+        }
+        stats = index.stats()
+        sample = queries[0]['fuzzy']
+        return {
+            'books': books,
+            'index': stats,
+            'example': {'query': sample, 'top': index.fuzzy(sample, 3)},
+            'results': results,
+        }
+    finally:
+        search_index.reset_index()
+        tmpdir.cleanup()
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--books', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--iterations', type=int, default=200, help='max queries per operation')
+    parser.add_argument('--time-limit', type=float, default=10.0, help='max seconds per operation')
+    parser.add_argument('--scan-queries', type=int, default=5, help='queries for the (slow) full-scan engine')
+    parser.add_argument('--seed', type=int, default=39)
+    parser.add_argument('--out', help='write results JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    report = {
+        'meta': {'python': platform.python_version(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'sizes': [bench_size(n, args.iterations, args.time_limit, args.scan_queries, args.seed) for n in args.books],
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
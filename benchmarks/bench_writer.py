@@ -0,0 +1,122 @@
+"""
+benchmarks/bench_writer.py
+Write throughput with and without the group-commit writer (db_writer).
+
+For each client count, N threads run borrow/return write cycles (availability
+-1, borrow record insert, return date update, availability +1) against a fresh
+synthetic database for a fixed duration, once with every thread committing on its
+own connection ('direct') and once through the single writer thread ('group').
+Reports writes/sec, latency percentiles, 'database is locked' errors and the mean
+group-commit batch size.
+
+Usage:
+    python -m benchmarks.bench_writer --clients 1 8 32 --duration 5
+    python -m benchmarks.bench_writer --clients 32 --modes group --out writer.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import database
+import datagen
+import db_writer
+from benchmarks.loadtest import _percentile
+
+MODES = ('direct', 'group')
+
+
+def _client(book_id: int, patron_id: str, deadline: float, latencies: List[float], errors: List[str]) -> None:
+    now = datetime.now()
+    steps = (
+        lambda: database.update_book_availability(book_id, -1),
+        lambda: database.insert_borrow_record(patron_id, book_id, now, now + timedelta(days=14)),
+        lambda: database.update_borrow_record_return_date(patron_id, book_id, now),
+        lambda: database.update_book_availability(book_id, 1),
+    )
+    while time.perf_counter() < deadline:
+        for step in steps:
+            t0 = time.perf_counter()
+            try:
+                step()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                continue
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+
+def bench_writes(clients: int, mode: str, duration: float, seed: int = 41) -> Dict[str, Any]:
+    """Run `clients` threads of write cycles for `duration` seconds in the given mode."""
+    tmpdir = tempfile.TemporaryDirectory()
+    try:
+        path = os.path.join(tmpdir.name, 'writes.db')
+        datagen.generate_dataset(path, books=max(clients, 10), patrons=clients, loans=0, seed=seed, force=True)
+        database.DATABASE = path
+        patrons = datagen.patron_ids(clients, seed)
+        writer = db_writer.start(path) if mode == 'group' else None
+
+        per_client: List[List[float]] = [[] for _ in range(clients)]
+        errors: List[str] = []
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=_client, args=(i + 1, patrons[i], deadline, per_client[i], errors))
+                   for i in range(clients)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        writer_stats = writer.stats() if writer else None
+    finally:
+        db_writer.stop()
+        database.close_read_connections()
+        tmpdir.cleanup()
+
+    latencies = sorted(ms for samples in per_client for ms in samples)
+    return {
+        'clients': clients,
+        'mode': mode,
+        'writes': len(latencies),
+        'writes_per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'locked_errors': len(errors),
+        'mean_batch': writer_stats['mean_batch'] if writer_stats else None,
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--seed', type=int, default=41)
+    parser.add_argument('--out', help='write results JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    report = {
+        'meta': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'runs': [bench_writes(n, mode, args.duration, args.seed) for n in args.clients for mode in args.modes],
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
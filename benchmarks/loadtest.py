@@ -0,0 +1,227 @@
+"""
+benchmarks/loadtest.py
+Concurrent load test driving the Flask app over HTTP on localhost.
+
+Starts create_app() under a multi-threaded WSGI server on an ephemeral
+localhost port, seeds a synthetic database (or uses --db), and runs N virtual
+patrons that replay a weighted mix of catalog views, searches, borrows,
+returns, status lookups and late-fee API calls. Reports p50/p95/p99 latency,
+throughput and error rate per operation. Runs entirely offline.
+
+Usage:
+    python -m benchmarks.loadtest --patrons 32 --duration 30
+    python -m benchmarks.loadtest --mix catalog=5,search=40,borrow=20,return=20,status=10,late_fee=5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from werkzeug.serving import make_server
+
+import database
+import datagen
+
+DEFAULT_MIX = {'catalog': 5, 'search': 30, 'borrow': 20, 'return': 20, 'status': 15, 'late_fee': 10}
+SEARCH_WORDS = ['the', 'river', 'garden', 'shadow', 'python', 'letters', 'smith', 'orwell', 'chen', 'grace']
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """Parse 'op=weight,...' into a dict, validating operation names."""
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f'Unknown operation {name!r}; expected one of {", ".join(DEFAULT_MIX)}')
+        mix[name] = int(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('Operation mix must have a positive total weight.')
+    return mix
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class VirtualPatron(threading.Thread):
+    """One simulated patron issuing requests until the deadline."""
+
+    def __init__(self, port: int, patron_id: str, books: int, mix: Dict[str, int],
+                 deadline: float, seed: int):
+        super().__init__(daemon=True)
+        self.port = port
+        self.patron_id = patron_id
+        self.books = books
+        self.ops = list(mix)
+        self.weights = [mix[o] for o in self.ops]
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.borrowed: List[int] = []
+        self.samples: List[Tuple[str, float, bool]] = []
+
+    def _request(self, method: str, path: str, form: Optional[Dict[str, Any]] = None) -> int:
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            body = urlencode(form) if form is not None else None
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def _run_op(self, op: str) -> int:
+        book_id = self.rng.randint(1, self.books)
+        if op == 'catalog':
+            return self._request('GET', '/catalog')
+        if op == 'search':
+            query = urlencode({'q': self.rng.choice(SEARCH_WORDS), 'type': self.rng.choice(['title', 'author'])})
+            return self._request('GET', f'/search?{query}')
+        if op == 'borrow':
+            status = self._request('POST', '/borrow', {'patron_id': self.patron_id, 'book_id': book_id})
+            if len(self.borrowed) < 5:
+                self.borrowed.append(book_id)
+            return status
+        if op == 'return':
+            if self.borrowed:
+                book_id = self.borrowed.pop(self.rng.randrange(len(self.borrowed)))
+            return self._request('POST', '/return', {'patron_id': self.patron_id, 'book_id': book_id})
+        if op == 'status':
+            return self._request('GET', f'/status?patron_id={self.patron_id}')
+        return self._request('GET', f'/api/late_fee/{self.patron_id}/{book_id}')
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            op = self.rng.choices(self.ops, weights=self.weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = self._run_op(op) < 500
+            except (OSError, http.client.HTTPException):
+                ok = False
+            self.samples.append((op, (time.perf_counter() - start) * 1000.0, ok))
+
+
+def summarize(samples: List[Tuple[str, float, bool]], elapsed: float) -> Dict[str, Any]:
+    """Per-operation and overall latency percentiles, throughput and error rate."""
+    by_op: Dict[str, List[Tuple[float, bool]]] = {}
+    for op, ms, ok in samples:
+        by_op.setdefault(op, []).append((ms, ok))
+
+    def _stats(rows: List[Tuple[float, bool]]) -> Dict[str, Any]:
+        latencies = sorted(ms for ms, _ in rows)
+        errors = sum(1 for _, ok in rows if not ok)
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(_percentile(latencies, 50), 3),
+            'p95_ms': round(_percentile(latencies, 95), 3),
+            'p99_ms': round(_percentile(latencies, 99), 3),
+        }
+
+    report = {op: _stats(rows) for op, rows in sorted(by_op.items())}
+    report['overall'] = _stats([(ms, ok) for _, ms, ok in samples])
+    return report
+
+
+def run_load_test(patrons: int, duration: float, mix: Dict[str, int], books: int,
+                  patron_ids: List[str], seed: int = 42, app_config: Optional[Dict[str, Any]] = None
+                  ) -> Dict[str, Any]:
+    """Serve the app on localhost and drive it with `patrons` virtual patrons for `duration` seconds."""
+    from app import create_app
+
+    app = create_app(app_config or {})
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        start = time.perf_counter()
+        deadline = start + duration
+        workers = [VirtualPatron(server.server_port, patron_ids[i % len(patron_ids)], books, mix,
+                                 deadline, seed + i) for i in range(patrons)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server_thread.join()
+    samples = [s for w in workers for s in w.samples]
+    return {
+        'meta': {'patrons': patrons, 'duration_s': round(elapsed, 2), 'books': books, 'mix': mix},
+        'operations': summarize(samples, elapsed),
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Concurrent HTTP load test for the library app.')
+    parser.add_argument('--patrons', type=int, default=16, help='concurrent virtual patrons')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run')
+    parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()))
+    parser.add_argument('--books', type=int, default=2_000, help='books in the generated dataset')
+    parser.add_argument('--loans', type=int, default=20_000, help='loans in the generated dataset')
+    parser.add_argument('--db', help='use this existing database instead of generating one')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write the JSON report to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+
+    tmpdir = None
+    if args.db:
+        database.DATABASE = args.db
+        conn = database.get_db_connection()
+        books = conn.execute('SELECT COALESCE(MAX(id), 0) FROM books').fetchone()[0]
+        pids = [r[0] for r in conn.execute(
+            'SELECT DISTINCT patron_id FROM borrow_records LIMIT ?', (max(args.patrons, 1),))]
+        conn.close()
+        pids = pids or [f'{100000 + i}' for i in range(args.patrons)]
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        database.DATABASE = os.path.join(tmpdir.name, 'loadtest.db')
+        num_patrons = max(args.patrons, args.loans // 20, 1)
+        datagen.generate_dataset(database.DATABASE, books=args.books, patrons=num_patrons,
+                                 loans=args.loans, seed=args.seed)
+        books = args.books
+        pids = datagen.patron_ids(num_patrons, args.seed)
+
+    try:
+        report = run_load_test(args.patrons, args.duration, mix, books, pids, args.seed)
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+cli.py
+Flask CLI commands for the Library Management System (run with `flask <command>`).
+"""
+
+import sqlite3
+from datetime import datetime
+
+import click
+
+import backup
+import database
+import datagen
+import scheduler
+from services import notice_service
+from services.export_service import export_records, EXPORT_FORMATS, EXPORT_KINDS
+
+
+@click.command('generate-data')
+@click.option('--db', default=None, help='Database path (default: the app database).')
+@click.option('--books', default=10_000, show_default=True, help='Number of books.')
+@click.option('--patrons', default=1_000, show_default=True, help='Number of distinct patrons.')
+@click.option('--loans', default=50_000, show_default=True, help='Total borrow records.')
+@click.option('--overdue-ratio', default=0.1, show_default=True, help='Fraction of open loans that are overdue.')
+@click.option('--active-ratio', default=0.05, show_default=True, help='Fraction of loans still open.')
+@click.option('--seed', default=42, show_default=True, help='Random seed.')
+@click.option('--as-of', default=None, help='Reference date (YYYY-MM-DD); default now.')
+@click.option('--force', is_flag=True, help='Replace an existing non-empty database.')
+def generate_data_command(db, books, patrons, loans, overdue_ratio, active_ratio, seed, as_of, force):
+    """Generate a deterministic synthetic dataset for load testing."""
+    try:
+        stats = datagen.generate_dataset(
+            db, books, patrons, loans, overdue_ratio, active_ratio, seed,
+            datetime.fromisoformat(as_of) if as_of else None, force,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(', '.join(f'{k}={v}' for k, v in stats.items()))
+
+
+@click.command('seed-sample')
+def seed_sample_command():
+    """Insert the demo books if the catalog is empty."""
+    database.init_database()
+    added = database.add_sample_data()
+    click.echo(f'Added {added} sample books.' if added else 'Catalog is not empty; nothing added.')
+
+
+@click.command('check-patrons')
+@click.option('--repair', is_flag=True, help='Rebuild the counters from borrow_records.')
+def check_patrons_command(repair):
+    """Compare patrons.active_loans/outstanding_fees with borrow_records."""
+    mismatches = database.check_patron_counters(repair=repair)
+    for m in mismatches[:20]:
+        click.echo(f"{m['patron_id']}: active_loans {m['active_loans']} (expected {m['expected_active_loans']}), "
+                   f"outstanding_fees {m['outstanding_fees']} (expected {m['expected_outstanding_fees']})")
+    if len(mismatches) > 20:
+        click.echo(f'... and {len(mismatches) - 20} more')
+    if not mismatches:
+        click.echo('Patron counters are consistent.')
+    elif repair:
+        click.echo(f'Repaired {len(mismatches)} patrons.')
+    else:
+        raise click.ClickException(f'{len(mismatches)} patrons have drifted counters; rerun with --repair.')
+
+
+@click.command('archive-loans')
+@click.option('--older-than-days', default=database.ARCHIVE_AFTER_DAYS, show_default=True,
+              help='Archive loans returned more than this many days ago.')
+@click.option('--batch-size', default=database.ARCHIVE_BATCH_SIZE, show_default=True,
+              help='Rows moved per transaction.')
+@click.option('--vacuum', is_flag=True, help='Compact the database file afterwards.')
+def archive_loans_command(older_than_days, batch_size, vacuum):
+    """Move old returned loans from borrow_records to borrow_records_archive."""
+    stats = database.archive_closed_loans(older_than_days, batch_size, vacuum)
+    before, after = stats['before'], stats['after']
+    click.echo(f"Moved {stats['moved']} loans in {stats['batches']} batches ({stats['seconds']}s).")
+    if before['borrow_records_bytes'] is not None:
+        click.echo(f"borrow_records: {before['borrow_records_bytes'] / 1e6:.1f} MB -> "
+                   f"{after['borrow_records_bytes'] / 1e6:.1f} MB")
+    click.echo(f"file: {before['file_bytes'] / 1e6:.1f} MB -> {after['file_bytes'] / 1e6:.1f} MB "
+               f"({after['free_bytes'] / 1e6:.1f} MB free for reuse)")
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(EXPORT_KINDS))
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+@click.option('--since', default=None, help='Loans borrowed on or after this date (YYYY-MM-DD).')
+@click.option('--until', default=None, help='Loans borrowed before this date (YYYY-MM-DD).')
+@click.option('--no-archived', is_flag=True, help='Skip loans in borrow_records_archive.')
+@click.option('--chunk-size', default=database.EXPORT_CHUNK_SIZE, show_default=True, help='Rows read per fetch.')
+@click.option('--out', type=click.File('w', encoding='utf-8'), default='-', help='Output file (default: stdout).')
+def export_command(kind, fmt, since, until, no_archived, chunk_size, out):
+    """Stream the books or loans table as CSV or NDJSON."""
+    ok, blocks = export_records(kind, fmt, since, until, not no_archived, chunk_size)
+    if not ok:
+        raise click.ClickException(blocks)
+    for block in blocks:
+        out.write(block)
+
+
+@click.command('generate-notices')
+@click.option('--as-of', default=None, help='Notice date (YYYY-MM-DD); default today.')
+@click.option('--due-soon-days', default=notice_service.NOTICE_DUE_SOON_DAYS, show_default=True,
+              help='Also notify loans due within this many days.')
+@click.option('--time-budget', default=notice_service.NOTICE_TIME_BUDGET, show_default=True,
+              help='Stop after this many seconds; rerun with --after-patron to continue.')
+@click.option('--after-patron', default=None, help='Resume after this patron id.')
+def generate_notices_command(as_of, due_soon_days, time_budget, after_patron):
+    """Queue due-soon and overdue notices in the notice outbox."""
+    stats = notice_service.generate_notices(datetime.fromisoformat(as_of) if as_of else None,
+                                            due_soon_days, time_budget, after_patron)
+    click.echo(f"Queued {stats['queued']} notices for {stats['patrons']} patrons "
+               f"({stats['loans']} loans) in {stats['seconds']}s.")
+    if not stats['complete']:
+        click.echo(f"Time budget reached; continue with --after-patron {stats['resume_after']}")
+
+
+@click.command('deliver-notices')
+@click.option('--out', default='notices.jsonl', show_default=True,
+              help='JSON-lines file standing in for the mailer.')
+@click.option('--limit', default=None, type=int, help='Deliver at most this many notices.')
+def deliver_notices_command(out, limit):
+    """Hand queued notices to the mailer stand-in and mark them sent."""
+    sent = notice_service.deliver_notices(notice_service.jsonl_sender(out), limit)
+    click.echo(f'Delivered {sent} notices to {out}.')
+
+
+@click.command('jobs')
+@click.option('--run', 'run_name', default=None, help='Run this job now and record the result.')
+def jobs_command(run_name):
+    """List the scheduled maintenance jobs and their last runs."""
+    jobs = {job.name: job for job in scheduler.default_jobs()}
+    if run_name:
+        if run_name not in jobs:
+            raise click.ClickException(f"Unknown job '{run_name}'; expected one of: {', '.join(jobs)}")
+        status = scheduler.Scheduler([jobs[run_name]]).run_job(jobs[run_name])
+        click.echo(f'{run_name}: {status}')
+    states = database.get_job_states()
+    for name, job in jobs.items():
+        state = states.get(name, {})
+        next_run = datetime.fromtimestamp(state['next_run_at']).isoformat(' ', 'seconds') \
+            if state.get('next_run_at') else '-'
+        click.echo(f"{name:16} {job.schedule!r:22} next {next_run:19}  last {state.get('last_status') or '-'} "
+                   f"({state.get('last_duration') or 0:.1f}s, {state.get('runs', 0)} runs)")
+
+
+@click.command('backup-db')
+@click.argument('dest')
+@click.option('--compress', is_flag=True, help='Store the snapshot zlib-compressed (gzip format).')
+@click.option('--pages', default=backup.BACKUP_PAGES, show_default=True, help='Pages copied per step.')
+@click.option('--sleep', default=backup.BACKUP_SLEEP, show_default=True, help='Seconds to pause between steps.')
+@click.option('--no-verify', is_flag=True, help='Skip PRAGMA integrity_check on the copy.')
+def backup_db_command(dest, compress, pages, sleep, no_verify):
+    """Snapshot the live database to DEST without blocking writers."""
+    try:
+        stats = backup.backup_database(dest, compress, pages, sleep, not no_verify)
+    except (ValueError, sqlite3.Error) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Backed up {stats['pages']} pages ({stats['bytes'] / 1e6:.1f} MB, stored "
+               f"{stats['stored_bytes'] / 1e6:.1f} MB) to {dest} in {stats['seconds']}s"
+               f"{', verified' if stats['verified'] else ''}.")
+
+
+@click.command('restore-db')
+@click.argument('src')
+@click.option('--db', default=None, help='Database path to restore to (default: the app database).')
+@click.option('--force', is_flag=True, help='Replace an existing database (stop the app first).')
+def restore_db_command(src, db, force):
+    """Verify the snapshot SRC (plain or compressed) and install it as the database."""
+    try:
+        stats = backup.restore_database(src, db, force)
+    except (FileExistsError, ValueError, OSError, sqlite3.Error) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restored {src} to {stats['path']} ({stats['bytes'] / 1e6:.1f} MB, "
+               f"{stats['migrations']} migrations) in {stats['seconds']}s.")
+
+
+def register_commands(app):
+    """Register all CLI commands with the Flask app."""
+    app.cli.add_command(generate_data_command)
+    app.cli.add_command(seed_sample_command)
+    app.cli.add_command(check_patrons_command)
+    app.cli.add_command(archive_loans_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(generate_notices_command)
+    app.cli.add_command(deliver_notices_command)
+    app.cli.add_command(jobs_command)
+    app.cli.add_command(backup_db_command)
+    app.cli.add_command(restore_db_command)
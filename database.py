@@ -3,35 +3,325 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import os
+import pathlib
+import random
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 # Database configuration
 DATABASE = 'library.db'
 
-def get_db_connection():
-    """Get a database connection with row factory returning dict-like rows."""
-    conn = sqlite3.connect(DATABASE)
+# ---------- Query Observers ----------
+# Callbacks called as callback(event, sql, params, elapsed_seconds) where event is
+# 'execute' (one per statement) or 'fetch' (time spent stepping through results).
+# While no observer is registered, connections are plain sqlite3 connections.
+_query_observers: List[Callable[[str, str, Any, float], None]] = []
+
+def add_query_observer(callback: Callable[[str, str, Any, float], None]) -> None:
+    """Register a callback for every statement run on connections opened afterwards."""
+    if callback not in _query_observers:
+        _query_observers.append(callback)
+        _discard_idle_readers()
+
+def remove_query_observer(callback: Callable[[str, str, Any, float], None]) -> None:
+    if callback in _query_observers:
+        _query_observers.remove(callback)
+        _discard_idle_readers()
+
+def _notify(event: str, sql: str, params: Any, elapsed: float) -> None:
+    for callback in _query_observers:
+        callback(event, sql, params, elapsed)
+
+class _ObservedCursor(sqlite3.Cursor):
+    """Cursor that reports execute/fetch timings to the query observers."""
+
+    _last_sql = ''
+    _last_params: Any = None
+
+    def execute(self, sql, parameters=()):
+        self._last_sql, self._last_params = sql, parameters
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _notify('execute', sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._last_sql, self._last_params = sql, None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _notify('execute', sql, None, time.perf_counter() - start)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            _notify('fetch', self._last_sql, self._last_params, time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+class _ObservedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are _ObservedCursor."""
+
+    def cursor(self, factory=_ObservedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Callbacks called as callback(elapsed_seconds) after each connection is opened.
+_connect_observers: List[Callable[[float], None]] = []
+
+def add_connect_observer(callback: Callable[[float], None]) -> None:
+    if callback not in _connect_observers:
+        _connect_observers.append(callback)
+
+def remove_connect_observer(callback: Callable[[float], None]) -> None:
+    if callback in _connect_observers:
+        _connect_observers.remove(callback)
+
+# Callbacks called as callback(conn) on each new connection (e.g. to install a trace callback).
+_connection_hooks: List[Callable[[sqlite3.Connection], None]] = []
+
+def add_connection_hook(callback: Callable[[sqlite3.Connection], None]) -> None:
+    if callback not in _connection_hooks:
+        _connection_hooks.append(callback)
+        _discard_idle_readers()
+
+def remove_connection_hook(callback: Callable[[sqlite3.Connection], None]) -> None:
+    if callback in _connection_hooks:
+        _connection_hooks.remove(callback)
+        _discard_idle_readers()
+
+def _setup_connection(conn: sqlite3.Connection, start: float) -> None:
     conn.row_factory = sqlite3.Row
+    for hook in _connection_hooks:
+        hook(conn)
+    if _connect_observers:
+        elapsed = time.perf_counter() - start
+        for callback in _connect_observers:
+            callback(elapsed)
+
+def get_db_connection(path: Optional[str] = None):
+    """Get a read-write database connection (the write path) with dict-like rows."""
+    start = time.perf_counter() if _connect_observers else 0.0
+    if _query_observers:
+        conn = sqlite3.connect(path or DATABASE, factory=_ObservedConnection)
+    else:
+        conn = sqlite3.connect(path or DATABASE)
+    _setup_connection(conn, start)
+    return conn
+
+# ---------- Read-Only Connection Pool ----------
+# Read functions use read-only (mode=ro) connections from a small pool; their close()
+# returns them to the pool. In WAL mode (set by init_database) readers never take write
+# locks and are not blocked by borrow/return commits.
+READ_POOL_SIZE = 8  # idle read connections kept open
+
+class _PooledReader:
+    def close(self):
+        _release_reader(self)
+
+    def _really_close(self):
+        sqlite3.Connection.close(self)
+
+class _ReadConnection(_PooledReader, sqlite3.Connection):
+    pass
+
+class _ObservedReadConnection(_PooledReader, _ObservedConnection):
+    pass
+
+_read_pool: List[sqlite3.Connection] = []
+_read_pool_key: Tuple[str, int] = ('', 0)
+_read_pool_lock = threading.Lock()
+_read_generation = 0  # bumped when observers or hooks change so idle readers are replaced
+# Readers inherited across fork; kept referenced (never closed) in the child.
+_forked_readers: List[sqlite3.Connection] = []
+
+def _discard_idle_readers() -> None:
+    global _read_generation
+    with _read_pool_lock:
+        _read_generation += 1
+        idle = list(_read_pool)
+        _read_pool.clear()
+    for conn in idle:
+        conn._really_close()
+
+def get_read_connection():
+    """Get a pooled read-only connection to DATABASE; close() hands it back to the pool."""
+    global _read_pool_key
+    key = (DATABASE, _read_generation)
+    stale: List[sqlite3.Connection] = []
+    with _read_pool_lock:
+        if key != _read_pool_key:
+            stale = list(_read_pool)
+            _read_pool.clear()
+            _read_pool_key = key
+        conn = _read_pool.pop() if _read_pool else None
+    for old in stale:
+        old._really_close()
+    if conn is not None:
+        return conn
+    start = time.perf_counter() if _connect_observers else 0.0
+    uri = pathlib.Path(DATABASE).absolute().as_uri() + '?mode=ro'
+    factory = _ObservedReadConnection if _query_observers else _ReadConnection
+    conn = sqlite3.connect(uri, uri=True, factory=factory, check_same_thread=False)
+    conn._pool_key = key
+    _setup_connection(conn, start)
     return conn
 
-# ---------- Initialization & Sample Data ----------
+def _release_reader(conn) -> None:
+    conn.row_factory = sqlite3.Row
+    with _read_pool_lock:
+        if conn._pool_key == _read_pool_key and len(_read_pool) < READ_POOL_SIZE and conn not in _read_pool:
+            _read_pool.append(conn)
+            return
+    conn._really_close()
+
+def close_read_connections() -> None:
+    """Close every idle pooled read connection (e.g. before deleting the database file)."""
+    _discard_idle_readers()
+
+def _reset_read_pool_after_fork() -> None:
+    global _read_pool_lock
+    _read_pool_lock = threading.Lock()
+    _forked_readers.extend(_read_pool)
+    _read_pool.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_read_pool_after_fork)
+
+# ---------- Write Retry ----------
+# Write functions are wrapped in @retry_on_busy: a call failing with SQLITE_BUSY
+# ("database is locked") is retried with exponential backoff and full jitter until
+# it succeeds, runs out of attempts or would pass its deadline. Each call is one
+# transaction and a busy failure leaves nothing committed, so retrying is safe.
+# Retry observers are called as callback(operation, retries, waited_seconds, succeeded)
+# for every call that hit contention.
+WRITE_RETRY_ATTEMPTS = 6
+WRITE_RETRY_BASE_DELAY = 0.01  # seconds; doubles per retry
+WRITE_RETRY_MAX_DELAY = 0.5
+WRITE_RETRY_DEADLINE = 10.0  # seconds for the whole call, including SQLite's own busy wait
+
+_retry_observers: List[Callable[[str, int, float, bool], None]] = []
+
+def add_retry_observer(callback: Callable[[str, int, float, bool], None]) -> None:
+    if callback not in _retry_observers:
+        _retry_observers.append(callback)
+
+def remove_retry_observer(callback: Callable[[str, int, float, bool], None]) -> None:
+    if callback in _retry_observers:
+        _retry_observers.remove(callback)
 
-def init_database() -> None:
-    """Create tables if they do not already exist."""
+def is_busy_error(exc: BaseException) -> bool:
+    """True for SQLITE_BUSY/SQLITE_LOCKED errors, which are worth retrying."""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+def retry_on_busy(attempts: Optional[int] = None, base_delay: Optional[float] = None,
+                  max_delay: Optional[float] = None, deadline: Optional[float] = None):
+    """Decorator retrying a write function on SQLITE_BUSY; unset limits use the WRITE_RETRY_* values."""
+    def decorator(fn):
+        operation = fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            max_attempts = max(1, attempts if attempts is not None else WRITE_RETRY_ATTEMPTS)
+            base = base_delay if base_delay is not None else WRITE_RETRY_BASE_DELAY
+            cap = max_delay if max_delay is not None else WRITE_RETRY_MAX_DELAY
+            started = time.monotonic()
+            give_up_at = started + (deadline if deadline is not None else WRITE_RETRY_DEADLINE)
+            retries = 0
+            while True:
+                try:
+                    result = fn(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not is_busy_error(e):
+                        raise
+                    delay = random.uniform(0, min(cap, base * (2 ** retries)))
+                    if retries + 1 >= max_attempts or time.monotonic() + delay > give_up_at:
+                        for callback in _retry_observers:
+                            callback(operation, retries, time.monotonic() - started, False)
+                        raise
+                    retries += 1
+                    time.sleep(delay)
+                    continue
+                if retries:
+                    for callback in _retry_observers:
+                        callback(operation, retries, time.monotonic() - started, True)
+                return result
+        return wrapper
+    return decorator
+
+# ---------- Write Path ----------
+# Borrow, return and availability writes are split into _op_*(cur, ...) functions that
+# run inside a transaction without committing. _run_write() executes one on its own
+# connection and commits, unless a write executor is installed (db_writer's group-commit
+# thread), which receives (op, args) and returns the op's result once committed.
+_write_executor: Optional[Callable[[Callable[..., Any], Tuple[Any, ...]], Any]] = None
+
+def set_write_executor(executor: Optional[Callable[[Callable[..., Any], Tuple[Any, ...]], Any]]) -> None:
+    global _write_executor
+    _write_executor = executor
+
+def _run_write(op: Callable[..., Any], *args: Any) -> Any:
+    executor = _write_executor
+    if executor is not None:
+        return executor(op, args)
     conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
+    try:
+        result = op(conn.cursor(), *args)
+        conn.commit()
+        return result
+    finally:
+        conn.close()
+
+# ---------- Schema & Sample Data ----------
+def _late_fee_sql(record: str) -> str:
+    """
+    SQL for the late fee assessed when the borrow record `record` (a table alias or NEW)
+    was returned; mirrors services.library_service._compute_fee ($0.50/day for the first
+    7 days overdue, $1.00/day after that, capped at $15.00).
+    """
+    days = (f"MAX(0, CAST(julianday(date({record}.return_date)) - "
+            f"julianday(date({record}.due_date)) AS INTEGER))")
+    return f"MIN(15.0, MIN({days}, 7) * 0.5 + MAX({days} - 7, 0) * 1.0)"
+
+# Each entry upgrades the schema by one version and PRAGMA user_version records how
+# many have been applied, so opening a current database costs a single pragma read.
+# Append new migrations at the end; never edit one that has shipped.
+_MIGRATIONS: List[Tuple[str, ...]] = [
+    # 1: base schema (IF NOT EXISTS so databases created before versioning upgrade in place)
+    (
         "CREATE TABLE IF NOT EXISTS books ("
         "id INTEGER PRIMARY KEY AUTOINCREMENT,"
         "title TEXT NOT NULL,"
         "author TEXT NOT NULL,"
         "isbn TEXT UNIQUE NOT NULL,"
         "total_copies INTEGER NOT NULL,"
-        "available_copies INTEGER NOT NULL)"
-    )
-    cur.execute(
+        "available_copies INTEGER NOT NULL)",
         "CREATE TABLE IF NOT EXISTS borrow_records ("
         "id INTEGER PRIMARY KEY AUTOINCREMENT,"
         "patron_id TEXT NOT NULL,"
@@ -39,17 +329,149 @@ def init_database() -> None:
         "borrow_date TEXT NOT NULL,"
         "due_date TEXT NOT NULL,"
         "return_date TEXT NULL,"
-        "FOREIGN KEY (book_id) REFERENCES books (id))"
-    )
-    conn.commit()
+        "FOREIGN KEY (book_id) REFERENCES books (id))",
+        "CREATE TABLE IF NOT EXISTS refund_journal ("
+        "transaction_id TEXT PRIMARY KEY,"
+        "amount REAL NOT NULL,"
+        "status TEXT NOT NULL,"
+        "message TEXT NULL,"
+        "updated_at TEXT NOT NULL)",
+    ),
+    # 2: catalog version counter behind the catalog/search ETags. It starts at the
+    # creation time in milliseconds so a recreated database never reuses old ETags.
+    (
+        "CREATE TABLE IF NOT EXISTS catalog_version ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1),"
+        "version INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO catalog_version(id, version) "
+        "VALUES (1, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))",
+    ),
+    # 3: WAL journal mode so read-only connections never block or wait on writers.
+    # No statements: init_database switches the journal mode before applying migrations.
+    (),
+    # 4: row version on books for compare-and-swap availability updates.
+    (
+        "ALTER TABLE books ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+    ),
+    # 5: patrons with counters maintained by borrow/return (see "Patrons" below),
+    # backfilled from borrow_records.
+    (
+        "CREATE TABLE IF NOT EXISTS patrons ("
+        "patron_id TEXT PRIMARY KEY,"
+        "active_loans INTEGER NOT NULL DEFAULT 0,"
+        "outstanding_fees REAL NOT NULL DEFAULT 0)",
+        "INSERT INTO patrons(patron_id, active_loans, outstanding_fees) "
+        "SELECT br.patron_id, SUM(br.return_date IS NULL), "
+        "ROUND(TOTAL(CASE WHEN br.return_date IS NOT NULL THEN MIN(15.0, "
+        "MIN(MAX(0, CAST(julianday(date(br.return_date)) - julianday(date(br.due_date)) AS INTEGER)), 7) * 0.5 + "
+        "MAX(MAX(0, CAST(julianday(date(br.return_date)) - julianday(date(br.due_date)) AS INTEGER)) - 7, 0) * 1.0"
+        ") END), 2) "
+        "FROM borrow_records br GROUP BY br.patron_id",
+    ),
+    # 6: cold storage for closed loans moved out of borrow_records by archive_closed_loans().
+    # Rows keep their borrow_records id.
+    (
+        "CREATE TABLE IF NOT EXISTS borrow_records_archive ("
+        "id INTEGER PRIMARY KEY,"
+        "patron_id TEXT NOT NULL,"
+        "book_id INTEGER NOT NULL,"
+        "borrow_date TEXT NOT NULL,"
+        "due_date TEXT NOT NULL,"
+        "return_date TEXT NOT NULL,"
+        "archived_at TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_borrow_records_archive_patron "
+        "ON borrow_records_archive(patron_id, borrow_date)",
+    ),
+    # 7: per-patron index for history pages and active-loan lookups.
+    (
+        "CREATE INDEX IF NOT EXISTS idx_borrow_records_patron ON borrow_records(patron_id, borrow_date)",
+    ),
+    # 8: borrow_date indexes for date-range loan exports.
+    (
+        "CREATE INDEX IF NOT EXISTS idx_borrow_records_borrow_date ON borrow_records(borrow_date)",
+        "CREATE INDEX IF NOT EXISTS idx_borrow_records_archive_borrow_date "
+        "ON borrow_records_archive(borrow_date)",
+    ),
+    # 9: index over open loans only, and the outbox notices are written to (one row per
+    # patron, kind and run date; see "Notices" below).
+    (
+        "CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due "
+        "ON borrow_records(patron_id, due_date, book_id) WHERE return_date IS NULL",
+        "CREATE TABLE IF NOT EXISTS notice_outbox ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        "patron_id TEXT NOT NULL,"
+        "kind TEXT NOT NULL,"
+        "notice_date TEXT NOT NULL,"
+        "payload TEXT NOT NULL,"
+        "created_at TEXT NOT NULL,"
+        "sent_at TEXT NULL,"
+        "UNIQUE (patron_id, kind, notice_date))",
+        "CREATE INDEX IF NOT EXISTS idx_notice_outbox_pending ON notice_outbox(id) WHERE sent_at IS NULL",
+    ),
+    # 10: scheduler leader lease and per-job run state (see "Scheduler" below).
+    (
+        "CREATE TABLE IF NOT EXISTS scheduler_lease ("
+        "name TEXT PRIMARY KEY,"
+        "owner TEXT NOT NULL,"
+        "expires_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS scheduled_jobs ("
+        "name TEXT PRIMARY KEY,"
+        "next_run_at REAL NULL,"
+        "last_started_at TEXT NULL,"
+        "last_duration REAL NULL,"
+        "last_status TEXT NULL,"
+        "last_error TEXT NULL,"
+        "runs INTEGER NOT NULL DEFAULT 0,"
+        "failures INTEGER NOT NULL DEFAULT 0)",
+    ),
+    # 11: late fee payments, subtracted from patrons.outstanding_fees (see "Patrons" below).
+    (
+        "CREATE TABLE IF NOT EXISTS fee_payments ("
+        "transaction_id TEXT PRIMARY KEY,"
+        "patron_id TEXT NOT NULL,"
+        "record_id INTEGER NULL,"
+        "amount REAL NOT NULL,"
+        "paid_at TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_fee_payments_patron ON fee_payments(patron_id)",
+    ),
+]
+
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+def get_schema_version() -> int:
+    """The PRAGMA user_version of the current database (0 for a new file)."""
+    conn = get_db_connection()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
     conn.close()
+    return version
 
-def add_sample_data() -> None:
-    """Insert a few books if catalog is empty (for demo/testing)."""
+def init_database() -> int:
+    """Apply any pending schema migrations; returns how many were applied."""
+    conn = get_db_connection()
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return 0
+        # Persistent, and cannot be changed inside a transaction: switch before migrating.
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('BEGIN IMMEDIATE')
+        # Another process may have migrated while this one waited for the write lock.
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for statements in _MIGRATIONS[version:]:
+            for sql in statements:
+                conn.execute(sql)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+        return max(0, SCHEMA_VERSION - version)
+    finally:
+        conn.close()
+
+def add_sample_data() -> int:
+    """Insert a few books if catalog is empty (for demo/testing); returns how many were added."""
     conn = get_db_connection()
     cur = conn.cursor()
-    count = cur.execute('SELECT COUNT(*) FROM books').fetchone()[0]
-    if count == 0:
+    added = 0
+    if cur.execute('SELECT 1 FROM books LIMIT 1').fetchone() is None:
         sample = [
             ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
             ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
@@ -60,89 +482,162 @@ def add_sample_data() -> None:
                 "INSERT OR IGNORE INTO books(title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)",
                 (title, author, isbn, total, total)
             )
+            added += cur.rowcount
+        if added:
+            _bump_catalog_version(cur)
         conn.commit()
     conn.close()
+    return added
+
+# ---------- Catalog Version ----------
+
+def _bump_catalog_version(cur: sqlite3.Cursor) -> None:
+    """Advance the catalog version inside the caller's write transaction."""
+    cur.execute('UPDATE catalog_version SET version = version + 1 WHERE id = 1')
+
+def get_catalog_version() -> Optional[int]:
+    """Current catalog version, or None if the database has no version table yet."""
+    conn = get_read_connection()
+    try:
+        row = conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return row[0] if row else None
 
 # ---------- Book Queries ----------
 
 def get_all_books() -> List[sqlite3.Row]:
-    conn = get_db_connection()
+    conn = get_read_connection()
     rows = conn.execute('SELECT * FROM books ORDER BY id').fetchall()
     conn.close()
     return rows
 
 def get_book_by_id(book_id: int) -> Optional[sqlite3.Row]:
-    conn = get_db_connection()
+    conn = get_read_connection()
     row = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
     conn.close()
     return row
 
 def get_book_by_isbn(isbn: str) -> Optional[sqlite3.Row]:
-    conn = get_db_connection()
+    conn = get_read_connection()
     row = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
     conn.close()
     return row
 
+def get_books_by_ids(book_ids: List[int]) -> List[sqlite3.Row]:
+    """Rows for the given ids, in the order given (missing ids are skipped)."""
+    ids = list(book_ids)
+    by_id: Dict[int, sqlite3.Row] = {}
+    conn = get_read_connection()
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[i:i + _IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        for r in conn.execute(f"SELECT * FROM books WHERE id IN ({placeholders})", chunk).fetchall():
+            by_id[r['id']] = r
+    conn.close()
+    return [by_id[i] for i in ids if i in by_id]
+
+def iter_book_titles(after_id: int = 0, batch: int = 10_000) -> Iterator[Tuple[int, str, str]]:
+    """Yield (id, title, author) for books with id > after_id in id order, fetched in batches."""
+    conn = get_read_connection()
+    conn.row_factory = None  # plain tuples: this feeds index builds over the whole catalog
+    try:
+        cur = conn.execute('SELECT id, title, author FROM books WHERE id > ? ORDER BY id', (after_id,))
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            for r in rows:
+                yield r[0], r[1], r[2]
+    finally:
+        conn.close()
+
+# Callbacks called as callback(book_id, title, author) after insert_book commits
+# (e.g. to keep in-memory search indexes current).
+_book_listeners: List[Callable[[int, str, str], None]] = []
+
+def add_book_listener(callback: Callable[[int, str, str], None]) -> None:
+    if callback not in _book_listeners:
+        _book_listeners.append(callback)
+
+def remove_book_listener(callback: Callable[[int, str, str], None]) -> None:
+    if callback in _book_listeners:
+        _book_listeners.remove(callback)
+
+@retry_on_busy()
 def insert_book(title: str, author: str, isbn: str, total_copies: int) -> int:
     """Insert a book and return new book id."""
     conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO books(title, author, isbn, total_copies, available_copies) VALUES(?, ?, ?, ?, ?)",
-        (title, author, isbn, total_copies, total_copies)
-    )
-    conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO books(title, author, isbn, total_copies, available_copies) VALUES(?, ?, ?, ?, ?)",
+            (title, author, isbn, total_copies, total_copies)
+        )
+        new_id = cur.lastrowid
+        _bump_catalog_version(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    for callback in _book_listeners:
+        callback(new_id, title, author)
     return new_id
 
-def update_book_availability(book_id: int, delta: int) -> bool:
+def _op_update_book_availability(cur: sqlite3.Cursor, book_id: int, delta: int,
+                                 expected_version: Optional[int] = None) -> bool:
+    sql = ('UPDATE books SET available_copies = available_copies + ?, version = version + 1 '
+           'WHERE id = ? AND available_copies + ? BETWEEN 0 AND total_copies')
+    params: Tuple[Any, ...] = (delta, book_id, delta)
+    if expected_version is not None:
+        sql += ' AND version = ?'
+        params += (expected_version,)
+    cur.execute(sql, params)
+    if cur.rowcount != 1:
+        return False
+    _bump_catalog_version(cur)
+    return True
+
+@retry_on_busy()
+def update_book_availability(book_id: int, delta: int, expected_version: Optional[int] = None) -> bool:
     """
     Increment/decrement available_copies by delta ensuring bounds (0..total).
     Returns True if updated, False otherwise.
+    With expected_version the update is a compare-and-swap on (id, version): it also
+    returns False when the row changed since that version was read.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    row = cur.execute('SELECT available_copies, total_copies FROM books WHERE id=?', (book_id,)).fetchone()
-    if not row:
-        conn.close()
-        return False
-    new_avail = row['available_copies'] + delta
-    if new_avail < 0 or new_avail > row['total_copies']:
-        conn.close()
-        return False
-    cur.execute('UPDATE books SET available_copies = ? WHERE id = ?', (new_avail, book_id))
-    conn.commit()
-    conn.close()
-    return True
-
-# ---------- Borrowing ----------
+    return _run_write(_op_update_book_availability, book_id, delta, expected_version)
 
 def get_patron_borrow_count(patron_id: str) -> int:
-    """Count active (not returned) borrow records for patron."""
-    conn = get_db_connection()
-    count = conn.execute(
-        "SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL",
-        (patron_id,)
-    ).fetchone()[0]
+    """Count active (not returned) borrow records for patron (the patrons.active_loans counter)."""
+    conn = get_read_connection()
+    row = conn.execute("SELECT active_loans FROM patrons WHERE patron_id = ?", (patron_id,)).fetchone()
     conn.close()
-    return int(count)
+    return int(row[0]) if row else 0
 
-def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> int:
-    conn = get_db_connection()
-    cur = conn.cursor()
+def _op_insert_borrow_record(cur: sqlite3.Cursor, patron_id: str, book_id: int,
+                             borrow_date: datetime, due_date: datetime) -> int:
     cur.execute(
         "INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, NULL)",
         (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat())
     )
-    conn.commit()
-    rid = cur.lastrowid
-    conn.close()
-    return rid
+    record_id = cur.lastrowid
+    if not _patron_triggers:
+        cur.execute(
+            "INSERT INTO patrons(patron_id, active_loans) VALUES (?, 1) "
+            "ON CONFLICT(patron_id) DO UPDATE SET active_loans = active_loans + 1",
+            (patron_id,)
+        )
+    return record_id
+
+@retry_on_busy()
+def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> int:
+    return _run_write(_op_insert_borrow_record, patron_id, book_id, borrow_date, due_date)
 
 def get_active_borrow_record(patron_id: str, book_id: int) -> Optional[sqlite3.Row]:
     """Return the active (not yet returned) borrow record for patron/book if any."""
-    conn = get_db_connection()
+    conn = get_read_connection()
     row = conn.execute(
         "SELECT * FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL ORDER BY id DESC LIMIT 1",
         (patron_id, book_id)
@@ -150,23 +645,35 @@ def get_active_borrow_record(patron_id: str, book_id: int) -> Optional[sqlite3.R
     conn.close()
     return row
 
-def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
-    conn = get_db_connection()
-    cur = conn.cursor()
+def _op_update_borrow_record_return_date(cur: sqlite3.Cursor, patron_id: str, book_id: int,
+                                         return_date: datetime) -> bool:
     # Update only the most recent active borrow record for this patron/book
-    cur.execute(
-        "UPDATE borrow_records SET return_date = ? WHERE id = ("
-        "SELECT id FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL ORDER BY id DESC LIMIT 1"
-        ")",
-        (return_date.isoformat(), patron_id, book_id)
-    )
-    updated = cur.rowcount
-    conn.commit()
-    conn.close()
-    return updated > 0
+    row = cur.execute(
+        "SELECT id FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL "
+        "ORDER BY id DESC LIMIT 1",
+        (patron_id, book_id)
+    ).fetchone()
+    if not row:
+        return False
+    cur.execute("UPDATE borrow_records SET return_date = ? WHERE id = ? AND return_date IS NULL",
+                (return_date.isoformat(), row['id']))
+    if cur.rowcount != 1:
+        return False  # returned concurrently
+    if not _patron_triggers:
+        cur.execute(
+            "UPDATE patrons SET active_loans = active_loans - 1, outstanding_fees = ROUND(outstanding_fees + "
+            f"(SELECT {_late_fee_sql('br')} FROM borrow_records br WHERE br.id = ?), 2) "
+            "WHERE patron_id = ?",
+            (row['id'], patron_id)
+        )
+    return True
+
+@retry_on_busy()
+def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
+    return _run_write(_op_update_borrow_record_return_date, patron_id, book_id, return_date)
 
 def get_patron_current_borrows(patron_id: str):
-    conn = get_db_connection()
+    conn = get_read_connection()
     rows = conn.execute(
         "SELECT br.*, b.title, b.author, b.isbn "
         "FROM borrow_records br JOIN books b ON b.id = br.book_id "
@@ -178,7 +685,7 @@ def get_patron_current_borrows(patron_id: str):
     return rows
 
 def get_patron_borrow_history(patron_id: str):
-    conn = get_db_connection()
+    conn = get_read_connection()
     rows = conn.execute(
         "SELECT br.*, b.title, b.author, b.isbn "
         "FROM borrow_records br JOIN books b ON b.id = br.book_id "
@@ -189,10 +696,524 @@ def get_patron_borrow_history(patron_id: str):
     conn.close()
     return rows
 
+def get_patron_borrow_history_page(patron_id: str, limit: int,
+                                   before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` of the patron's borrows (live and archived), newest first by (borrow_date, id).
+    `before` is the (borrow_date, id) of the last row of the previous page. Each item has id,
+    book_id, title, author, isbn, borrow_date, due_date and return_date (ISO strings).
+    """
+    where = "patron_id = ?"
+    params: Tuple[Any, ...] = (patron_id,)
+    if before is not None:
+        where += " AND borrow_date <= ? AND (borrow_date < ? OR id < ?)"
+        params += (before[0], before[0], before[1])
+    # Each table contributes at most `limit` rows, read in index order.
+    part = ("SELECT * FROM (SELECT id, book_id, borrow_date, due_date, return_date FROM {table} "
+            f"WHERE {where} ORDER BY borrow_date DESC, id DESC LIMIT ?)")
+    conn = get_read_connection()
+    rows = conn.execute(
+        "SELECT h.id, h.book_id, h.borrow_date, h.due_date, h.return_date, b.title, b.author, b.isbn "
+        f"FROM ({part.format(table='borrow_records')} UNION ALL {part.format(table='borrow_records_archive')}) h "
+        "JOIN books b ON b.id = h.book_id "
+        "ORDER BY h.borrow_date DESC, h.id DESC LIMIT ?",
+        params + (limit,) + params + (limit, limit)
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+# ---------- Refund Journal ----------
+
+# Keep IN (...) lists well under SQLite's default host parameter limit.
+_IN_CHUNK = 500
+
+def get_refund_journal_entries(transaction_ids: List[str]) -> Dict[str, sqlite3.Row]:
+    """Return journal rows keyed by transaction id for the given ids (missing ids are omitted)."""
+    ids = list(transaction_ids)
+    out: Dict[str, sqlite3.Row] = {}
+    conn = get_read_connection()
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[i:i + _IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f"SELECT * FROM refund_journal WHERE transaction_id IN ({placeholders})", chunk
+        ).fetchall()
+        for r in rows:
+            out[r['transaction_id']] = r
+    conn.close()
+    return out
+
+@retry_on_busy()
+def claim_refund(transaction_id: str, amount: float) -> bool:
+    """
+    Atomically mark a refund 'pending' before the gateway is called: succeeds for a new
+    transaction or one whose last attempt failed, and fails (False) if another run has
+    already claimed or refunded it, so only one caller ever sends it to the gateway.
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.execute(
+            "INSERT INTO refund_journal(transaction_id, amount, status, message, updated_at) "
+            "VALUES (?, ?, 'pending', NULL, ?) "
+            "ON CONFLICT(transaction_id) DO UPDATE SET amount = excluded.amount, status = 'pending', "
+            "message = NULL, updated_at = excluded.updated_at WHERE refund_journal.status = 'failed'",
+            (transaction_id, amount, datetime.now().isoformat())
+        )
+        conn.commit()
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+@retry_on_busy()
+def upsert_refund_journal_entry(transaction_id: str, amount: float, status: str, message: Optional[str] = None) -> None:
+    """Record the latest known state of a refund ('pending', 'refunded' or 'failed')."""
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO refund_journal(transaction_id, amount, status, message, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(transaction_id) DO UPDATE SET amount = excluded.amount, status = excluded.status, "
+            "message = excluded.message, updated_at = excluded.updated_at",
+            (transaction_id, amount, status, message, datetime.now().isoformat())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+# ---------- Patrons ----------
+# patrons.active_loans counts a patron's open borrow records and outstanding_fees sums the
+# late fees assessed when overdue loans were returned, less the payments in fee_payments
+# (a fee paid before its loan is returned shows as a credit until the return assesses it).
+# borrow_records (with its archive) and fee_payments are the source of truth:
+# insert_borrow_record/update_borrow_record_return_date adjust the counters in the
+# same transaction, or, after use_patron_triggers(True), SQLite triggers do (for writes
+# from any connection); record_fee_payment always does. check_patron_counters() finds
+# and repairs drift.
+_patron_triggers = False
+
+_PATRON_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS patrons_loan_opened AFTER INSERT ON borrow_records "
+    "WHEN NEW.return_date IS NULL BEGIN "
+    "INSERT INTO patrons(patron_id, active_loans) VALUES (NEW.patron_id, 1) "
+    "ON CONFLICT(patron_id) DO UPDATE SET active_loans = active_loans + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS patrons_loan_returned AFTER UPDATE OF return_date ON borrow_records "
+    "WHEN OLD.return_date IS NULL AND NEW.return_date IS NOT NULL BEGIN "
+    "UPDATE patrons SET active_loans = active_loans - 1, "
+    f"outstanding_fees = ROUND(outstanding_fees + {_late_fee_sql('NEW')}, 2) "
+    "WHERE patron_id = NEW.patron_id; END",
+)
+
+def use_patron_triggers(enabled: bool, install: bool = True) -> None:
+    """
+    Maintain the patrons counters with triggers (True) or in the write functions (False).
+    With install, also creates or drops the triggers; every process sharing the database
+    must use the same mode.
+    """
+    global _patron_triggers
+    _patron_triggers = enabled
+    if not install:
+        return
+    conn = get_db_connection()
+    try:
+        if enabled:
+            for statement in _PATRON_TRIGGERS:
+                conn.execute(statement)
+        else:
+            conn.execute("DROP TRIGGER IF EXISTS patrons_loan_opened")
+            conn.execute("DROP TRIGGER IF EXISTS patrons_loan_returned")
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_patron(patron_id: str) -> Optional[sqlite3.Row]:
+    conn = get_read_connection()
+    row = conn.execute("SELECT * FROM patrons WHERE patron_id = ?", (patron_id,)).fetchone()
+    conn.close()
+    return row
+
+def _op_record_fee_payment(cur: sqlite3.Cursor, patron_id: str, book_id: int, amount: float,
+                           transaction_id: str) -> bool:
+    row = cur.execute(
+        "SELECT id FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL "
+        "ORDER BY id DESC LIMIT 1",
+        (patron_id, book_id)
+    ).fetchone()
+    cur.execute(
+        "INSERT OR IGNORE INTO fee_payments(transaction_id, patron_id, record_id, amount, paid_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (transaction_id, patron_id, row['id'] if row else None, amount, datetime.now().isoformat())
+    )
+    if cur.rowcount != 1:
+        return False  # already recorded
+    cur.execute(
+        "INSERT INTO patrons(patron_id, outstanding_fees) VALUES (?, ROUND(-?, 2)) "
+        "ON CONFLICT(patron_id) DO UPDATE SET outstanding_fees = ROUND(outstanding_fees - ?, 2)",
+        (patron_id, amount, amount)
+    )
+    return True
+
+@retry_on_busy()
+def record_fee_payment(patron_id: str, book_id: int, amount: float, transaction_id: str) -> bool:
+    """
+    Record a successful late fee payment against the patron's open loan of `book_id` and
+    subtract it from their outstanding_fees. False if `transaction_id` was already recorded.
+    """
+    return _run_write(_op_record_fee_payment, patron_id, book_id, amount, transaction_id)
+
+_PATRON_TRUTH = (
+    "SELECT patron_id, SUM(active) AS active_loans, ROUND(TOTAL(fee), 2) AS outstanding_fees FROM ("
+    "SELECT br.patron_id, br.return_date IS NULL AS active, "
+    f"CASE WHEN br.return_date IS NOT NULL THEN {_late_fee_sql('br')} END AS fee "
+    "FROM (SELECT patron_id, due_date, return_date FROM borrow_records UNION ALL "
+    "SELECT patron_id, due_date, return_date FROM borrow_records_archive) br "
+    "UNION ALL SELECT patron_id, 0, -amount FROM fee_payments) GROUP BY patron_id"
+)
+
+def check_patron_counters(repair: bool = False) -> List[Dict[str, Any]]:
+    """
+    Compare every patron's counters with borrow_records and fee_payments and return the
+    mismatches as {'patron_id', 'active_loans', 'expected_active_loans', 'outstanding_fees',
+    'expected_outstanding_fees'}. With repair=True the counters are rebuilt from them in
+    the same transaction.
+    """
+    conn = get_db_connection()
+    try:
+        if repair:
+            conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute(
+            f"WITH truth AS ({_PATRON_TRUTH}) "
+            "SELECT t.patron_id, p.active_loans, t.active_loans AS expected_active_loans, "
+            "p.outstanding_fees, t.outstanding_fees AS expected_outstanding_fees "
+            "FROM truth t LEFT JOIN patrons p ON p.patron_id = t.patron_id "
+            "WHERE p.patron_id IS NULL OR p.active_loans != t.active_loans "
+            "OR ABS(p.outstanding_fees - t.outstanding_fees) > 0.005 "
+            "UNION ALL "
+            "SELECT p.patron_id, p.active_loans, 0, p.outstanding_fees, 0.0 FROM patrons p "
+            "WHERE (p.active_loans != 0 OR p.outstanding_fees != 0) "
+            "AND p.patron_id NOT IN (SELECT patron_id FROM truth) "
+            "ORDER BY 1"
+        ).fetchall()
+        if repair and rows:
+            _rebuild_patron_counters(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return [dict(r) for r in rows]
+
+def _rebuild_patron_counters(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "UPDATE patrons SET active_loans = 0, outstanding_fees = 0 "
+        f"WHERE patron_id NOT IN (SELECT patron_id FROM ({_PATRON_TRUTH}))"
+    )
+    conn.execute(
+        "INSERT INTO patrons(patron_id, active_loans, outstanding_fees) "
+        f"SELECT * FROM ({_PATRON_TRUTH}) WHERE true "
+        "ON CONFLICT(patron_id) DO UPDATE SET active_loans = excluded.active_loans, "
+        "outstanding_fees = excluded.outstanding_fees"
+    )
+
+def rebuild_patron_counters() -> None:
+    """Recompute every patron's counters from borrow_records and fee_payments (e.g. after a bulk load)."""
+    conn = get_db_connection()
+    try:
+        _rebuild_patron_counters(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+# ---------- Archival ----------
+# Closed loans older than a cutoff move from borrow_records (hot: open loans and recent
+# history) to borrow_records_archive (cold), one batch per transaction so writers are
+# never blocked for long. History reads and the patron counter checks read both tables.
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 5000
+
+@retry_on_busy()
+def _archive_batch(after_id: int, cutoff: str, batch_size: int, archived_at: str) -> Tuple[int, int]:
+    """Move the next batch of closed loans returned before cutoff; returns (rows moved, last id seen)."""
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        ids = [r[0] for r in conn.execute(
+            "SELECT id FROM borrow_records WHERE id > ? AND return_date IS NOT NULL AND return_date < ? "
+            "ORDER BY id LIMIT ?",
+            (after_id, cutoff, batch_size)
+        )]
+        if not ids:
+            conn.rollback()
+            return 0, after_id
+        where = "id > ? AND id <= ? AND return_date IS NOT NULL AND return_date < ?"
+        params = (after_id, ids[-1], cutoff)
+        conn.execute(
+            "INSERT INTO borrow_records_archive(id, patron_id, book_id, borrow_date, due_date, return_date, archived_at) "
+            f"SELECT id, patron_id, book_id, borrow_date, due_date, return_date, ? FROM borrow_records WHERE {where}",
+            (archived_at,) + params
+        )
+        moved = conn.execute(f"DELETE FROM borrow_records WHERE {where}", params).rowcount
+        conn.commit()
+        return moved, ids[-1]
+    finally:
+        conn.close()
+
+def _space_stats() -> Dict[str, Optional[int]]:
+    conn = get_db_connection()
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        stats: Dict[str, Optional[int]] = {
+            'file_bytes': conn.execute('PRAGMA page_count').fetchone()[0] * page_size,
+            'free_bytes': conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size,
+            'borrow_records_bytes': None,
+        }
+        try:
+            # dbstat is optional in SQLite builds.
+            stats['borrow_records_bytes'] = conn.execute(
+                "SELECT TOTAL(pgsize) FROM dbstat WHERE name = 'borrow_records'").fetchone()[0]
+        except sqlite3.OperationalError:
+            pass
+        return stats
+    finally:
+        conn.close()
+
+def archive_closed_loans(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                         vacuum: bool = False, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Move loans returned more than older_than_days ago into borrow_records_archive,
+    batch_size rows per transaction. With vacuum=True the file is compacted afterwards
+    (otherwise the freed pages are reused by later inserts). Returns
+    {'moved', 'batches', 'seconds', 'cutoff', 'before', 'after'}, where before/after hold
+    file_bytes, free_bytes and borrow_records_bytes (None without dbstat).
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=older_than_days)).isoformat()
+    before = _space_stats()
+    moved = batches = 0
+    after_id = 0
+    while True:
+        count, after_id = _archive_batch(after_id, cutoff, batch_size, now.isoformat())
+        if not count:
+            break
+        moved += count
+        batches += 1
+    if vacuum and moved:
+        conn = get_db_connection()
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+    return {
+        'moved': moved,
+        'batches': batches,
+        'seconds': round(time.perf_counter() - started, 3),
+        'cutoff': cutoff,
+        'before': before,
+        'after': _space_stats(),
+    }
+
+# ---------- Export ----------
+# Full-table dumps are streamed: rows are stepped out of the statement cursor
+# `chunk_size` at a time, so memory stays flat whatever the table size. Each export
+# runs in one read transaction and sees a single snapshot of the database.
+EXPORT_CHUNK_SIZE = 1000
+
+BOOK_EXPORT_COLUMNS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+LOAN_EXPORT_COLUMNS = ('id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date', 'archived_at')
+
+def _iter_chunks(queries: List[Tuple[str, Tuple[Any, ...]]], chunk_size: int) -> Iterator[List[tuple]]:
+    conn = get_read_connection()
+    conn.row_factory = None  # plain tuples; the pool restores sqlite3.Row on release
+    try:
+        conn.execute('BEGIN')
+        for sql, params in queries:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+
+def iter_books_export(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """Yield lists of up to chunk_size book rows (BOOK_EXPORT_COLUMNS order) by id."""
+    sql = f"SELECT {', '.join(BOOK_EXPORT_COLUMNS)} FROM books ORDER BY id"
+    return _iter_chunks([(sql, ())], chunk_size)
+
+def iter_loans_export(since: Optional[str] = None, until: Optional[str] = None, include_archived: bool = True,
+                      chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield lists of up to chunk_size borrow records (LOAN_EXPORT_COLUMNS order): live ones,
+    then archived ones (archived_at set). `since` <= borrow_date < `until` (ISO strings) when
+    given; the range is read through the borrow_date indexes, in borrow_date order.
+    """
+    where, params = [], ()  # type: List[str], Tuple[Any, ...]
+    if since is not None:
+        where.append('borrow_date >= ?')
+        params += (since,)
+    if until is not None:
+        where.append('borrow_date < ?')
+        params += (until,)
+    clause = f" WHERE {' AND '.join(where)} ORDER BY borrow_date, id" if where else " ORDER BY id"
+    columns = ', '.join(LOAN_EXPORT_COLUMNS[:-1])
+    queries = [(f"SELECT {columns}, NULL FROM borrow_records{clause}", params)]
+    if include_archived:
+        queries.append((f"SELECT {columns}, archived_at FROM borrow_records_archive{clause}", params))
+    return _iter_chunks(queries, chunk_size)
+
+# ---------- Notices ----------
+# Due-soon / overdue notices are generated in bulk by services.notice_service into
+# notice_outbox, and handed to the mailer from there. Open loans are read from the
+# partial idx_borrow_records_open_due index, which holds open loans only, already in
+# patron and due_date order with the due_date range checked inside the index: no table
+# scan, no sort, and the first rows arrive at once.
+
+def iter_open_loans_due_before(due_before: str, after_patron: Optional[str] = None,
+                               chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield lists of (record id, patron_id, book_id, title, due_date) for open loans due
+    before `due_before`, ordered by patron_id then due_date, starting after `after_patron`.
+    """
+    sql = ("SELECT br.id, br.patron_id, br.book_id, b.title, br.due_date "
+           "FROM borrow_records br JOIN books b ON b.id = br.book_id "
+           "WHERE br.return_date IS NULL AND br.due_date < ? AND br.patron_id > ? "
+           "ORDER BY br.patron_id, br.due_date")
+    return _iter_chunks([(sql, (due_before, after_patron or ''))], chunk_size)
+
+@retry_on_busy()
+def insert_notices(notices: List[Tuple[str, str, str, str]], created_at: str) -> int:
+    """
+    Add (patron_id, kind, notice_date, payload JSON) rows to the outbox in one transaction.
+    Notices already queued for the same patron, kind and date are skipped; returns rows added.
+    """
+    conn = get_db_connection()
+    try:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO notice_outbox(patron_id, kind, notice_date, payload, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [n + (created_at,) for n in notices])
+        conn.commit()
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
+def get_pending_notices(limit: int) -> List[Dict[str, Any]]:
+    """The oldest `limit` unsent notices (id, patron_id, kind, notice_date, payload)."""
+    conn = get_read_connection()
+    rows = conn.execute(
+        "SELECT id, patron_id, kind, notice_date, payload FROM notice_outbox "
+        "WHERE sent_at IS NULL ORDER BY id LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+@retry_on_busy()
+def mark_notices_sent(notice_ids: List[int], sent_at: str) -> int:
+    conn = get_db_connection()
+    try:
+        cur = conn.executemany("UPDATE notice_outbox SET sent_at = ? WHERE id = ? AND sent_at IS NULL",
+                               [(sent_at, i) for i in notice_ids])
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+# ---------- Scheduler ----------
+# Every worker process may run a scheduler (scheduler.py); only the holder of the
+# scheduler_lease row runs jobs. The lease is taken or renewed with one atomic upsert
+# that only succeeds for the current owner or once the previous owner's lease expired.
+# Times are epoch seconds (time.time()) so they compare across processes.
+
+@retry_on_busy()
+def acquire_lease(name: str, owner: str, ttl: float, now: Optional[float] = None) -> bool:
+    """Take or renew lease `name` for `owner` until now + ttl; False while someone else holds it."""
+    now = time.time() if now is None else now
+    conn = get_db_connection()
+    try:
+        cur = conn.execute(
+            "INSERT INTO scheduler_lease(name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE scheduler_lease.owner = excluded.owner OR scheduler_lease.expires_at < ?",
+            (name, owner, now + ttl, now))
+        conn.commit()
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+@retry_on_busy()
+def release_lease(name: str, owner: str) -> None:
+    conn = get_db_connection()
+    try:
+        conn.execute("DELETE FROM scheduler_lease WHERE name = ? AND owner = ?", (name, owner))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_lease(name: str) -> Optional[Dict[str, Any]]:
+    conn = get_read_connection()
+    row = conn.execute("SELECT name, owner, expires_at FROM scheduler_lease WHERE name = ?", (name,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_job_states() -> Dict[str, Dict[str, Any]]:
+    """Rows of scheduled_jobs keyed by job name."""
+    conn = get_read_connection()
+    rows = conn.execute("SELECT * FROM scheduled_jobs ORDER BY name").fetchall()
+    conn.close()
+    return {r['name']: dict(r) for r in rows}
+
+@retry_on_busy()
+def schedule_job(name: str, next_run_at: float) -> None:
+    """Set a job's next run time (creating its row if needed)."""
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO scheduled_jobs(name, next_run_at) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET next_run_at = excluded.next_run_at",
+            (name, next_run_at))
+        conn.commit()
+    finally:
+        conn.close()
+
+@retry_on_busy()
+def record_job_run(name: str, started_at: str, duration: float, status: str, error: Optional[str],
+                   next_run_at: float) -> None:
+    """Record a finished run ('ok', 'partial', 'error' or 'timeout') and the job's next run time."""
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO scheduled_jobs(name) VALUES (?) ON CONFLICT(name) DO NOTHING", (name,))
+        conn.execute(
+            "UPDATE scheduled_jobs SET next_run_at = ?, last_started_at = ?, last_duration = ?, "
+            "last_status = ?, last_error = ?, runs = runs + 1, failures = failures + (? != 'ok') "
+            "WHERE name = ?",
+            (next_run_at, started_at, duration, status, error, status, name))
+        conn.commit()
+    finally:
+        conn.close()
+
+def optimize_statistics() -> None:
+    """PRAGMA optimize: refresh planner statistics (ANALYZE) for tables that need it."""
+    conn = get_db_connection()
+    try:
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+def checkpoint_wal(mode: str = 'PASSIVE') -> Tuple[int, int, int]:
+    """Checkpoint the WAL into the database file; returns (busy, wal pages, pages checkpointed)."""
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f'unknown checkpoint mode {mode!r}')
+    conn = get_db_connection()
+    try:
+        return tuple(conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone())
+    finally:
+        conn.close()
+
 # ---------- Search ----------
 
 def search_books_title(term: str):
-    conn = get_db_connection()
+    conn = get_read_connection()
     like = f'%{term.lower()}%'
     rows = conn.execute(
         "SELECT * FROM books WHERE LOWER(title) LIKE ? ORDER BY id", (like,)
@@ -201,7 +1222,7 @@ def search_books_title(term: str):
     return rows
 
 def search_books_author(term: str):
-    conn = get_db_connection()
+    conn = get_read_connection()
     like = f'%{term.lower()}%'
     rows = conn.execute(
         "SELECT * FROM books WHERE LOWER(author) LIKE ? ORDER BY id", (like,)
@@ -210,18 +1231,55 @@ def search_books_author(term: str):
     return rows
 
 def search_books_isbn(isbn: str):
-    conn = get_db_connection()
+    conn = get_read_connection()
     rows = conn.execute('SELECT * FROM books WHERE isbn = ? ORDER BY id', (isbn,)).fetchall()
     conn.close()
     return rows
 
+BOOK_COLUMNS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+
+def _book_search_filter(search_type: str, term: str) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    """WHERE clause and parameters for a title/author substring or exact ISBN search."""
+    if search_type == 'isbn':
+        return 'isbn = ?', (term,)
+    if search_type in ('title', 'author'):
+        escaped = term.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f"LOWER({search_type}) LIKE ? ESCAPE '\\'", (f'%{escaped}%',)
+    return None
+
+def search_books_page(search_type: str, term: str, columns: Tuple[str, ...], limit: int,
+                      after_id: int = 0) -> List[sqlite3.Row]:
+    """Up to `limit` matching books with id > after_id in id order, selecting only `columns` (plus id)."""
+    where = _book_search_filter(search_type, term)
+    if where is None:
+        return []
+    clause, params = where
+    select = ', '.join(['id'] + [c for c in columns if c in BOOK_COLUMNS and c != 'id'])
+    conn = get_read_connection()
+    rows = conn.execute(
+        f'SELECT {select} FROM books WHERE {clause} AND id > ? ORDER BY id LIMIT ?',
+        params + (after_id, limit)
+    ).fetchall()
+    conn.close()
+    return rows
+
+def count_books_matching(search_type: str, term: str) -> int:
+    where = _book_search_filter(search_type, term)
+    if where is None:
+        return 0
+    clause, params = where
+    conn = get_read_connection()
+    count = conn.execute(f'SELECT COUNT(*) FROM books WHERE {clause}', params).fetchone()[0]
+    conn.close()
+    return count
+
 
 def get_patron_borrowed_books(patron_id: str):
     """
     Return a list of ACTIVE borrows for the patron.
     Each item has at least: book_id, title, author, borrow_date (datetime), due_date (datetime), is_overdue (bool)
     """
-    conn = get_db_connection()
+    conn = get_read_connection()
     rows = conn.execute(
         "SELECT br.book_id, br.borrow_date, br.due_date, b.title, b.author "
         "FROM borrow_records br JOIN books b ON b.id = br.book_id "
@@ -253,16 +1311,18 @@ def get_patron_borrowed_books(patron_id: str):
 
 def get_patron_borrow_history(patron_id: str):
     """
-    Return a list of ALL borrows for the patron.
+    Return a list of ALL borrows for the patron, including archived ones.
     Each item has at least: book_id, title, borrow_date (datetime), return_date (datetime or None)
     """
-    conn = get_db_connection()
+    conn = get_read_connection()
     rows = conn.execute(
         "SELECT br.book_id, br.borrow_date, br.return_date, b.title "
-        "FROM borrow_records br JOIN books b ON b.id = br.book_id "
-        "WHERE br.patron_id = ? "
+        "FROM (SELECT book_id, borrow_date, return_date FROM borrow_records WHERE patron_id = ? "
+        "UNION ALL "
+        "SELECT book_id, borrow_date, return_date FROM borrow_records_archive WHERE patron_id = ?) br "
+        "JOIN books b ON b.id = br.book_id "
         "ORDER BY br.borrow_date DESC",
-        (patron_id,)
+        (patron_id, patron_id)
     ).fetchall()
     conn.close()
 
@@ -0,0 +1,297 @@
+"""
+Synthetic dataset generator for the Library Management System.
+
+Builds a deterministic, seeded catalog, patron population and loan history for
+load testing. Rows are written with bulk executemany() inserts inside one
+transaction per table, so multi-million row databases build in minutes.
+
+Usage:
+    python -m datagen --books 1000000 --patrons 50000 --loans 10000000 --seed 42
+    flask generate-data --books 100000 --loans 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import database
+
+BATCH = 50_000
+MAX_ACTIVE_PER_PATRON = 5  # mirrors library_service.MAX_BORROW_LIMIT
+BORROW_DAYS = 14           # mirrors library_service.BORROW_DAYS
+HISTORY_DAYS = 5 * 365
+
+_ADJECTIVES = [
+    'Silent', 'Hidden', 'Last', 'Golden', 'Broken', 'Forgotten', 'Crimson', 'Endless', 'Quiet', 'Wild',
+    'Distant', 'Secret', 'Burning', 'Frozen', 'Little', 'Great', 'Dark', 'Bright', 'Lost', 'Final',
+    'Winter', 'Summer', 'Midnight', 'Ancient', 'Restless', 'Scarlet', 'Hollow', 'Shattered', 'Northern', 'Savage',
+]
+_NOUNS = [
+    'River', 'Garden', 'House', 'Kingdom', 'Shadow', 'Ocean', 'City', 'Mountain', 'Letter', 'Mirror',
+    'Storm', 'Road', 'Island', 'Forest', 'Empire', 'Daughter', 'Stranger', 'Promise', 'Machine', 'Orchard',
+    'Harbor', 'Lantern', 'Witness', 'Crown', 'Bridge', 'Library', 'Winter', 'Compass', 'Signal', 'Archive',
+]
+_PLACES = [
+    'Paris', 'the North', 'Avalon', 'the Valley', 'Babylon', 'the Desert', 'Lisbon', 'the Sea', 'Kyoto', 'Arden',
+]
+_SUBJECTS = [
+    'Python', 'Statistics', 'Algorithms', 'Databases', 'Economics', 'History', 'Philosophy', 'Chemistry',
+    'Design', 'Networks', 'Biology', 'Software Testing', 'Linear Algebra', 'Poetry', 'Astronomy',
+]
+_TEMPLATES = [
+    'The {adj} {noun}', 'The {noun} of {noun2}', '{adj} {noun}', 'A {noun} in {place}',
+    'The {noun}', '{noun} and {noun2}', 'Introduction to {subject}', '{subject}: A Practical Guide',
+    'The {adj} {noun}: A Novel', 'Letters from {place}', 'The {noun}\'s {noun2}', 'Return to {place}',
+]
+_FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+    'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Ngozi', 'Hiroshi', 'Priya', 'Mateo', 'Olga', 'Wei', 'Fatima', 'Lars', 'Ines', 'Kwame',
+    'Chloe', 'Arjun', 'Sofia', 'Liam', 'Amara', 'Dmitri', 'Yuki', 'Elena', 'Omar', 'Grace',
+]
+_LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Okafor', 'Tanaka', 'Patel', 'Rossi', 'Ivanova', 'Chen', 'Haddad', 'Larsen', 'Silva', 'Mensah',
+    'Fitzgerald', 'Orwell', 'Austen', 'Dickens', 'Morrison', 'Achebe', 'Murakami', 'Tolstoy', 'Woolf', 'Borges',
+]
+_INITIALS = 'ABCDEFGHIJKLMNOPRSTW'
+
+
+def _isbn13(n: int) -> str:
+    """Return a valid ISBN-13 (978 prefix, correct check digit) for sequence number n."""
+    body = f'978{n:09d}'
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+def _author_name(k: int) -> str:
+    first = _FIRST_NAMES[k % len(_FIRST_NAMES)]
+    last = _LAST_NAMES[(k // len(_FIRST_NAMES)) % len(_LAST_NAMES)]
+    rest = k // (len(_FIRST_NAMES) * len(_LAST_NAMES))
+    if rest == 0:
+        return f'{first} {last}'
+    return f'{first} {_INITIALS[rest % len(_INITIALS)]}. {last}'
+
+
+def _title(rng: random.Random) -> str:
+    return rng.choice(_TEMPLATES).format(
+        adj=rng.choice(_ADJECTIVES), noun=rng.choice(_NOUNS), noun2=rng.choice(_NOUNS),
+        place=rng.choice(_PLACES), subject=rng.choice(_SUBJECTS),
+    )
+
+
+def patron_ids(patrons: int, seed: int) -> List[str]:
+    """The deterministic list of 6-digit patron ids generate_dataset uses for a seed."""
+    if patrons > 900_000:
+        raise ValueError('At most 900000 distinct 6-digit patron ids exist.')
+    rng = random.Random(f'{seed}-patrons')
+    return [str(n) for n in rng.sample(range(100_000, 1_000_000), patrons)]
+
+
+def _insert_batches(conn: sqlite3.Connection, sql: str, rows: Iterator[Tuple]) -> int:
+    count = 0
+    batch: List[Tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        count += len(batch)
+    conn.commit()
+    return count
+
+
+def generate_dataset(path: Optional[str] = None, books: int = 10_000, patrons: int = 1_000,
+                     loans: int = 50_000, overdue_ratio: float = 0.1, active_ratio: float = 0.05,
+                     seed: int = 42, as_of: Optional[datetime] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    Generate a synthetic dataset into the database at `path` (default database.DATABASE).
+
+    - books: catalog size; authors follow a Zipf-like popularity curve, so a few
+      authors have many titles and most have one or two.
+    - patrons: number of distinct 6-digit patron ids.
+    - loans: total borrow records; `active_ratio` of them are still open
+      (capped so no patron exceeds 5 open loans and no book is over-lent).
+    - overdue_ratio: fraction of open loans whose due date is before `as_of`.
+
+    The same arguments (including `seed` and `as_of`) always produce the same rows.
+    Returns a summary dict of row counts and elapsed seconds.
+    """
+    if books <= 0 or patrons <= 0 or loans < 0:
+        raise ValueError('books and patrons must be positive and loans non-negative.')
+    if not 0.0 <= overdue_ratio <= 1.0 or not 0.0 <= active_ratio <= 1.0:
+        raise ValueError('overdue_ratio and active_ratio must be between 0 and 1.')
+
+    path = path or database.DATABASE
+    as_of = (as_of or datetime.now()).replace(microsecond=0)
+    started = time.perf_counter()
+
+    if os.path.exists(path):
+        if not force:
+            conn = sqlite3.connect(path)
+            try:
+                has_books = conn.execute('SELECT 1 FROM books LIMIT 1').fetchone() is not None
+            except sqlite3.OperationalError:
+                has_books = False
+            conn.close()
+            if has_books:
+                raise ValueError(f'{path} already contains books; pass force=True to replace it.')
+        os.remove(path)
+
+    previous = database.DATABASE
+    database.DATABASE = path
+    try:
+        database.init_database()
+    finally:
+        database.DATABASE = previous
+
+    rng = random.Random(seed)
+    pids = patron_ids(patrons, seed)
+
+    # Copies per book (1-5, mostly 1-2) and author popularity.
+    copies = bytearray(rng.choices((1, 2, 3, 4, 5), weights=(40, 30, 15, 10, 5), k=books))
+    num_authors = max(1, books // 8)
+    author_weights = [1.0 / (k + 5) ** 1.05 for k in range(num_authors)]
+    cum = []
+    acc = 0.0
+    for w in author_weights:
+        acc += w
+        cum.append(acc)
+    author_order = list(range(num_authors))
+    rng.shuffle(author_order)
+
+    # Timestamps are day offsets from as_of's date plus a time of day; both are
+    # pre-formatted once, since per-row datetime arithmetic dominates build time.
+    base = datetime.combine(as_of.date(), datetime.min.time())
+    horizon = HISTORY_DAYS + BORROW_DAYS + 61
+    day_str = [(base - timedelta(days=d)).date().isoformat() for d in range(-BORROW_DAYS - 1, horizon)]
+    clock = [f'T{h:02d}:{m:02d}:00' for h in range(24) for m in range(60)]
+
+    def _day(offset: int) -> str:
+        # offset = days before as_of (negative = in the future)
+        return day_str[offset + BORROW_DAYS + 1]
+
+    # Plan open loans first so book availability can be written consistently.
+    available = bytearray(copies)
+    active_per_patron = bytearray(patrons)
+    capacity = min(patrons * MAX_ACTIVE_PER_PATRON, sum(copies))
+    active_target = min(int(loans * active_ratio), int(capacity * 0.8))
+    num_overdue = int(active_target * overdue_ratio)
+    active: List[Tuple[str, int, str, str]] = []
+    attempts = 0
+    while len(active) < active_target and attempts < active_target * 20:
+        attempts += 1
+        p = rng.randrange(patrons)
+        b = rng.randrange(books)
+        if active_per_patron[p] >= MAX_ACTIVE_PER_PATRON or available[b] == 0:
+            continue
+        active_per_patron[p] += 1
+        available[b] -= 1
+        if len(active) < num_overdue:
+            borrowed = rng.randint(BORROW_DAYS + 1, BORROW_DAYS + 60)
+        else:
+            borrowed = rng.randint(0, BORROW_DAYS - 1)
+        t = rng.choice(clock)
+        active.append((pids[p], b + 1, _day(borrowed) + t, _day(borrowed - BORROW_DAYS) + t))
+
+    def _books() -> Iterator[Tuple]:
+        batch = 10_000
+        for start in range(0, books, batch):
+            n = min(batch, books - start)
+            picks = rng.choices(author_order, cum_weights=cum, k=n)
+            for j in range(n):
+                i = start + j
+                yield (_title(rng), _author_name(picks[j]), _isbn13(i + 1), copies[i], available[i])
+
+    def _history() -> Iterator[Tuple]:
+        rand = rng.random
+        span = HISTORY_DAYS - BORROW_DAYS + 1
+        for _ in range(loans - len(active)):
+            borrowed = BORROW_DAYS + int(rand() * span)
+            due = borrowed - BORROW_DAYS
+            # Most returns are on time; a tail comes back up to three weeks late.
+            if rand() < 0.15:
+                returned = max(0, due - 1 - int(rand() * 21))
+            else:
+                returned = due + int(rand() * 14)
+            t = clock[int(rand() * len(clock))]
+            yield (pids[int(rand() * patrons)], 1 + int(rand() * books),
+                   _day(borrowed) + t, _day(due) + t, _day(returned) + t)
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    try:
+        num_books = _insert_batches(
+            conn,
+            "INSERT INTO books(title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)",
+            _books())
+        num_history = _insert_batches(
+            conn,
+            "INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)",
+            _history())
+        num_active = _insert_batches(
+            conn,
+            "INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, NULL)",
+            iter(active))
+        # Bulk loading used an in-memory journal; go back to the app's WAL mode.
+        conn.execute('PRAGMA journal_mode = WAL')
+    finally:
+        conn.close()
+
+    # The raw inserts bypassed the patrons counters; derive them from borrow_records.
+    database.DATABASE = path
+    try:
+        database.rebuild_patron_counters()
+    finally:
+        database.DATABASE = previous
+
+    return {
+        'path': path,
+        'books': num_books,
+        'patrons': patrons,
+        'loans': num_history + num_active,
+        'active_loans': num_active,
+        'overdue_loans': min(num_overdue, num_active),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic library dataset.')
+    parser.add_argument('--db', help='database path (default: database.DATABASE)')
+    parser.add_argument('--books', type=int, default=10_000)
+    parser.add_argument('--patrons', type=int, default=1_000)
+    parser.add_argument('--loans', type=int, default=50_000)
+    parser.add_argument('--overdue-ratio', type=float, default=0.1)
+    parser.add_argument('--active-ratio', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', help='reference date (YYYY-MM-DD) for due dates; default now')
+    parser.add_argument('--force', action='store_true', help='replace an existing non-empty database')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    as_of = datetime.fromisoformat(args.as_of) if args.as_of else None
+    try:
+        stats = generate_dataset(args.db, args.books, args.patrons, args.loans, args.overdue_ratio,
+                                 args.active_ratio, args.seed, as_of, args.force)
+    except ValueError as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    print(', '.join(f'{k}={v}' for k, v in stats.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+db_writer.py
+Single-writer thread with group commit for borrow, return and availability writes.
+
+SQLite allows one writer at a time, so request threads committing on their own
+connections queue up on the database lock and pay one fsync per commit. When the
+writer is running, database._run_write() hands each write operation (an
+_op_*(cur, ...) function from database.py) to one thread that owns the write
+connection. The thread drains whatever is queued, runs up to MAX_BATCH operations
+inside a single BEGIN IMMEDIATE ... COMMIT (one fsync for the whole batch) and
+resolves each caller's future once the batch is durable. Every operation runs
+under its own SAVEPOINT, so one that raises is rolled back and reported to its
+caller without failing the rest of the batch.
+"""
+
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import database
+from metrics import REGISTRY, Histogram
+
+MAX_BATCH = 64
+# Seconds a request thread waits for its write before giving up.
+WRITE_TIMEOUT = 30.0
+
+BATCH_SIZE = REGISTRY.register(Histogram(
+    'library_db_write_batch_size', 'Write operations committed per group-commit transaction.',
+    (), (1, 2, 4, 8, 16, 32, 64)))
+
+_STOP = object()
+
+_Item = Tuple[Callable[..., Any], Tuple[Any, ...], Future]
+
+
+class GroupCommitWriter:
+    """One thread, one write connection; queued operations are committed in batches."""
+
+    def __init__(self, path: Optional[str] = None, max_batch: int = MAX_BATCH):
+        self.path = path or database.DATABASE
+        self.max_batch = max(1, max_batch)
+        self._queue: 'queue.Queue[Any]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'GroupCommitWriter':
+        with self._lock:
+            if not self.running:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Commit everything already queued, then stop the thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+    def submit(self, op: Callable[..., Any], *args: Any) -> Future:
+        """Queue op(cur, *args); the future resolves after the batch containing it commits."""
+        future: Future = Future()
+        self._queue.put((op, args, future))
+        return future
+
+    def call(self, op: Callable[..., Any], *args: Any, timeout: Optional[float] = WRITE_TIMEOUT) -> Any:
+        future = self.submit(op, *args)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            # Still queued: cancel it so it can never commit after the caller gave up.
+            # Already running: it is part of a batch that is about to commit or fail, so wait.
+            if future.cancel():
+                raise
+            return future.result()
+
+    def execute(self, op: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        """database write executor: run op(cur, *args) through the queue and wait for the commit."""
+        return self.call(op, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'operations': self.operations,
+            'largest_batch': self.largest_batch,
+            'mean_batch': round(self.operations / self.batches, 2) if self.batches else 0.0,
+        }
+
+    # ---------- Writer thread ----------
+
+    def _run(self) -> None:
+        conn = database.get_db_connection(self.path)
+        # Transactions are managed explicitly below.
+        conn.isolation_level = None
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch: List[_Item] = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn, batch: List[_Item]) -> None:
+        outcomes: List[Tuple[Future, bool, Any]] = []
+        cur = conn.cursor()
+        try:
+            cur.execute('BEGIN IMMEDIATE')
+            for op, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cur.execute('SAVEPOINT write_op')
+                try:
+                    result = op(cur, *args)
+                except Exception as e:
+                    cur.execute('ROLLBACK TO write_op')
+                    cur.execute('RELEASE write_op')
+                    outcomes.append((future, False, e))
+                else:
+                    cur.execute('RELEASE write_op')
+                    outcomes.append((future, True, result))
+            cur.execute('COMMIT')
+        except Exception as e:
+            # BEGIN or COMMIT failed (e.g. the database stayed locked by another process):
+            # nothing in this batch was written.
+            if conn.in_transaction:
+                try:
+                    cur.execute('ROLLBACK')
+                except Exception:
+                    pass
+            for _, _, future in batch:
+                # Ops after a failed BEGIN were never started; a caller may cancel them meanwhile.
+                if future.running() or (not future.done() and future.set_running_or_notify_cancel()):
+                    future.set_exception(e)
+            return
+        finally:
+            cur.close()
+
+        self.batches += 1
+        self.operations += len(outcomes)
+        self.largest_batch = max(self.largest_batch, len(outcomes))
+        BATCH_SIZE.observe(len(outcomes))
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+_writer: Optional[GroupCommitWriter] = None
+
+
+def start(path: Optional[str] = None, max_batch: int = MAX_BATCH) -> GroupCommitWriter:
+    """Start the process-wide writer for `path` and route database writes through it."""
+    global _writer
+    path = path or database.DATABASE
+    if _writer is not None and (_writer.path != path or not _writer.running):
+        stop()
+    if _writer is None:
+        _writer = GroupCommitWriter(path, max_batch).start()
+        database.set_write_executor(_writer.execute)
+    return _writer
+
+
+def stop() -> None:
+    """Flush and stop the writer; writes go back to per-call connections."""
+    global _writer
+    writer, _writer = _writer, None
+    if writer is not None:
+        database.set_write_executor(None)
+        writer.stop()
+
+
+def get_writer() -> Optional[GroupCommitWriter]:
+    return _writer
+
+
+def _after_fork_in_child() -> None:
+    # The writer thread does not exist in a forked child; fall back to direct writes
+    # until the child starts its own writer.
+    global _writer
+    if _writer is not None:
+        _writer = None
+        database.set_write_executor(None)
+
+
+atexit.register(stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,154 @@
+"""
+instrumentation.py
+Per-request performance instrumentation for the Library Management System.
+
+When enabled (PERF_INSTRUMENTATION config), create_app installs before/after
+request hooks that record wall time, SQL query count and SQL time (through a
+database query observer) and payment gateway time for every request. Records
+are kept in a fixed-size ring buffer served at /debug/perf and summarized in a
+Server-Timing response header.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import database
+
+DEFAULT_RING_SIZE = 1000
+
+
+class RequestStats:
+    """Timing counters for the request being handled in the current context."""
+
+    __slots__ = ('sql_count', 'sql_time', 'gateway_time')
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.gateway_time = 0.0
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('request_stats', default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats for the current request, or None outside an instrumented request."""
+    return _current.get()
+
+
+def _on_query(event: str, sql: str, params: Any, elapsed: float) -> None:
+    stats = _current.get()
+    if stats is None:
+        return
+    if event == 'execute':
+        stats.sql_count += 1
+    stats.sql_time += elapsed
+
+
+@contextmanager
+def timed_gateway():
+    """Add the time spent in the block to the current request's gateway time."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.gateway_time += time.perf_counter() - start
+
+
+class PerfRecorder:
+    """Thread-safe ring buffer of per-request timing records."""
+
+    def __init__(self, capacity: int = DEFAULT_RING_SIZE):
+        self.capacity = capacity
+        self._records: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records.append(entry)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = list(self._records)
+        return records[-limit:] if limit else records
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint aggregates over the records currently in the buffer."""
+        by_endpoint: Dict[str, List[Dict[str, Any]]] = {}
+        for r in self.recent():
+            by_endpoint.setdefault(r['endpoint'], []).append(r)
+        out = {}
+        for endpoint, rows in sorted(by_endpoint.items()):
+            walls = sorted(r['wall_ms'] for r in rows)
+            n = len(rows)
+            out[endpoint] = {
+                'count': n,
+                'wall_ms_mean': round(sum(walls) / n, 3),
+                'wall_ms_p50': walls[n // 2],
+                'wall_ms_p95': walls[min(n - 1, int(n * 0.95))],
+                'wall_ms_max': walls[-1],
+                'sql_queries_mean': round(sum(r['sql_queries'] for r in rows) / n, 2),
+                'sql_ms_mean': round(sum(r['sql_ms'] for r in rows) / n, 3),
+                'gateway_ms_mean': round(sum(r['gateway_ms'] for r in rows) / n, 3),
+            }
+        return out
+
+
+def install_perf_hooks(app, capacity: int = DEFAULT_RING_SIZE) -> PerfRecorder:
+    """Install request timing hooks on `app` and return the recorder backing /debug/perf."""
+    from flask import g, request
+
+    recorder = PerfRecorder(capacity)
+    app.extensions['perf_recorder'] = recorder
+    database.add_query_observer(_on_query)
+
+    @app.before_request
+    def _perf_start():
+        g._perf_start = time.perf_counter()
+        g._perf_token = _current.set(RequestStats())
+
+    @app.after_request
+    def _perf_finish(response):
+        stats = _current.get()
+        start = g.get('_perf_start')
+        if stats is None or start is None:
+            return response
+        wall_ms = (time.perf_counter() - start) * 1000.0
+        sql_ms = stats.sql_time * 1000.0
+        gateway_ms = stats.gateway_time * 1000.0
+        timing = [f'app;dur={wall_ms:.3f}', f'db;dur={sql_ms:.3f};desc="{stats.sql_count} queries"']
+        if gateway_ms:
+            timing.append(f'gateway;dur={gateway_ms:.3f}')
+        response.headers.add('Server-Timing', ', '.join(timing))
+        if request.blueprint != 'debug':
+            recorder.record({
+                'endpoint': request.endpoint or 'unmatched',
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'wall_ms': round(wall_ms, 3),
+                'sql_queries': stats.sql_count,
+                'sql_ms': round(sql_ms, 3),
+                'gateway_ms': round(gateway_ms, 3),
+                'timestamp': time.time(),
+            })
+        return response
+
+    @app.teardown_request
+    def _perf_reset(exc):
+        token = g.pop('_perf_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:  # token from another context; just clear it
+                _current.set(None)
+
+    return recorder
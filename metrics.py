@@ -0,0 +1,333 @@
+"""
+metrics.py
+In-process Prometheus metrics for the Library Management System.
+
+Counters and histograms keep one shard per thread, so recording a value is a
+thread-local dict update with no lock. Shards are merged only when /metrics is
+scraped; shards of finished threads are folded into a retired total so the
+per-request threads of a threaded server do not accumulate. Metrics are per process:
+under serve.py every sample is labeled with the worker id of the process that answered.
+"""
+
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import database
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+# Fold finished-thread shards once this many shards exist for one metric.
+_COMPACT_THRESHOLD = 256
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    parts.extend(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _ShardedMetric:
+    """Base class: per-thread data dicts merged on collect."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict[LabelValues, Any]]] = []
+        self._retired: Dict[LabelValues, Any] = {}
+
+    def _data(self) -> Dict[LabelValues, Any]:
+        try:
+            return self._local.data
+        except AttributeError:
+            data: Dict[LabelValues, Any] = {}
+            self._local.data = data
+            with self._lock:
+                if len(self._shards) >= _COMPACT_THRESHOLD:
+                    self._compact_locked()
+                self._shards.append((threading.current_thread(), data))
+            return data
+
+    def _merge_into(self, target: Dict[LabelValues, Any], source: Dict[LabelValues, Any]) -> None:
+        raise NotImplementedError
+
+    def _compact_locked(self) -> None:
+        live = []
+        for thread, data in self._shards:
+            if thread.is_alive():
+                live.append((thread, data))
+            else:
+                self._merge_into(self._retired, data)
+        self._shards = live
+
+    def collect(self) -> Dict[LabelValues, Any]:
+        """Merged values across all threads, keyed by label values."""
+        with self._lock:
+            self._compact_locked()
+            merged: Dict[LabelValues, Any] = {}
+            self._merge_into(merged, self._retired)
+            for _, data in self._shards:
+                self._merge_into(merged, data)
+        return merged
+
+    def reset(self) -> None:
+        """Drop all recorded values (e.g. in a freshly forked worker)."""
+        # A fresh lock: after fork the old one may be held by a thread that no longer exists.
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+
+    def render(self, const: Sequence[str] = ()) -> List[str]:
+        """Sample lines; `const` are preformatted labels added to every sample."""
+        raise NotImplementedError
+
+
+class Counter(_ShardedMetric):
+    kind = 'counter'
+
+    def inc(self, labels: LabelValues = (), amount: float = 1.0) -> None:
+        data = self._data()
+        data[labels] = data.get(labels, 0.0) + amount
+
+    def _merge_into(self, target, source):
+        for labels, value in list(source.items()):
+            target[labels] = target.get(labels, 0.0) + value
+
+    def render(self, const: Sequence[str] = ()) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels, *const)} {_format_value(value)}'
+                for labels, value in sorted(self.collect().items())]
+
+
+class Histogram(_ShardedMetric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        data = self._data()
+        entry = data.get(labels)
+        if entry is None:
+            # [per-bucket counts..., +Inf count, sum]
+            entry = data[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _merge_into(self, target, source):
+        for labels, entry in list(source.items()):
+            entry = list(entry)
+            existing = target.get(labels)
+            if existing is None:
+                target[labels] = entry
+            else:
+                for i, v in enumerate(entry):
+                    existing[i] += v
+
+    def render(self, const: Sequence[str] = ()) -> List[str]:
+        lines = []
+        for labels, entry in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, *const, 'le="' + _format_value(bound) + '"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels, *const)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(entry[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class GaugeFunc:
+    """Gauge whose values are computed at scrape time by a callback returning {labels: value}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+
+    def reset(self) -> None:
+        pass
+
+    def render(self, const: Sequence[str] = ()) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels, *const)} {_format_value(value)}'
+                for labels, value in sorted(self._fn().items())]
+
+
+def _worker_labels() -> Tuple[str, ...]:
+    # Each serve.py worker keeps its own metrics and answers scrapes for itself only, so
+    # its samples carry its worker id: every worker's counters form their own monotonic
+    # series (a restarted worker keeps its id and shows up as a counter reset).
+    worker_id = os.environ.get('LIBRARY_WORKER_ID')
+    return (f'worker="{_escape(worker_id)}"',) if worker_id else ()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.reset()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        const = _worker_labels()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(const))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'library_http_requests_total', 'HTTP requests by blueprint, endpoint and status code.',
+    ('blueprint', 'endpoint', 'status')))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    'library_http_request_duration_seconds', 'HTTP request latency by blueprint and endpoint.',
+    ('blueprint', 'endpoint')))
+OPERATION_OUTCOMES = REGISTRY.register(Counter(
+    'library_operation_outcomes_total',
+    'Borrow, return, payment and refund outcomes; failures are labeled with the service error message.',
+    ('operation', 'outcome')))
+DB_CONNECT_LATENCY = REGISTRY.register(Histogram(
+    'library_db_connect_seconds', 'Time to open a SQLite connection.', (), DB_BUCKETS))
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    'library_db_query_seconds', 'SQLite statement time by verb and phase (execute or fetch).',
+    ('verb', 'phase'), DB_BUCKETS))
+DB_WRITE_RETRIES = REGISTRY.register(Counter(
+    'library_db_write_retries_total', 'Write retries after SQLITE_BUSY, by write function and final outcome.',
+    ('operation', 'outcome')))
+DB_LOCK_WAIT = REGISTRY.register(Histogram(
+    'library_db_lock_wait_seconds',
+    'Time from the first attempt of a contended write to its success or final failure.',
+    ('operation', 'outcome')))
+CAS_CONFLICTS = REGISTRY.register(Counter(
+    'library_cas_conflicts_total',
+    'Optimistic (version compare-and-swap) availability updates retried after a conflict, by operation.',
+    ('operation',)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'library_cache_requests_total', 'Cache lookups by cache name and result (hit or miss).',
+    ('cache', 'result')))
+
+
+def _cache_hit_ratios() -> Dict[LabelValues, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.collect().items():
+        hits_misses = totals.setdefault(cache, [0.0, 0.0])
+        hits_misses[0 if result == 'hit' else 1] += value
+    return {(cache,): hits / (hits + misses) for cache, (hits, misses) in totals.items() if hits + misses}
+
+
+CACHE_HIT_RATIO = REGISTRY.register(GaugeFunc(
+    'library_cache_hit_ratio', 'Cache hit ratio since process start.', ('cache',), _cache_hit_ratios))
+
+# A forked worker starts with empty metrics instead of a copy of the parent's.
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=REGISTRY.reset)
+
+
+# ---------- Recording helpers ----------
+
+def outcome_label(success: bool, message: str) -> str:
+    """'success', or the failure message without any variable detail after a colon."""
+    if success:
+        return 'success'
+    return (message or 'unknown').split(':', 1)[0].strip()
+
+
+def record_outcome(operation: str):
+    """Decorator counting the (success, message, ...) results of a service function."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            try:
+                OPERATION_OUTCOMES.inc((operation, outcome_label(bool(result[0]), result[1])))
+            except (TypeError, IndexError):
+                pass
+            return result
+        return wrapper
+    return decorator
+
+
+def record_conflict(operation: str) -> None:
+    CAS_CONFLICTS.inc((operation,))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc((cache, 'hit' if hit else 'miss'))
+
+
+def _on_query(event: str, sql: str, params: Any, elapsed: float) -> None:
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql and sql.strip() else 'OTHER'
+    DB_QUERY_LATENCY.observe(elapsed, (verb, event))
+
+
+def _on_connect(elapsed: float) -> None:
+    DB_CONNECT_LATENCY.observe(elapsed)
+
+
+def _on_retry(operation: str, retries: int, waited: float, succeeded: bool) -> None:
+    outcome = 'success' if succeeded else 'failure'
+    DB_WRITE_RETRIES.inc((operation, outcome), retries)
+    DB_LOCK_WAIT.observe(waited, (operation, outcome))
+
+
+def install_metrics_hooks(app) -> None:
+    """Record request latency for `app` and database timings for this process."""
+    from flask import g, request
+
+    database.add_connect_observer(_on_connect)
+    database.add_query_observer(_on_query)
+    database.add_retry_observer(_on_retry)
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_finish(response):
+        start = g.get('_metrics_start')
+        if start is not None:
+            blueprint = request.blueprint or 'none'
+            endpoint = request.endpoint or 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - start, (blueprint, endpoint))
+            HTTP_REQUESTS.inc((blueprint, endpoint, str(response.status_code)))
+        return response
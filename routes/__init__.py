@@ -8,6 +8,8 @@ from .borrowing_routes import borrowing_bp
 from .search_routes import search_bp
 from .api_routes import api_bp
 from .status_routes import status_bp  # NEW
+from .debug_routes import debug_bp
+from .metrics_routes import metrics_bp
 
 def register_blueprints(app):
     """Register all route blueprints with the Flask app."""
@@ -16,3 +18,7 @@ def register_blueprints(app):
     app.register_blueprint(search_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(status_bp)  # NEW
+    if app.config.get('METRICS_ENABLED'):
+        app.register_blueprint(metrics_bp)
+    if app.config.get('PERF_INSTRUMENTATION') or app.config.get('SQL_TRACE'):
+        app.register_blueprint(debug_bp)
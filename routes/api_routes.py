@@ -3,8 +3,17 @@ routes/api_routes.py
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+import json
+
+from flask import Blueprint, Response, jsonify, request
+from services.library_service import (
+    calculate_late_fee_for_book, search_books_page, suggest_books, SEARCH_PAGE_SIZE,
+    parse_refund_csv, refund_late_fee_payments_batch, REFUND_BATCH_WORKERS,
+    get_patron_history_page, HISTORY_PAGE_SIZE,
+)
+from services.export_service import export_records, MIMETYPES
+from services.search_index import SUGGEST_LIMIT
+from .caching import catalog_etag
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -22,14 +31,107 @@ def get_late_fee(patron_id, book_id):
     return jsonify(result), code
 
 @api_bp.route('/search')
+@catalog_etag
 def search_books_api():
     """
     Search for books via API endpoint.
     Alternative API interface for R6: Book Search Functionality
+    Paginated: ?limit=N (default 50, max 500) and ?cursor=<next_cursor of the previous page>;
+    ?fields=id,title,... restricts the keys of each result. `count` is the total number of matches.
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
-    books = search_books_in_catalog(search_term, search_type)
-    return jsonify({'search_term': search_term, 'search_type': search_type, 'results': books, 'count': len(books)}), 200
+    limit = request.args.get('limit', SEARCH_PAGE_SIZE, type=int)
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    ok, page = search_books_page(search_term, search_type, limit, request.args.get('cursor'), fields)
+    if not ok:
+        return jsonify({'error': page}), 400
+    # Compact separators and no key sorting keep large pages cheap to encode.
+    body = json.dumps(dict(search_term=search_term, search_type=search_type, **page),
+                      separators=(',', ':'), ensure_ascii=False)
+    return Response(body, 200, mimetype='application/json')
+
+@api_bp.route('/suggest')
+def suggest_api():
+    """
+    Search-as-you-type suggestions: ?q=<prefix>&type=title|author&limit=N (default 10, max 50).
+    Served from the in-memory prefix index, so it may lag other workers' inserts by a moment.
+    """
+    query = request.args.get('q', '')
+    search_type = request.args.get('type', 'title')
+    limit = request.args.get('limit', SUGGEST_LIMIT, type=int)
+    ok, suggestions = suggest_books(query, search_type, limit)
+    if not ok:
+        return jsonify({'error': suggestions}), 400
+    return jsonify({'query': query, 'type': search_type, 'suggestions': suggestions}), 200
+
+@api_bp.route('/patrons/<patron_id>/history')
+def patron_history_api(patron_id):
+    """
+    One page of a patron's borrowing history, newest first (the status page's "load more").
+    ?limit=N (default 20, max 200) and ?cursor=<next_cursor of the previous page>.
+    """
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    ok, page = get_patron_history_page(patron_id, request.args.get('cursor'), limit)
+    if not ok:
+        return jsonify({'error': page}), 400
+    return jsonify(page), 200
+
+@api_bp.route('/export/<kind>')
+def export_api(kind):
+    """
+    Stream every row of `books` or `borrow_records` (plus the archive) as CSV or NDJSON:
+    /api/export/books?format=csv|ndjson, /api/export/loans?format=...&since=YYYY-MM-DD&until=...&archived=0.
+    The body is sent as it is read (chunked), so memory use does not grow with the table.
+    """
+    fmt = request.args.get('format', 'csv')
+    ok, blocks = export_records(kind, fmt, request.args.get('since'), request.args.get('until'),
+                                request.args.get('archived', '1') != '0')
+    if not ok:
+        return jsonify({'error': blocks}), 400
+    filename = f'{kind}.{fmt}'
+    return Response(blocks, 200, mimetype=MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@api_bp.route('/refunds/batch', methods=['POST'])
+def batch_refunds_api():
+    """
+    Refund many late fee payments in one request.
+    Accepts a CSV body (text/csv) or uploaded file of `transaction_id,amount` rows,
+    or JSON: {"items": [{"transaction_id": "...", "amount": 1.5}, ...], "max_workers": 8}.
+    Re-submitting the same batch resumes it; already refunded items are skipped.
+    """
+    max_workers = request.args.get('max_workers', REFUND_BATCH_WORKERS, type=int)
+    upload = request.files.get('file')
+    if upload is not None or request.mimetype == 'text/csv':
+        raw = upload.read() if upload is not None else request.get_data()
+        try:
+            items = parse_refund_csv(raw.decode('utf-8-sig'))
+        except UnicodeDecodeError:
+            return jsonify({'error': 'CSV must be UTF-8 encoded'}), 400
+    else:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            max_workers = payload.get('max_workers', max_workers)
+            payload = payload.get('items')
+        if not isinstance(payload, list):
+            return jsonify({'error': 'Expected a CSV body or a JSON list of refund items'}), 400
+        items = []
+        for item in payload:
+            if isinstance(item, dict):
+                items.append((item.get('transaction_id'), item.get('amount')))
+            elif isinstance(item, (list, tuple)) and len(item) == 2:
+                items.append((item[0], item[1]))
+            else:
+                items.append((None, None))
+    if not items:
+        return jsonify({'error': 'No refund items provided'}), 400
+    try:
+        max_workers = int(max_workers)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_workers must be an integer'}), 400
+
+    report = refund_late_fee_payments_batch(items, max_workers=max_workers)
+    return jsonify(report), 200
@@ -0,0 +1,39 @@
+"""
+routes/caching.py
+Conditional GET support for catalog-derived pages, keyed on the catalog version
+"""
+
+from functools import wraps
+
+from flask import make_response, request, session
+import database
+from metrics import record_cache
+
+
+def catalog_etag(view):
+    """
+    Tag responses with an ETag built from the catalog version and answer a matching
+    If-None-Match with 304 before the view runs (so the books table is not read).
+    Responses that include pending flash messages are never tagged.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if '_flashes' in session:
+            return view(*args, **kwargs)
+        version = database.get_catalog_version()
+        if version is None:
+            return view(*args, **kwargs)
+        etag = f'catalog-{version}'
+        hit = etag in request.if_none_match
+        record_cache('catalog_etag', hit)
+        if hit:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Let browsers keep the page but revalidate it on every poll.
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -6,6 +6,7 @@ Catalog Routes - Book catalog related endpoints
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from database import get_all_books
 from services.library_service import add_book_to_catalog
+from .caching import catalog_etag
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -15,6 +16,7 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@catalog_etag
 def catalog():
     """
     Display all books in the catalog.
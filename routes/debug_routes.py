@@ -0,0 +1,40 @@
+"""
+routes/debug_routes.py
+Debug Routes - Performance diagnostics (registered only when instrumentation or SQL tracing is enabled)
+"""
+
+from flask import Blueprint, current_app, jsonify, request
+import sqltrace
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+@debug_bp.route('/perf')
+def perf():
+    """
+    Recent per-request timings and per-endpoint aggregates from the perf ring buffer.
+    Optional ?limit=N restricts how many recent records are returned (default 100).
+    """
+    recorder = current_app.extensions.get('perf_recorder')
+    if recorder is None:
+        return jsonify({'error': 'Performance instrumentation is disabled'}), 404
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'capacity': recorder.capacity,
+        'startup_ms': current_app.extensions.get('startup_timings', {}),
+        'endpoints': recorder.summary(),
+        'recent': recorder.recent(limit),
+    }), 200
+
+@debug_bp.route('/sql')
+def sql_stats():
+    """
+    Aggregate SQL statistics per normalized statement from the SQL tracer.
+    Optional ?reset=1 clears the counters after returning them.
+    """
+    tracer = sqltrace.get_tracer()
+    if tracer is None:
+        return jsonify({'error': 'SQL tracing is disabled'}), 404
+    stats = tracer.stats()
+    if request.args.get('reset') == '1':
+        tracer.reset()
+    return jsonify(stats), 200
@@ -0,0 +1,14 @@
+"""
+routes/metrics_routes.py
+Metrics Routes - Prometheus scrape endpoint
+"""
+
+from flask import Blueprint, Response
+from metrics import REGISTRY
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Expose in-process metrics in the Prometheus text exposition format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -3,12 +3,14 @@ routes/search_routes.py
 Search Routes - Book search functionality
 """
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, current_app, render_template, request
 from services.library_service import search_books_in_catalog
+from .caching import catalog_etag
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@catalog_etag
 def search_books():
     """
     Search for books in the catalog.
@@ -20,5 +22,6 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
 
-    books = search_books_in_catalog(search_term, search_type)
+    match = 'any' if request.args.get('match') == 'any' else 'all'
+    books = search_books_in_catalog(search_term, search_type, current_app.config.get('SEARCH_ENGINE'), match)
     return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
@@ -4,7 +4,7 @@ Patron Status Routes - Patron status page (R7)
 """
 
 from flask import Blueprint, render_template, request, flash
-from services.library_service import get_patron_status_report
+from services.library_service import get_patron_status_report, HISTORY_PAGE_SIZE
 
 status_bp = Blueprint('status', __name__)
 
@@ -13,7 +13,9 @@ def patron_status():
     patron_id = request.args.get('patron_id', '').strip()
     report = None
     if patron_id:
-        report = get_patron_status_report(patron_id)
+        # History is paged: the first page here, the rest via "load more".
+        report = get_patron_status_report(patron_id, request.args.get('history_cursor') or None,
+                                          HISTORY_PAGE_SIZE)
         if report.get('error'):
             flash(report['error'], 'error')
             report = None
@@ -0,0 +1,303 @@
+"""
+scheduler.py
+In-process periodic job scheduler for maintenance work kept off the request path.
+
+Each process that calls start() (create_app does when SCHEDULER is on) runs one
+scheduler thread, but only the process holding the 'scheduler' lease row runs jobs:
+the thread renews the lease every poll and the others take over once it expires
+(LEASE_TTL after its holder stops renewing). Next run times and the outcome of each
+run live in the scheduled_jobs table, so they survive restarts and a change of leader.
+
+Jobs run one at a time, each on its own thread so the scheduler can keep renewing the
+lease and enforce the job's timeout. A thread cannot be killed: a job that times out
+is recorded as 'timeout' and left to finish, and is not started again until it has.
+If the lease is lost while a job runs, no further jobs start until it is won back.
+"""
+
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+import database
+
+logger = logging.getLogger('library.scheduler')
+
+LEASE_NAME = 'scheduler'
+LEASE_TTL = 30.0
+POLL_INTERVAL = 5.0
+DEFAULT_JOB_TIMEOUT = 300.0
+
+
+class Every:
+    """Interval schedule: run every `seconds`."""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError('interval must be positive')
+        self.seconds = seconds
+
+    def next_after(self, t: float) -> float:
+        return t + self.seconds
+
+    def __repr__(self) -> str:
+        return f'Every({self.seconds:g}s)'
+
+
+class Cron:
+    """
+    Cron-like schedule in local time: 'minute hour day-of-month month day-of-week'.
+    Fields take '*', numbers, 'a-b' ranges, '/step' and comma lists; day of week is 0-6
+    from Sunday (7 is also Sunday). As in cron, when both day fields are restricted a
+    day matching either one is a match.
+    """
+
+    _FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f'cron expression needs 5 fields: {expr!r}')
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(part, lo, hi) for part, (lo, hi) in zip(parts, self._FIELDS))
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._any_day, self._any_weekday = parts[2] == '*', parts[4] == '*'
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> FrozenSet[int]:
+        values = set()
+        for item in field.split(','):
+            spec, _, step = item.partition('/')
+            if spec == '*':
+                start, end = lo, hi
+            elif '-' in spec:
+                start, end = (int(v) for v in spec.split('-', 1))
+            else:
+                start = end = int(spec)
+                if step:
+                    end = hi  # 'a/n': from a to the end of the range
+            if not lo <= start <= end <= hi or (step and int(step) < 1):
+                raise ValueError(f'bad cron field {field!r} (allowed {lo}-{hi})')
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return frozenset(values)
+
+    def _day_matches(self, dt: datetime) -> bool:
+        in_month = dt.day in self.days
+        in_week = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, t: float) -> float:
+        dt = datetime.fromtimestamp(t).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f'cron expression never matches: {self.expr!r}')
+
+    def __repr__(self) -> str:
+        return f'Cron({self.expr!r})'
+
+
+class Job:
+    def __init__(self, name: str, fn: Callable[[], Any], schedule: Any, timeout: float = DEFAULT_JOB_TIMEOUT):
+        self.name = name
+        self.fn = fn
+        self.schedule = schedule
+        self.timeout = timeout
+
+
+def default_jobs() -> List[Job]:
+    """The maintenance jobs create_app schedules."""
+    from services import notice_service
+
+    return [
+        Job('wal_checkpoint', database.checkpoint_wal, Every(300), timeout=60),
+        Job('optimize', database.optimize_statistics, Every(3600), timeout=120),
+        Job('archive_loans', lambda: database.archive_closed_loans(
+            database.ARCHIVE_AFTER_DAYS, database.ARCHIVE_BATCH_SIZE), Cron('30 3 * * *'), timeout=1800),
+        Job('patron_counters', lambda: database.check_patron_counters(repair=True), Cron('0 4 * * *'),
+            timeout=600),
+        Job('notices', notice_service.run_notices, Cron('0 6 * * *'),
+            timeout=notice_service.NOTICE_RUN_BUDGET + notice_service.NOTICE_TIME_BUDGET),
+    ]
+
+
+class Scheduler:
+    """Runs due jobs while this process holds the scheduler lease."""
+
+    def __init__(self, jobs: List[Job], lease_ttl: float = LEASE_TTL, poll_interval: float = POLL_INTERVAL):
+        names = [job.name for job in jobs]
+        if len(set(names)) != len(names):
+            raise ValueError('job names must be unique')
+        self.jobs = list(jobs)
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.leader = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # Timed-out jobs whose threads are still running.
+        self._overrunning: Dict[str, threading.Thread] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'Scheduler':
+        with self._lock:
+            if not self.running:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop after the current job (if any) and give up the lease."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stop.set()
+            thread.join(timeout)
+            self._thread = None
+
+    def tick(self, now: Optional[float] = None) -> List[str]:
+        """Renew the lease and run every job that is due; returns the names of the jobs run."""
+        now = time.time() if now is None else now
+        self.leader = database.acquire_lease(LEASE_NAME, self.owner, self.lease_ttl, now)
+        if not self.leader:
+            return []
+        states = database.get_job_states()
+        ran = []
+        for job in self.jobs:
+            if self._stop.is_set() or not self.leader:
+                break  # stopping, or the lease was lost while the previous job ran
+            overrun = self._overrunning.get(job.name)
+            if overrun is not None:
+                if overrun.is_alive():
+                    continue
+                del self._overrunning[job.name]
+            next_run_at = states.get(job.name, {}).get('next_run_at')
+            if next_run_at is None:
+                # First time this job is seen: schedule it rather than running it at startup.
+                database.schedule_job(job.name, job.schedule.next_after(now))
+            elif next_run_at <= now:
+                self.run_job(job, now)
+                ran.append(job.name)
+        return ran
+
+    def run_job(self, job: Job, now: Optional[float] = None) -> str:
+        """
+        Run one job now, up to its timeout, and record the outcome; returns the status.
+        A job that returns stats with 'complete' False (see notice_service.run_notices) is
+        recorded as 'partial'. The next run is scheduled from when this one ended (`now`
+        plus its duration).
+        """
+        outcome: Dict[str, Any] = {'status': 'timeout', 'error': f'still running after {job.timeout:g}s'}
+
+        def _target():
+            try:
+                result = job.fn()
+                if isinstance(result, dict) and result.get('complete') is False:
+                    outcome.update(status='partial',
+                                   error=f"incomplete, resume after {result.get('resume_after')}")
+                else:
+                    outcome.update(status='ok', error=None)
+            except Exception as e:
+                logger.exception('scheduled job %s failed', job.name)
+                outcome.update(status='error', error=f'{type(e).__name__}: {e}')
+
+        now = time.time() if now is None else now
+        started_at = datetime.now().isoformat()
+        started = time.perf_counter()
+        thread = threading.Thread(target=_target, name=f'job-{job.name}', daemon=True)
+        thread.start()
+        deadline = started + job.timeout
+        while thread.is_alive() and time.perf_counter() < deadline:
+            thread.join(min(deadline - time.perf_counter(), self.lease_ttl / 3))
+            if thread.is_alive() and self.leader and not database.acquire_lease(LEASE_NAME, self.owner,
+                                                                                  self.lease_ttl):
+                self.leader = False
+                logger.warning('scheduler lease lost while %s was running', job.name)
+        duration = round(time.perf_counter() - started, 3)
+        status, error = outcome['status'], outcome['error']
+        if thread.is_alive():
+            self._overrunning[job.name] = thread
+            logger.warning('scheduled job %s timed out after %.1fs', job.name, job.timeout)
+        database.record_job_run(job.name, started_at, duration, status, error, job.schedule.next_after(now + duration))
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        states = database.get_job_states()
+        return {
+            'running': self.running,
+            'leader': self.leader,
+            'owner': self.owner,
+            'jobs': {job.name: dict(states.get(job.name, {}), schedule=repr(job.schedule), timeout=job.timeout)
+                     for job in self.jobs},
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception('scheduler tick failed')
+            self._stop.wait(self.poll_interval)
+        if self.leader:
+            try:
+                database.release_lease(LEASE_NAME, self.owner)
+            except Exception:
+                pass
+            self.leader = False
+
+
+_scheduler: Optional[Scheduler] = None
+
+
+def start(jobs: Optional[List[Job]] = None, poll_interval: float = POLL_INTERVAL) -> Scheduler:
+    """Start the process-wide scheduler (default_jobs() unless `jobs` is given)."""
+    global _scheduler
+    if _scheduler is None or not _scheduler.running:
+        _scheduler = Scheduler(default_jobs() if jobs is None else jobs, poll_interval=poll_interval).start()
+    return _scheduler
+
+
+def stop() -> None:
+    global _scheduler
+    scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.stop()
+
+
+def get_scheduler() -> Optional[Scheduler]:
+    return _scheduler
+
+
+def _after_fork_in_child() -> None:
+    # The scheduler thread does not survive fork; the child starts its own (with a new
+    # owner id) if it wants one.
+    global _scheduler
+    _scheduler = None
+
+
+atexit.register(stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,232 @@
+"""
+serve.py
+Production serving entry point: a pre-forking WSGI server for create_app().
+
+The master process initializes the database schema once, binds the listening
+socket and forks the worker processes; it then only supervises them (restarting
+workers that exit and forwarding SIGTERM/SIGINT). Each worker runs post_fork(),
+builds its own app with create_app() (so connections, caches and pools are all
+created after the fork) and serves requests from the shared socket on a bounded
+thread pool.
+
+Usage:
+    python serve.py --host 0.0.0.0 --port 5000 --workers 4 --threads 8
+"""
+
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import backup
+import database
+
+DEFAULT_THREADS = 8
+# Idle keep-alive connections are closed after this many seconds so they
+# cannot pin every pool thread.
+KEEPALIVE_TIMEOUT = 5
+# A worker exiting sooner than this after starting is treated as a crash loop.
+MIN_WORKER_LIFETIME = 1.0
+
+
+class _RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that handles connections on a fixed-size thread pool."""
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int = DEFAULT_THREADS, fd: Optional[int] = None):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='wsgi')
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """Wait for in-flight requests to finish, then close the listening socket."""
+        self._pool.shutdown(wait=True)
+        self.server_close()
+
+
+def _worker_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    worker_config = {'SEARCH_INDEX_PRELOAD': True, 'GROUP_COMMIT': True}
+    worker_config.update(config)
+    # The master already initialized (and optionally seeded) the database.
+    worker_config.update(INIT_DATABASE=False, SEED_SAMPLE_DATA=False)
+    return worker_config
+
+
+def post_fork(worker_id: int) -> None:
+    """Per-worker initialization, run in the child right after fork."""
+    # Children inherit the parent's RNG state; reseed so workers diverge.
+    random.seed()
+    # Module-level caches and pools reset themselves through os.register_at_fork
+    # hooks; nothing opened in the master (connections, threads) is reused here.
+    os.environ['LIBRARY_WORKER_ID'] = str(worker_id)
+
+
+def _run_worker(worker_id: int, sock: socket.socket, threads: int, config: Dict[str, Any]) -> None:
+    from app import create_app
+
+    post_fork(worker_id)
+    app = create_app(_worker_config(config))
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads=threads, fd=sock.fileno())
+
+    def _stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.drain()
+
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(host: str = '127.0.0.1', port: int = 5000, workers: int = 2, threads: int = DEFAULT_THREADS,
+          backlog: int = 128, config: Optional[Dict[str, Any]] = None) -> int:
+    """Run the master process until SIGTERM/SIGINT; returns the exit code."""
+    config = config or {}
+    # A fresh container can start from a snapshot (see backup.py) instead of an empty database.
+    restore_from = config.get('RESTORE_FROM', os.environ.get('LIBRARY_RESTORE_FROM'))
+    if restore_from and backup.is_empty_database(database.DATABASE):
+        stats = backup.restore_database(restore_from)
+        print(f"Restored {restore_from} to {stats['path']} in {stats['seconds']}s", flush=True)
+    # Schema initialization (and optional demo seeding) happens exactly once, in the master.
+    database.init_database()
+    database.use_patron_triggers(
+        config.get('PATRON_COUNTERS', os.environ.get('LIBRARY_PATRON_COUNTERS', 'app')) == 'triggers')
+    if config.get('SEED_SAMPLE_DATA'):
+        database.add_sample_data()
+
+    sock = _bind(host, port, backlog)
+    bound_host, bound_port = sock.getsockname()[:2]
+    print(f'Serving on http://{bound_host}:{bound_port} '
+          f'({workers} workers x {threads} threads, master pid {os.getpid()})', flush=True)
+
+    if not hasattr(os, 'fork') or workers <= 0:
+        # Platforms without fork (Windows): serve from this process only.
+        from app import create_app
+        app = create_app(_worker_config(config))
+        server = PooledWSGIServer(bound_host, bound_port, app, threads=threads, fd=sock.fileno())
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.drain()
+        return 0
+
+    children: Dict[int, Dict[str, Any]] = {}
+    stopping = False
+
+    def _spawn(worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _run_worker(worker_id, sock, threads, config)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = {'worker_id': worker_id, 'started': time.monotonic()}
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for worker_id in range(workers):
+        _spawn(worker_id)
+
+    exit_code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        info = children.pop(pid, None)
+        if info is None or stopping:
+            continue
+        if time.monotonic() - info['started'] < MIN_WORKER_LIFETIME:
+            print(f'worker {info["worker_id"]} (pid {pid}) exited immediately; shutting down', file=sys.stderr)
+            exit_code = 1
+            _stop(signal.SIGTERM, None)
+            continue
+        print(f'worker {info["worker_id"]} (pid {pid}) exited; restarting', file=sys.stderr)
+        _spawn(info['worker_id'])
+
+    sock.close()
+    return exit_code
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Pre-forking production server for the library app.')
+    parser.add_argument('--host', default=os.environ.get('LIBRARY_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('LIBRARY_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('LIBRARY_WORKERS', os.cpu_count() or 2)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('LIBRARY_THREADS', DEFAULT_THREADS)))
+    parser.add_argument('--backlog', type=int, default=128)
+    parser.add_argument('--db', help='database path (default: database.DATABASE)')
+    parser.add_argument('--seed-sample', action='store_true',
+                        default=os.environ.get('LIBRARY_SEED_SAMPLE_DATA', '').lower() in ('1', 'true', 'yes', 'on'),
+                        help='insert the demo books if the catalog is empty')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    if args.db:
+        database.DATABASE = args.db
+    return serve(args.host, args.port, args.workers, args.threads, args.backlog,
+                 {'SEED_SAMPLE_DATA': args.seed_sample})
+
+
+if __name__ == '__main__':
+    sys.exit(main())
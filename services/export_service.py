@@ -0,0 +1,75 @@
+"""
+services/export_service.py
+Streaming CSV / NDJSON exports of the books and borrow_records tables.
+
+Rows come from database.iter_*_export one chunk at a time and each chunk is encoded
+into a single text block, so an export of any size holds one chunk in memory.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Iterator, Optional, Sequence, Tuple
+
+import database
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_KINDS = ('books', 'loans')
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _csv_chunks(columns: Sequence[str], chunks: Iterator[list]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue()
+
+
+def _ndjson_chunks(columns: Sequence[str], chunks: Iterator[list]) -> Iterator[str]:
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), separators=(',', ':'), ensure_ascii=False) + '\n'
+                      for row in rows)
+
+
+def _parse_date(value: Optional[str], name: str) -> str:
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date (YYYY-MM-DD[THH:MM:SS])')
+
+
+def export_records(kind: str, fmt: str = 'csv', since: Optional[str] = None, until: Optional[str] = None,
+                   include_archived: bool = True,
+                   chunk_size: int = database.EXPORT_CHUNK_SIZE) -> Tuple[bool, Any]:
+    """
+    Stream a table export. Returns (True, iterator of text blocks) or (False, error message).
+    `since`/`until` filter loans on borrow_date (since inclusive, until exclusive).
+    Validation happens here, before the first block is produced, so callers can still
+    answer with an error status.
+    """
+    if kind not in EXPORT_KINDS:
+        return False, f"Unknown export '{kind}'; expected one of: {', '.join(EXPORT_KINDS)}"
+    if fmt not in EXPORT_FORMATS:
+        return False, f"format must be one of: {', '.join(EXPORT_FORMATS)}"
+    if chunk_size < 1:
+        return False, 'chunk_size must be at least 1'
+    if kind == 'books':
+        if since or until:
+            return False, 'Book exports have no date filter'
+        columns, chunks = database.BOOK_EXPORT_COLUMNS, database.iter_books_export(chunk_size)
+    else:
+        try:
+            since = _parse_date(since, 'since') if since else None
+            until = _parse_date(until, 'until') if until else None
+        except ValueError as e:
+            return False, str(e)
+        columns = database.LOAN_EXPORT_COLUMNS
+        chunks = database.iter_loans_export(since, until, include_archived, chunk_size)
+    encode = _csv_chunks if fmt == 'csv' else _ndjson_chunks
+    return True, encode(columns, chunks)
@@ -4,8 +4,15 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import contextvars
+import csv
+import io
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List, Tuple, Any
+from typing import Dict, Optional, List, Tuple, Any, Iterable
 import database  # keep module ref so tests can monkeypatch database.*
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
@@ -13,9 +20,27 @@ from database import (
     update_borrow_record_return_date,
 )
 from services.payment_service import PaymentGateway
+from services import search_index
+from instrumentation import timed_gateway
+from metrics import record_conflict, record_outcome
 
 MAX_BORROW_LIMIT = 5
 BORROW_DAYS = 14
+MAX_LATE_FEE = 15.00
+REFUND_BATCH_WORKERS = 8
+REFUND_BATCH_MAX_WORKERS = 32
+# 'scan' filters the whole catalog in Python; 'index' uses services.search_index.
+SEARCH_ENGINE = 'scan'
+SEARCH_PAGE_SIZE = 50
+FUZZY_RESULT_LIMIT = 50
+SEARCH_MAX_PAGE_SIZE = 500
+# Compare-and-swap attempts for one borrow/return availability update, with jittered
+# exponential backoff (seconds) between them.
+CIRCULATION_RETRIES = 8
+CIRCULATION_BACKOFF = 0.002
+# Borrowing history rows per status page / "load more" request.
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 200
 
 
 def _is_valid_isbn13(isbn: str) -> bool:
@@ -69,6 +94,30 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
 
 # ---------------- R3 ----------------
 
+def _change_availability(book, book_id: int, delta: int, operation: str) -> Tuple[bool, Any]:
+    """
+    Apply delta to available_copies as a compare-and-swap on the book's version, re-reading
+    the book after each conflict (at most CIRCULATION_RETRIES attempts).
+    Returns (updated, latest book row, or None if the book disappeared); a write still
+    conflicting after the last attempt is not applied and reported as not updated.
+    """
+    attempt = 0
+    while True:
+        if update_book_availability(book_id, delta, expected_version=book['version']):
+            return True, book
+        attempt += 1
+        if attempt >= CIRCULATION_RETRIES:
+            return False, book
+        record_conflict(operation)
+        time.sleep(random.uniform(0, CIRCULATION_BACKOFF * (2 ** attempt)))
+        book = get_book_by_id(book_id)
+        if not book:
+            return False, None
+        if not 0 <= int(book["available_copies"]) + delta <= int(book["total_copies"]):
+            return False, book
+
+
+@record_outcome('borrow')
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Borrow a book for a patron (R3). Messages match the tests.
@@ -84,19 +133,34 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if get_patron_borrow_count(patron_id) >= MAX_BORROW_LIMIT:
         return False, "You have reached the maximum borrowing limit of 5 books."
 
+    # Take the copy first (compare-and-swap on the book's version), then record the loan;
+    # the copy is given back if the record cannot be written.
+    updated, latest = _change_availability(book, book_id, -1, 'borrow')
+    if not updated:
+        if latest is None:
+            return False, "Book not found."
+        if int(latest["available_copies"]) <= 0:
+            return False, "This book is currently not available."
+        return False, "Database error occurred while updating book availability."
+
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=BORROW_DAYS)
 
-    if not insert_borrow_record(patron_id, book_id, borrow_date, due_date):
+    inserted = False
+    try:
+        inserted = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+    finally:
+        if not inserted:
+            update_book_availability(book_id, +1)
+    if not inserted:
         return False, "Database error occurred while creating borrow record."
-    if not update_book_availability(book_id, -1):
-        return False, "Database error occurred while updating book availability."
 
     return True, f'Borrowed "{book["title"]}" successfully. Due date: {due_date.strftime("%Y-%m-%d")}.'
 
 
 # ---------------- R4 ----------------
 
+@record_outcome('return')
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Return flow and messages match tests exactly.
@@ -108,14 +172,31 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not book:
         return False, "Book not found."
 
-    return_dt = datetime.now()
-    if not update_borrow_record_return_date(patron_id, book_id, return_dt):
-        return False, "No active borrow record found for this patron and book."
+    # Assess the fee while the loan is still open (it is no longer listed once returned).
+    fee_data = calculate_late_fee_for_book(patron_id, book_id)
 
-    if not update_book_availability(book_id, +1):
+    # As in borrow: put the copy back first, then close the loan; the copy is taken
+    # again if the loan cannot be closed, so a failed return changes nothing.
+    updated, latest = _change_availability(book, book_id, +1, 'return')
+    if not updated:
+        if latest is None:
+            return False, "Book not found."
+        if (int(latest["available_copies"]) >= int(latest["total_copies"])
+                and database.get_active_borrow_record(patron_id, book_id) is None):
+            # Every copy is on the shelf because there is no loan to return.
+            return False, "No active borrow record found for this patron and book."
         return False, "Database error occurred while updating book availability."
 
-    fee_data = calculate_late_fee_for_book(patron_id, book_id)
+    return_dt = datetime.now()
+    closed = False
+    try:
+        closed = update_borrow_record_return_date(patron_id, book_id, return_dt)
+    finally:
+        if not closed:
+            update_book_availability(book_id, -1)
+    if not closed:
+        return False, "No active borrow record found for this patron and book."
+
     fee_amount = float(fee_data.get('fee_amount', 0.0))
     if fee_amount > 0:
         return True, f'Return processed for "{book["title"]}". Late fee: ${fee_amount:.2f}.'
@@ -173,73 +254,220 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict[str, Any]:
 
 # ---------------- R6 ----------------
 
-def search_books_in_catalog(search_term: str, search_type: str = 'title'):
+def search_books_in_catalog(search_term: str, search_type: str = 'title',
+                            engine: Optional[str] = None, match: str = 'all'):
     """
-    Title/Author: partial, case-insensitive over database.get_all_books().
+    Title/Author: partial, case-insensitive over database.get_all_books() ('scan' engine),
+    or via the in-memory inverted index ('index' engine: every word of the term, in any
+    order, must start a word of the field; match='any' needs only one).
     ISBN: exact via database.get_book_by_isbn().
+    Fuzzy: title or author within a few typos, best trigram 'score' first (always the index).
     Invalid type: [].
+    `engine` defaults to SEARCH_ENGINE.
     """
     term = (search_term or '').strip()
     stype = (search_type or 'title').lower()
     if not term:
         return []
 
+    if stype == 'fuzzy':
+        return _fuzzy_results(term, FUZZY_RESULT_LIMIT)
+
+    if stype in ('title', 'author') and (engine or SEARCH_ENGINE) == 'index':
+        ids = search_index.get_index().search(term, stype, match)
+        return [dict(b) for b in database.get_books_by_ids(ids)]
+
     if stype == 'title':
-        books = list(database.get_all_books())  # tests patch `database.get_all_books`
+        books = [dict(b) for b in database.get_all_books()]  # tests patch `database.get_all_books`
         t = term.lower()
         return [b for b in books if t in str(b.get('title', '')).lower()]
 
     if stype == 'author':
-        books = list(database.get_all_books())
+        books = [dict(b) for b in database.get_all_books()]
         t = term.lower()
         return [b for b in books if t in str(b.get('author', '')).lower()]
 
     if stype == 'isbn':
         book = database.get_book_by_isbn(term)
-        return [book] if book else []
+        return [dict(book)] if book else []
 
     return []
 
 
+def _fuzzy_results(term: str, limit: int) -> List[Dict[str, Any]]:
+    ranked = search_index.get_index().fuzzy(term, limit)
+    rows = database.get_books_by_ids([book_id for book_id, _ in ranked])
+    scores = dict(ranked)
+    return [dict(r, score=round(scores[r['id']], 3)) for r in rows]
+
+
+def search_books_page(search_term: str, search_type: str = 'title', limit: int = SEARCH_PAGE_SIZE,
+                      cursor: Optional[str] = None, fields: Optional[List[str]] = None
+                      ) -> Tuple[bool, Any]:
+    """
+    One page of search results for the API, filtered and counted in SQL.
+    Returns (True, {'results', 'count', 'next_cursor'}) or (False, error message).
+    `cursor` is the next_cursor of the previous page; `fields` projects each result.
+    type=fuzzy pages through the best-ranked matches of the search index instead
+    (each result gains a 'score'; `count` is capped at FUZZY_RESULT_LIMIT).
+    """
+    term = (search_term or '').strip()
+    stype = (search_type or 'title').lower()
+    if not term:
+        return False, 'Search term is required'
+    if not 1 <= limit <= SEARCH_MAX_PAGE_SIZE:
+        return False, f'limit must be between 1 and {SEARCH_MAX_PAGE_SIZE}'
+    after_id = 0
+    if cursor:
+        if not (cursor.isascii() and cursor.isdigit()):  # isdigit() alone accepts '²'
+            return False, 'Invalid cursor'
+        after_id = int(cursor)
+    columns = tuple(fields) if fields else database.BOOK_COLUMNS
+    unknown = [f for f in columns if f not in database.BOOK_COLUMNS]
+    if unknown:
+        return False, f'Unknown fields: {", ".join(unknown)}'
+
+    if stype == 'fuzzy':
+        # Ranked results: the cursor is an offset into the ranking.
+        ranked = search_index.get_index().fuzzy(term, FUZZY_RESULT_LIMIT)
+        page = ranked[after_id:after_id + limit]
+        rows = database.get_books_by_ids([book_id for book_id, _ in page])
+        scores = dict(page)
+        results = [dict({c: row[c] for c in columns}, score=round(scores[row['id']], 3)) for row in rows]
+        end = after_id + limit
+        return True, {'results': results, 'count': len(ranked),
+                      'next_cursor': str(end) if end < len(ranked) else None}
+
+    rows = database.search_books_page(stype, term, columns, limit + 1, after_id)
+    next_cursor = str(rows[limit - 1]['id']) if len(rows) > limit else None
+    results = [{c: row[c] for c in columns} for row in rows[:limit]]
+    return True, {
+        'results': results,
+        'count': database.count_books_matching(stype, term),
+        'next_cursor': next_cursor,
+    }
+
+
+def suggest_books(query: str, search_type: str = 'title',
+                  limit: int = search_index.SUGGEST_LIMIT) -> Tuple[bool, Any]:
+    """
+    Search-as-you-type suggestions from the in-memory prefix index.
+    Returns (True, [{'id', 'title', 'author'}, ...]) for titles,
+    (True, [{'author'}, ...]) for authors, or (False, error message).
+    """
+    stype = (search_type or 'title').lower()
+    if stype not in ('title', 'author'):
+        return False, "type must be 'title' or 'author'"
+    if not 1 <= limit <= search_index.SUGGEST_MAX_LIMIT:
+        return False, f'limit must be between 1 and {search_index.SUGGEST_MAX_LIMIT}'
+    index = search_index.get_index()
+    if stype == 'author':
+        return True, [{'author': name} for name in index.suggest_authors(query, limit)]
+    rows = database.get_books_by_ids(index.suggest_titles(query, limit))
+    return True, [{'id': r['id'], 'title': r['title'], 'author': r['author']} for r in rows]
+
+
 # ---------------- R7 ----------------
 
-def get_patron_status_report(patron_id: str) -> Dict[str, Any]:
+def _as_iso(d):
+    if isinstance(d, datetime):
+        return d.isoformat()
+    return str(d) if d is not None else None
+
+
+def get_patron_history_page(patron_id: str, cursor: Optional[str] = None,
+                            limit: int = HISTORY_PAGE_SIZE) -> Tuple[bool, Any]:
+    """
+    One page of a patron's borrowing history, newest first.
+    Returns (True, {'history', 'next_cursor'}) or (False, error message); `cursor` is the
+    next_cursor of the previous page (None on the last page).
+    """
+    if not _is_valid_patron_id(patron_id):
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        return False, f'limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}'
+    before = None
+    if cursor:
+        # "<id>:<borrow_date>" of the last row shown.
+        record_id, _, borrow_date = cursor.partition(':')
+        try:
+            datetime.fromisoformat(borrow_date)
+        except ValueError:
+            return False, 'Invalid history cursor'
+        if not (record_id.isascii() and record_id.isdigit()):  # isdigit() alone accepts '²'
+            return False, 'Invalid history cursor'
+        before = (borrow_date, int(record_id))
+
+    rows = database.get_patron_borrow_history_page(patron_id, limit + 1, before)
+    next_cursor = f"{rows[limit - 1]['id']}:{rows[limit - 1]['borrow_date']}" if len(rows) > limit else None
+    history = [{
+        'book_id': r['book_id'],
+        'title': r['title'],
+        'author': r['author'],
+        'isbn': r['isbn'],
+        'borrow_date': r['borrow_date'],
+        'due_date': r['due_date'],
+        'return_date': r['return_date'],
+    } for r in rows[:limit]]
+    return True, {'history': history, 'next_cursor': next_cursor}
+
+
+def get_patron_status_report(patron_id: str, history_cursor: Optional[str] = None,
+                             history_limit: Optional[int] = None) -> Dict[str, Any]:
     """
     Shape must be:
       'currently_borrowed', 'borrowing_history', 'num_currently_borrowed', 'total_late_fees'
+    With history_limit (and optionally history_cursor) only one page of the history is
+    loaded and 'history_next_cursor' points at the next one; otherwise it is all of it.
     """
     if not _is_valid_patron_id(patron_id):
         return {
             'currently_borrowed': [],
             'borrowing_history': [],
             'num_currently_borrowed': 0,
-            'total_late_fees': 0.0
+            'total_late_fees': 0.0,
+            'history_next_cursor': None,
         }
 
     try:
         current = database.get_patron_borrowed_books(patron_id)
     except Exception:
         current = []
-    try:
-        history = database.get_patron_borrow_history(patron_id)
-    except Exception:
-        history = []
 
-    def _as_iso(d):
-        if isinstance(d, datetime):
-            return d.isoformat()
-        return str(d) if d is not None else None
+    next_cursor = None
+    if history_limit is None and history_cursor is None:
+        try:
+            history = database.get_patron_borrow_history(patron_id)
+        except Exception:
+            history = []
+    else:
+        ok, page = get_patron_history_page(patron_id, history_cursor, history_limit or HISTORY_PAGE_SIZE)
+        if not ok:
+            return {
+                'currently_borrowed': [],
+                'borrowing_history': [],
+                'num_currently_borrowed': 0,
+                'total_late_fees': 0.0,
+                'history_next_cursor': None,
+                'error': page,
+            }
+        history, next_cursor = page['history'], page['next_cursor']
 
     cur_list: List[Dict[str, Any]] = []
     total_fees = 0.0
     for r in current:
         bid = r.get('book_id')
         fee_info = calculate_late_fee_for_book(patron_id, bid)
-        total_fees += float(fee_info.get('fee_amount', 0.0))
+        fee = float(fee_info.get('fee_amount', 0.0))
+        total_fees += fee
         cur_list.append({
             'book_id': bid,
             'title': r.get('title'),
+            'author': r.get('author'),
+            'borrow_date': _as_iso(r.get('borrow_date')),
             'due_date': _as_iso(r.get('due_date')),
+            'days_overdue': int(fee_info.get('days_overdue', 0)),
+            'fee_due': fee,
         })
 
     hist_list: List[Dict[str, Any]] = []
@@ -247,7 +475,10 @@ def get_patron_status_report(patron_id: str) -> Dict[str, Any]:
         hist_list.append({
             'book_id': r.get('book_id'),
             'title': r.get('title'),
+            'author': r.get('author'),
+            'isbn': r.get('isbn'),
             'borrow_date': _as_iso(r.get('borrow_date')),
+            'due_date': _as_iso(r.get('due_date')),
             'return_date': _as_iso(r.get('return_date')),
         })
 
@@ -255,10 +486,12 @@ def get_patron_status_report(patron_id: str) -> Dict[str, Any]:
         'currently_borrowed': cur_list,
         'borrowing_history': hist_list,
         'num_currently_borrowed': len(cur_list),
-        'total_late_fees': round(total_fees, 2)
+        'total_late_fees': round(total_fees, 2),
+        'history_next_cursor': next_cursor,
     }
 
 
+@record_outcome('payment')
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
@@ -308,22 +541,40 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     # Process payment through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
     try:
-        success, transaction_id, message = payment_gateway.process_payment(
-            patron_id=patron_id,
-            amount=fee_amount,
-            description=f"Late fees for '{book['title']}'"
-        )
+        with timed_gateway():
+            success, transaction_id, message = payment_gateway.process_payment(
+                patron_id=patron_id,
+                amount=fee_amount,
+                description=f"Late fees for '{book['title']}'"
+            )
         
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
+        if not success:
             return False, f"Payment failed: {message}", None
             
     except Exception as e:
         # Handle payment gateway errors
         return False, f"Payment processing error: {str(e)}", None
 
+    # The patron has been charged: report success even if the bookkeeping fails.
+    try:
+        database.record_fee_payment(patron_id, book_id, fee_amount, transaction_id)
+    except Exception as e:
+        return True, f"Payment successful! {message} (not recorded: {e})", transaction_id
+    return True, f"Payment successful! {message}", transaction_id
+
 
+def _validate_refund(transaction_id: str, amount: float) -> Optional[str]:
+    """Return the error message for an invalid refund request, or None if it is valid."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID."
+    if amount <= 0:
+        return "Refund amount must be greater than 0."
+    if amount > MAX_LATE_FEE:  # Maximum late fee per book
+        return "Refund amount exceeds maximum late fee."
+    return None
+
+
+@record_outcome('refund')
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
@@ -339,14 +590,9 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         tuple: (success: bool, message: str)
     """
     # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
-    
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
-    
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    error = _validate_refund(transaction_id, amount)
+    if error:
+        return False, error
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -355,7 +601,8 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     # Process refund through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
     try:
-        success, message = payment_gateway.refund_payment(transaction_id, amount)
+        with timed_gateway():
+            success, message = payment_gateway.refund_payment(transaction_id, amount)
         
         if success:
             return True, message
@@ -363,4 +610,137 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
             return False, f"Refund failed: {message}"
             
     except Exception as e:
-        return False, f"Refund processing error: {str(e)}"
\ No newline at end of file
+        return False, f"Refund processing error: {str(e)}"
+
+
+# ---------------- Batch refunds ----------------
+
+def parse_refund_csv(text: str) -> List[Tuple[str, str]]:
+    """
+    Parse CSV text of `transaction_id,amount` rows into (txn_id, amount) pairs.
+    A `txn_id`/`transaction_id` header row and blank lines are skipped.
+    Amounts are left as strings; refund_late_fee_payments_batch validates them.
+    """
+    items: List[Tuple[str, str]] = []
+    for i, row in enumerate(csv.reader(io.StringIO(text))):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        txn_id = row[0].strip()
+        if i == 0 and txn_id.lower() in ("txn_id", "transaction_id"):
+            continue
+        amount = row[1].strip() if len(row) > 1 else ''
+        items.append((txn_id, amount))
+    return items
+
+
+def _batch_result(transaction_id: str, amount: Any, status: str, message: str) -> Dict[str, Any]:
+    return {
+        'transaction_id': transaction_id,
+        'amount': amount,
+        'status': status,
+        'success': status == 'refunded',
+        'message': message,
+    }
+
+
+def refund_late_fee_payments_batch(items: Iterable[Tuple[str, Any]],
+                                   payment_gateway: PaymentGateway = None,
+                                   max_workers: int = REFUND_BATCH_WORKERS) -> Dict[str, Any]:
+    """
+    Refund many late fee payments concurrently.
+
+    Each (transaction_id, amount) item is validated with the same rules as
+    refund_late_fee_payment. Valid items are refunded through the gateway on a
+    bounded thread pool. Every attempt is recorded in the refund journal, so a
+    batch can be re-submitted after a crash:
+      - items already refunded are reported as 'skipped' and not sent again;
+      - items left 'pending' by an interrupted run are reported as 'unknown'
+        and not retried automatically (the gateway may already have refunded them);
+      - items that previously failed are retried.
+
+    Returns:
+        dict: {'results': [per-item dicts in input order], 'summary': {status: count}}
+        Per-item status is one of: refunded, failed, invalid, duplicate, skipped, unknown.
+    """
+    max_workers = max(1, min(int(max_workers or 1), REFUND_BATCH_MAX_WORKERS))
+    results: List[Optional[Dict[str, Any]]] = []
+    to_refund: List[Tuple[int, str, float]] = []
+    seen = set()
+
+    for txn_id, raw_amount in items:
+        txn_id = (txn_id or '').strip() if isinstance(txn_id, str) else ''
+        try:
+            amount = float(raw_amount)
+        except (TypeError, ValueError):
+            amount = math.nan
+        if not math.isfinite(amount):
+            results.append(_batch_result(txn_id, str(raw_amount), 'invalid', "Refund amount must be a number."))
+            continue
+        # Validate the amount as given: rounding first would let e.g. 15.004 through.
+        error = _validate_refund(txn_id, amount)
+        if error:
+            results.append(_batch_result(txn_id, amount, 'invalid', error))
+            continue
+        amount = round(amount, 2)
+        if amount <= 0:  # sub-cent amounts round to nothing
+            results.append(_batch_result(txn_id, amount, 'invalid', "Refund amount must be greater than 0."))
+            continue
+        if txn_id in seen:
+            results.append(_batch_result(txn_id, amount, 'duplicate', "Duplicate transaction ID in batch."))
+            continue
+        seen.add(txn_id)
+        results.append(None)
+        to_refund.append((len(results) - 1, txn_id, amount))
+
+    journal = database.get_refund_journal_entries([t for _, t, _ in to_refund]) if to_refund else {}
+    pending: List[Tuple[int, str, float]] = []
+    for idx, txn_id, amount in to_refund:
+        entry = journal.get(txn_id)
+        if entry is not None and entry['status'] == 'refunded':
+            results[idx] = _batch_result(txn_id, amount, 'skipped', "Already refunded in a previous run.")
+        elif entry is not None and entry['status'] == 'pending':
+            results[idx] = _batch_result(
+                txn_id, amount, 'unknown',
+                "Refund outcome unknown from an interrupted run; verify with the gateway before retrying."
+            )
+        else:
+            pending.append((idx, txn_id, amount))
+
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+
+    def _refund_one(txn_id: str, amount: float) -> Tuple[str, str]:
+        # Claim the transaction first: of two batches racing on it, only one calls the gateway.
+        if not database.claim_refund(txn_id, amount):
+            entry = database.get_refund_journal_entries([txn_id]).get(txn_id)
+            if entry is not None and entry['status'] == 'refunded':
+                return 'skipped', "Already refunded in a previous run."
+            return 'unknown', "Refund is already in progress in another run; verify with the gateway before retrying."
+        ok, message = refund_late_fee_payment(txn_id, amount, payment_gateway)
+        try:
+            database.upsert_refund_journal_entry(txn_id, amount, 'refunded' if ok else 'failed', message)
+        except Exception:
+            # The gateway call already happened; leaving the entry 'pending' makes
+            # the next run report it as 'unknown' instead of refunding twice.
+            pass
+        return ('refunded' if ok else 'failed'), message
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            # Each task runs in a copy of the caller's context so per-request
+            # instrumentation still sees the gateway and journal time.
+            futures = [(idx, txn_id, amount,
+                        pool.submit(contextvars.copy_context().run, _refund_one, txn_id, amount))
+                       for idx, txn_id, amount in pending]
+            for idx, txn_id, amount, future in futures:
+                try:
+                    status, message = future.result()
+                except Exception as e:
+                    # Journal write failed before the gateway was called.
+                    status, message = 'failed', f"Refund processing error: {str(e)}"
+                results[idx] = _batch_result(txn_id, amount, status, message)
+
+    summary: Dict[str, int] = {}
+    for r in results:
+        summary[r['status']] = summary.get(r['status'], 0) + 1
+    return {'results': results, 'summary': summary}
@@ -0,0 +1,162 @@
+"""
+services/notice_service.py
+Due-soon and overdue notices for open loans.
+
+generate_notices scans open loans due before a horizon (as_of + due_soon_days), groups
+them by patron, prices overdue items with the library's late fee policy and queues one
+notice per patron and kind in the notice_outbox table; run_notices repeats it from where
+each pass stopped until the scan is done. deliver_notices hands queued
+notices to a sender (the mailer; a JSON-lines file stands in for it locally).
+"""
+
+import json
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import database
+from services.library_service import _compute_fee
+
+NOTICE_DUE_SOON_DAYS = 3
+NOTICE_BATCH_SIZE = 1000     # patrons per outbox transaction
+NOTICE_TIME_BUDGET = 60.0    # seconds per generate_notices run
+NOTICE_RUN_BUDGET = 600.0    # seconds run_notices keeps resuming for
+DELIVERY_BATCH_SIZE = 500
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _notices_for(patron_id: str, loans: List[tuple], today: date, notice_date: str,
+                 fees: Dict[str, Tuple[int, float]]) -> List[Tuple[str, ...]]:
+    overdue, due_soon = [], []
+    for record_id, _, book_id, title, due_date in loans:
+        # Loans share few distinct due days, so (days overdue, fee) is memoized per run.
+        due_day = due_date[:10]
+        if due_day not in fees:
+            days = max(0, (today - date.fromisoformat(due_day)).days)
+            fees[due_day] = (days, _compute_fee(days))
+        days_overdue, fee = fees[due_day]
+        item = {'record_id': record_id, 'book_id': book_id, 'title': title, 'due_date': due_date}
+        if days_overdue:
+            item['days_overdue'] = days_overdue
+            item['fee_amount'] = fee
+            overdue.append(item)
+        else:
+            due_soon.append(item)
+    notices = []
+    if overdue:
+        payload = {'items': overdue, 'total_fee': round(sum(i['fee_amount'] for i in overdue), 2)}
+        notices.append((patron_id, 'overdue', notice_date, _dumps(payload)))
+    if due_soon:
+        notices.append((patron_id, 'due_soon', notice_date, _dumps({'items': due_soon})))
+    return notices
+
+
+def generate_notices(as_of: Optional[datetime] = None, due_soon_days: int = NOTICE_DUE_SOON_DAYS,
+                     time_budget: float = NOTICE_TIME_BUDGET, after_patron: Optional[str] = None,
+                     batch_size: int = NOTICE_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Queue notices for every open loan due before as_of + due_soon_days.
+
+    Work is committed every `batch_size` patrons. When `time_budget` seconds have passed
+    the run stops after the current batch and 'resume_after' names the last patron done;
+    pass it back as `after_patron` to continue. Rerunning for the same day is safe: a
+    patron gets at most one notice of each kind per notice date.
+    """
+    started = time.perf_counter()
+    today = (as_of or datetime.now()).date()
+    notice_date = today.isoformat()
+    horizon = (today + timedelta(days=due_soon_days + 1)).isoformat()
+    fees: Dict[str, Tuple[int, float]] = {}
+    created_at = datetime.now().isoformat()
+    stats = {'patrons': 0, 'loans': 0, 'queued': 0, 'batches': 0, 'complete': True, 'resume_after': None}
+    pending: List[Tuple[str, ...]] = []
+    pending_patrons = 0
+
+    def flush(last_patron: str) -> bool:
+        nonlocal pending, pending_patrons
+        stats['queued'] += database.insert_notices(pending, created_at)
+        stats['batches'] += 1
+        stats['resume_after'] = last_patron
+        pending, pending_patrons = [], 0
+        return time.perf_counter() - started < time_budget
+
+    patron_id, loans = None, []  # type: Optional[str], List[tuple]
+    chunks = database.iter_open_loans_due_before(horizon, after_patron)
+    try:
+        for rows in chunks:
+            for row in rows:
+                if row[1] != patron_id:
+                    if loans:
+                        pending.extend(_notices_for(patron_id, loans, today, notice_date, fees))
+                        pending_patrons += 1
+                        stats['patrons'] += 1
+                        if pending_patrons >= batch_size and not flush(patron_id):
+                            stats['complete'] = False
+                            return stats
+                    patron_id, loans = row[1], []
+                loans.append(row)
+                stats['loans'] += 1
+        if loans:
+            pending.extend(_notices_for(patron_id, loans, today, notice_date, fees))
+            stats['patrons'] += 1
+            pending_patrons += 1
+        if pending_patrons:
+            flush(patron_id)
+        stats['resume_after'] = None
+        return stats
+    finally:
+        chunks.close()
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+
+
+def run_notices(as_of: Optional[datetime] = None, run_budget: float = NOTICE_RUN_BUDGET,
+                time_budget: float = NOTICE_TIME_BUDGET) -> Dict[str, Any]:
+    """
+    Call generate_notices, resuming from 'resume_after', until the scan is complete or
+    `run_budget` seconds have passed. Returns the summed stats; 'complete' is False (with
+    'resume_after' set) if the budget ran out first.
+    """
+    started = time.perf_counter()
+    totals = {'patrons': 0, 'loans': 0, 'queued': 0, 'batches': 0, 'passes': 0}
+    after_patron = None
+    while True:
+        remaining = run_budget - (time.perf_counter() - started)
+        stats = generate_notices(as_of, time_budget=min(time_budget, max(remaining, 0)), after_patron=after_patron)
+        for key in ('patrons', 'loans', 'queued', 'batches'):
+            totals[key] += stats[key]
+        totals['passes'] += 1
+        after_patron = stats['resume_after']
+        if stats['complete'] or time.perf_counter() - started >= run_budget:
+            break
+    totals.update(complete=stats['complete'], resume_after=after_patron,
+                  seconds=round(time.perf_counter() - started, 3))
+    return totals
+
+
+def deliver_notices(send: Callable[[List[Dict[str, Any]]], None], limit: Optional[int] = None,
+                    batch_size: int = DELIVERY_BATCH_SIZE) -> int:
+    """
+    Pass queued notices (payload decoded) to `send` a batch at a time, oldest first, and
+    mark a batch sent once `send` returns for it. Returns how many were delivered.
+    """
+    delivered = 0
+    while limit is None or delivered < limit:
+        size = batch_size if limit is None else min(batch_size, limit - delivered)
+        notices = database.get_pending_notices(size)
+        if not notices:
+            break
+        for notice in notices:
+            notice['payload'] = json.loads(notice['payload'])
+        send(notices)
+        database.mark_notices_sent([n['id'] for n in notices], datetime.now().isoformat())
+        delivered += len(notices)
+    return delivered
+
+
+def jsonl_sender(path: str) -> Callable[[List[Dict[str, Any]]], None]:
+    """A local stand-in for the mailer: append each batch of notices to a JSON-lines file."""
+    def send(notices: List[Dict[str, Any]]) -> None:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(n, separators=(',', ':')) + '\n' for n in notices)
+    return send
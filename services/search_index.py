@@ -0,0 +1,457 @@
+"""
+services/search_index.py
+In-memory search indexes over book titles and authors: sorted prefix arrays for
+autocomplete, token-level inverted indexes for multi-term search, and a trigram
+index over the token vocabulary for typo-tolerant (fuzzy) search.
+
+The catalog index is built once per process (at startup when preloaded, else on
+first use) from the books table. Books added through database.insert_book in
+this process are indexed immediately via a book listener; books added by other
+processes (pre-forked workers) are picked up by a periodic id > last_id sync.
+Books are never renamed or deleted, so the index only ever grows.
+"""
+
+import bisect
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import database
+from metrics import REGISTRY, GaugeFunc
+
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+# Minimum trigram (Jaccard) similarity for a vocabulary word to match a query word.
+FUZZY_THRESHOLD = 0.3
+# Most similar vocabulary words considered per query word.
+FUZZY_CANDIDATES = 8
+STOP_WORDS = frozenset(('a', 'an', 'and', 'by', 'for', 'in', 'of', 'on', 'the', 'to', 'with'))
+# Minimum seconds between syncs with the books table for rows added elsewhere.
+SYNC_INTERVAL = 0.5
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    """Casefolded words without accents or punctuation, single-space separated."""
+    text = text or ''
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(_WORD.findall(text.casefold()))
+
+
+class PrefixIndex:
+    """Sorted array of normalized keys with a parallel array of integer values."""
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._values = array('I')
+        self._key_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, keys: List[str], values: array) -> None:
+        """Replace the contents with parallel keys and values (sorted here, stable for equal keys)."""
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = [keys[i] for i in order]
+        self._values = array('I', (values[i] for i in order))
+        # Equal keys may be one shared string; count each object once.
+        self._key_bytes = sum(sys.getsizeof(k) for k in {id(k): k for k in self._keys}.values())
+
+    def add(self, key: str, value: int) -> None:
+        pos = bisect.bisect_right(self._keys, key)
+        self._keys.insert(pos, key)
+        self._values.insert(pos, value)
+        self._key_bytes += sys.getsizeof(key)
+
+    def prefix(self, prefix: str, limit: int) -> List[int]:
+        """Values of the first `limit` keys (in key order) starting with `prefix`."""
+        keys = self._keys
+        out = []
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and len(out) < limit and keys[i].startswith(prefix):
+            out.append(self._values[i])
+            i += 1
+        return out
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self._keys) + self._key_bytes + self._values.buffer_info()[1] * self._values.itemsize
+
+
+def trigrams(word: str) -> Set[str]:
+    """Character trigrams of a word padded like pg_trgm ('  w' ... 'd ')."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _has(postings: array, value: int) -> bool:
+    i = bisect.bisect_left(postings, value)
+    return i < len(postings) and postings[i] == value
+
+
+class InvertedIndex:
+    """
+    Token -> sorted array('I') of book ids, plus a sorted vocabulary for prefix terms
+    and a trigram -> tokens index over the vocabulary for fuzzy terms.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._vocab: List[str] = []
+        self._trigrams: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def load(self, postings: Dict[str, array]) -> None:
+        """Replace the contents; every posting list must already be sorted."""
+        self._postings = postings
+        self._vocab = sorted(postings)
+        self._trigrams = {}
+        for token in self._vocab:
+            self._index_trigrams(token)
+
+    def _index_trigrams(self, token: str) -> None:
+        for gram in trigrams(token):
+            tokens = self._trigrams.get(gram)
+            if tokens is None:
+                self._trigrams[gram] = [token]
+            else:
+                tokens.append(token)
+
+    def add(self, book_id: int, tokens: Any) -> None:
+        for token in set(tokens):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('I')
+                bisect.insort(self._vocab, token)
+                self._index_trigrams(token)
+            if postings and postings[-1] > book_id:
+                # Out-of-order id (a listener insert overtaken by a sync): keep the list sorted.
+                postings.insert(bisect.bisect_left(postings, book_id), book_id)
+            else:
+                postings.append(book_id)
+
+    def _term(self, term: str, prefix: bool) -> Any:
+        """Ids for one query term: a sorted array, or a set when a prefix matches several tokens."""
+        if not prefix:
+            return self._postings.get(term, ())
+        vocab = self._vocab
+        i = bisect.bisect_left(vocab, term)
+        matches = []
+        while i < len(vocab) and vocab[i].startswith(term):
+            matches.append(self._postings[vocab[i]])
+            i += 1
+        if len(matches) == 1:
+            return matches[0]
+        return set().union(*matches)
+
+    def search(self, terms: List[str], match: str = 'all', prefix: bool = True) -> List[int]:
+        """Book ids (ascending) containing all ('all') or any ('any') of the terms."""
+        lists = [self._term(t, prefix) for t in dict.fromkeys(terms)]
+        if not lists:
+            return []
+        if len(lists) == 1:
+            only = lists[0]
+            return sorted(only) if isinstance(only, set) else list(only)
+        if match == 'any':
+            return sorted(set().union(*lists))
+        # Intersect starting from the smallest list. Against a much longer sorted list,
+        # membership is a binary search instead of a pass over the whole list.
+        lists.sort(key=len)
+        result = set(lists[0])
+        for other in lists[1:]:
+            if not result:
+                break
+            if isinstance(other, set) or len(other) < 32 * len(result):
+                result.intersection_update(other)
+            else:
+                result = {i for i in result if _has(other, i)}
+        return sorted(result)
+
+    def similar_tokens(self, word: str, threshold: float = FUZZY_THRESHOLD,
+                       limit: int = FUZZY_CANDIDATES) -> List[Tuple[str, float]]:
+        """Vocabulary tokens sharing trigrams with `word`, most similar first (Jaccard >= threshold)."""
+        grams = trigrams(word)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        scored = []
+        for token, common in shared.items():
+            # |T| = len(token) + 1 for distinct trigrams; recompute only for the few candidates.
+            score = common / (len(grams) + len(trigrams(token)) - common)
+            if score >= threshold:
+                scored.append((score, token))
+        return [(token, score) for score, token in heapq.nlargest(limit, scored)]
+
+    def fuzzy_scores(self, words: List[str], threshold: float = FUZZY_THRESHOLD) -> Dict[int, float]:
+        """
+        Book id -> sum over query words of the best similarity among that book's tokens
+        (0 for a word with no similar token). Books matching no word are omitted.
+        """
+        per_word = []
+        for word in dict.fromkeys(words):
+            best: Dict[int, float] = {}
+            # Least similar first, so a book keeps the score of its most similar token.
+            for token, score in reversed(self.similar_tokens(word, threshold)):
+                best.update(dict.fromkeys(self._postings[token], score))
+            per_word.append(best)
+        if not per_word:
+            return {}
+        # Copy the largest map wholesale and add the smaller ones into it.
+        per_word.sort(key=len, reverse=True)
+        scores = dict(per_word[0])
+        for best in per_word[1:]:
+            for book_id, score in best.items():
+                scores[book_id] = scores.get(book_id, 0.0) + score
+        return scores
+
+    def memory_bytes(self) -> int:
+        total = sys.getsizeof(self._postings) + sys.getsizeof(self._vocab) + sys.getsizeof(self._trigrams)
+        for token, postings in self._postings.items():
+            total += sys.getsizeof(token) + sys.getsizeof(postings)
+        for gram, tokens in self._trigrams.items():
+            total += sys.getsizeof(gram) + sys.getsizeof(tokens)
+        return total
+
+
+class CatalogIndex:
+    """
+    Prefix indexes over normalized titles (-> book id) and distinct authors, and
+    inverted indexes from title and author tokens to book ids.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.titles = PrefixIndex()
+        self.authors = PrefixIndex()  # value = position in author_names
+        self.title_tokens = InvertedIndex()
+        self.author_tokens = InvertedIndex()
+        self.author_names: List[str] = []
+        self._author_pos: Dict[str, int] = {}
+        self._author_name_bytes = 0
+        self.last_id = 0
+        self._added_ids: Set[int] = set()  # listener-added ids above last_id
+        self._last_sync = 0.0
+        self.build_ms = 0.0
+
+    def build(self) -> 'CatalogIndex':
+        """Load every book from the database."""
+        start = time.perf_counter()
+        title_keys: List[str] = []
+        title_ids = array('I')
+        title_postings: Dict[str, array] = {}
+        author_postings: Dict[str, array] = {}
+        tokens_of: Dict[str, Any] = {}
+        author_keys: List[str] = []
+        author_pos: Dict[str, int] = {}
+        names: List[str] = []
+        # Repeated titles and authors share one normalized key (faster, and one string in memory).
+        seen: Dict[str, str] = {}
+        last_id = 0
+        for book_id, title, author in database.iter_book_titles():
+            key = seen.get(title)
+            if key is None:
+                key = seen[title] = normalize(title)
+            title_keys.append(key)
+            title_ids.append(book_id)
+            self._post(title_postings, tokens_of, key, book_id)
+            key = seen.get(author)
+            if key is None:
+                key = seen[author] = normalize(author)
+            self._post(author_postings, tokens_of, key, book_id)
+            if key not in author_pos:
+                author_pos[key] = len(names)
+                names.append(author)
+                author_keys.append(key)
+            last_id = book_id
+        with self._lock:
+            self.titles.load(title_keys, title_ids)
+            self.authors.load(author_keys, array('I', range(len(names))))
+            self.title_tokens.load(title_postings)
+            self.author_tokens.load(author_postings)
+            self.author_names = names
+            self._author_pos = author_pos
+            self._author_name_bytes = sum(sys.getsizeof(n) for n in names)
+            self.last_id = last_id
+            self._added_ids.clear()
+            self._last_sync = time.monotonic()
+        self.build_ms = round((time.perf_counter() - start) * 1000.0, 1)
+        return self
+
+    @staticmethod
+    def _post(postings: Dict[str, array], tokens_of: Dict[str, Any], key: str, book_id: int) -> None:
+        tokens = tokens_of.get(key)
+        if tokens is None:
+            tokens = tokens_of[key] = tuple(dict.fromkeys(key.split()))
+        for token in tokens:
+            ids = postings.get(token)
+            if ids is None:
+                ids = postings[token] = array('I')
+            ids.append(book_id)
+
+    def _add_locked(self, book_id: int, title: str, author: str) -> None:
+        key = normalize(title)
+        self.titles.add(key, book_id)
+        self.title_tokens.add(book_id, key.split())
+        key = normalize(author)
+        self.author_tokens.add(book_id, key.split())
+        if key not in self._author_pos:
+            self._author_pos[key] = len(self.author_names)
+            self.author_names.append(author)
+            self._author_name_bytes += sys.getsizeof(author)
+            self.authors.add(key, self._author_pos[key])
+
+    def add_book(self, book_id: int, title: str, author: str) -> None:
+        """Index a newly inserted book (database book listener)."""
+        with self._lock:
+            if book_id <= self.last_id or book_id in self._added_ids:
+                return
+            self._add_locked(book_id, title, author)
+            self._added_ids.add(book_id)
+
+    def sync(self, force: bool = False) -> int:
+        """Index books inserted by other processes since the last sync; returns how many."""
+        now = time.monotonic()
+        if not force and now - self._last_sync < SYNC_INTERVAL:
+            return 0
+        with self._lock:
+            self._last_sync = now
+            added = 0
+            for book_id, title, author in database.iter_book_titles(self.last_id):
+                if book_id not in self._added_ids:
+                    self._add_locked(book_id, title, author)
+                    added += 1
+                self.last_id = book_id
+            self._added_ids = {i for i in self._added_ids if i > self.last_id}
+        return added
+
+    def suggest_titles(self, query: str, limit: int = SUGGEST_LIMIT) -> List[int]:
+        """Ids of books whose normalized title starts with the normalized query."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            return self.titles.prefix(prefix, limit)
+
+    def suggest_authors(self, query: str, limit: int = SUGGEST_LIMIT) -> List[str]:
+        """Distinct author names whose normalized form starts with the normalized query."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            return [self.author_names[i] for i in self.authors.prefix(prefix, limit)]
+
+    def search(self, query: str, field: str = 'title', match: str = 'all') -> List[int]:
+        """
+        Ids (ascending) of books whose `field` ('title' or 'author') contains every
+        query word ('all') or any of them ('any'); each word matches as a token prefix.
+        """
+        terms = normalize(query).split()
+        index = self.author_tokens if field == 'author' else self.title_tokens
+        with self._lock:
+            return index.search(terms, match)
+
+    def fuzzy(self, query: str, limit: int = 50) -> List[Tuple[int, float]]:
+        """
+        (book id, score) of the books whose title or author best matches the query allowing
+        typos, highest score first. Only vocabulary words sharing trigrams with a query word
+        are compared, never every title.
+        """
+        words = normalize(query).split()
+        # Stop words match half the catalog and say little about which book is meant.
+        words = [w for w in words if w not in STOP_WORDS] or words
+        if not words:
+            return []
+        with self._lock:
+            scores = self.title_tokens.fuzzy_scores(words)
+            for book_id, score in self.author_tokens.fuzzy_scores(words).items():
+                if score > scores.get(book_id, 0.0):
+                    scores[book_id] = score
+        n = len(set(words))
+        top = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(book_id, score / n) for book_id, score in top]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            author_bytes = (sys.getsizeof(self.author_names) + self._author_name_bytes
+                            + sys.getsizeof(self._author_pos))
+            return {
+                'titles': len(self.titles),
+                'authors': len(self.authors),
+                'title_tokens': len(self.title_tokens),
+                'author_tokens': len(self.author_tokens),
+                'build_ms': self.build_ms,
+                'memory_bytes': {
+                    'title_prefix': self.titles.memory_bytes(),
+                    'author_prefix': self.authors.memory_bytes() + author_bytes,
+                    'title_inverted': self.title_tokens.memory_bytes(),
+                    'author_inverted': self.author_tokens.memory_bytes(),
+                },
+            }
+
+
+_index: Optional[CatalogIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> CatalogIndex:
+    """The process-wide catalog index, built on first use and kept current afterwards."""
+    global _index
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                index = CatalogIndex().build()
+                database.add_book_listener(index.add_book)
+                _index = index
+            index = _index
+    else:
+        index.sync()
+    return index
+
+
+def reset_index() -> None:
+    """Drop the process-wide index (it is rebuilt on next use)."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            database.remove_book_listener(_index.add_book)
+            _index = None
+
+
+def index_stats() -> Optional[Dict[str, Any]]:
+    """Size and memory of the built index, or None if it has not been built."""
+    index = _index
+    return index.stats() if index is not None else None
+
+
+def _memory_by_index() -> Dict[Any, float]:
+    stats = index_stats()
+    if stats is None:
+        return {}
+    return {(name,): float(n) for name, n in stats['memory_bytes'].items()}
+
+
+INDEX_MEMORY = REGISTRY.register(GaugeFunc(
+    'library_search_index_bytes', 'Approximate memory held by the in-memory search indexes.',
+    ('index',), _memory_by_index))
+
+
+def _after_fork_in_child() -> None:
+    global _index_lock
+    _index_lock = threading.Lock()
+    if _index is not None:
+        _index._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,174 @@
+"""
+sqltrace.py
+Opt-in SQL tracing and slow-query log for database.py.
+
+When enabled, every connection from database.get_db_connection gets a SQLite
+trace callback (which also sees implicit BEGIN/COMMIT and trigger statements)
+and every execute/fetch is timed through a database query observer. Statements
+are aggregated per normalized text; statements slower than the threshold are
+logged with their bound-parameter shapes and the service function that issued
+them. When disabled no hook is registered, so connections are untouched.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+import database
+
+logger = logging.getLogger('library.sql')
+
+DEFAULT_SLOW_MS = 100.0
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Frames from these files are skipped when looking for the calling function.
+_INTERNAL_FILES = {
+    os.path.normcase(os.path.abspath(f)) for f in (database.__file__, __file__)
+}
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse literals, IN-lists and whitespace so equivalent statements group together."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def param_shape(params: Any) -> str:
+    """Describe bound parameters by type only, e.g. '(str, int)', never by value."""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in params.items()) + '}'
+    try:
+        return '(' + ', '.join(type(p).__name__ for p in params) + ')'
+    except TypeError:
+        return type(params).__name__
+
+
+def _caller() -> str:
+    """First frame outside the database layer, preferring services/ and routes/ code."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = os.path.normcase(os.path.abspath(frame.f_code.co_filename))
+        if filename not in _INTERNAL_FILES and 'sqlite3' not in filename:
+            where = f'{os.path.basename(filename)}:{frame.f_code.co_name}'
+            parts = filename.replace('\\', '/').split('/')
+            if 'services' in parts or 'routes' in parts:
+                return where
+            if fallback is None:
+                fallback = where
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+class SQLTracer:
+    """Aggregates statement timings and logs slow statements."""
+
+    def __init__(self, slow_ms: float = DEFAULT_SLOW_MS):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._timed: Dict[str, Dict[str, Any]] = {}
+        self._traced: Dict[str, int] = {}
+
+    def on_query(self, event: str, sql: str, params: Any, elapsed: float) -> None:
+        key = normalize_sql(sql or '')
+        ms = elapsed * 1000.0
+        with self._lock:
+            entry = self._timed.get(key)
+            if entry is None:
+                entry = self._timed[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0,
+                                            'param_shape': param_shape(params)}
+            if event == 'execute':
+                entry['count'] += 1
+            entry['total_ms'] += ms
+            if ms > entry['max_ms']:
+                entry['max_ms'] = ms
+            slow = ms >= self.slow_ms
+            if slow:
+                entry['slow'] += 1
+        if slow:
+            logger.warning('slow query (%s, %.1f ms) %s params=%s caller=%s',
+                           event, ms, key, param_shape(params), _caller())
+
+    def on_statement(self, statement: str) -> None:
+        key = normalize_sql(statement)
+        with self._lock:
+            self._traced[key] = self._traced.get(key, 0) + 1
+
+    def on_connect(self, conn) -> None:
+        conn.set_trace_callback(self.on_statement)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._timed.clear()
+            self._traced.clear()
+
+    def _after_fork(self) -> None:
+        # The parent's lock may have been held by another thread at fork time.
+        self._lock = threading.Lock()
+        self.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-statement aggregates, slowest total time first."""
+        with self._lock:
+            timed = {k: dict(v) for k, v in self._timed.items()}
+            traced = dict(self._traced)
+        statements = []
+        for sql, entry in timed.items():
+            entry['sql'] = sql
+            entry['mean_ms'] = round(entry['total_ms'] / entry['count'], 3) if entry['count'] else 0.0
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+            statements.append(entry)
+        statements.sort(key=lambda e: e['total_ms'], reverse=True)
+        return {
+            'slow_ms': self.slow_ms,
+            'statements': statements,
+            'sqlite_statements': dict(sorted(traced.items(), key=lambda kv: kv[1], reverse=True)),
+        }
+
+
+_tracer: Optional[SQLTracer] = None
+
+
+def enable(slow_ms: float = DEFAULT_SLOW_MS) -> SQLTracer:
+    """Start tracing connections opened from now on; returns the active tracer."""
+    global _tracer
+    if _tracer is None:
+        _tracer = SQLTracer(slow_ms)
+        database.add_query_observer(_tracer.on_query)
+        database.add_connection_hook(_tracer.on_connect)
+    else:
+        _tracer.slow_ms = slow_ms
+    return _tracer
+
+
+def disable() -> None:
+    global _tracer
+    if _tracer is not None:
+        database.remove_query_observer(_tracer.on_query)
+        database.remove_connection_hook(_tracer.on_connect)
+        _tracer = None
+
+
+def get_tracer() -> Optional[SQLTracer]:
+    return _tracer
+
+
+def _after_fork_in_child() -> None:
+    if _tracer is not None:
+        _tracer._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -6,3 +6,15 @@ import sys
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point database.DATABASE at a fresh, initialized SQLite file for the test."""
+    import database
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'library.db'))
+    database.init_database()
+    yield database
+    database.close_read_connections()
@@ -0,0 +1,55 @@
+# tests/test_api_search.py
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def client(temp_db):
+    for i in range(7):
+        temp_db.insert_book(f'Python Recipes {i}', 'Ann Author', f'{9780000000000 + i}', 1)
+    temp_db.insert_book('Gardening', 'Bob Writer', '9781111111111', 2)
+    temp_db.insert_book('100%_Literal', 'Bob Writer', '9781111111112', 2)
+    return create_app({'TESTING': True}).test_client()
+
+
+def test_pages_follow_the_cursor_and_count_all_matches(client):
+    seen = []
+    cursor = None
+    while True:
+        query = {'q': 'python', 'limit': 3}
+        if cursor:
+            query['cursor'] = cursor
+        data = client.get('/api/search', query_string=query).get_json()
+        assert data['count'] == 7
+        assert len(data['results']) <= 3
+        seen.extend(b['title'] for b in data['results'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [f'Python Recipes {i}' for i in range(7)]
+
+
+def test_fields_projects_results(client):
+    data = client.get('/api/search?q=gardening&fields=title,available_copies').get_json()
+    assert data['results'] == [{'title': 'Gardening', 'available_copies': 2}]
+
+
+def test_default_response_keeps_full_rows(client):
+    data = client.get('/api/search?q=9781111111111&type=isbn').get_json()
+    assert data['count'] == 1
+    assert set(data['results'][0]) == {'id', 'title', 'author', 'isbn', 'total_copies', 'available_copies'}
+    assert data['next_cursor'] is None
+
+
+def test_like_wildcards_in_the_term_match_literally(client):
+    assert client.get('/api/search?q=%25_').get_json()['count'] == 1
+    assert client.get('/api/search?q=_').get_json()['count'] == 1
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=501', 'fields=title,password', 'cursor=abc',
+                                   'cursor=%C2%B2'])
+def test_invalid_parameters_are_rejected(client, query):
+    response = client.get(f'/api/search?q=python&{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
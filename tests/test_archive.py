@@ -0,0 +1,79 @@
+# tests/test_archive.py
+from datetime import datetime, timedelta
+
+import database
+import datagen
+from services import library_service
+
+NOW = datetime(2025, 6, 1, 12, 0)
+
+
+def _loan(db, patron_id, book_id, days_ago, returned_days_ago=None):
+    conn = db.get_db_connection()
+    borrowed = NOW - timedelta(days=days_ago)
+    returned = NOW - timedelta(days=returned_days_ago) if returned_days_ago is not None else None
+    conn.execute(
+        "INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)",
+        (patron_id, book_id, borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat(),
+         returned.isoformat() if returned else None))
+    conn.commit()
+    conn.close()
+
+
+def _count(db, table):
+    conn = db.get_db_connection()
+    n = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    conn.close()
+    return n
+
+
+def test_archives_only_old_closed_loans_in_batches(temp_db):
+    temp_db.insert_book('Book', 'Author', '1234567890123', 5)
+    for i in range(7):
+        _loan(temp_db, '123456', 1, days_ago=800 + i, returned_days_ago=780 + i)  # old, closed
+    _loan(temp_db, '123456', 1, days_ago=30, returned_days_ago=10)               # recent, closed
+    _loan(temp_db, '123456', 1, days_ago=900)                                    # old but open
+    temp_db.rebuild_patron_counters()
+
+    stats = temp_db.archive_closed_loans(older_than_days=365, batch_size=3, now=NOW)
+    assert (stats['moved'], stats['batches']) == (7, 3)
+    assert _count(temp_db, 'borrow_records') == 2
+    assert _count(temp_db, 'borrow_records_archive') == 7
+    assert temp_db.archive_closed_loans(older_than_days=365, now=NOW)['moved'] == 0
+
+    history = temp_db.get_patron_borrow_history('123456')
+    assert len(history) == 9
+    assert [h['borrow_date'] for h in history] == sorted((h['borrow_date'] for h in history), reverse=True)
+    assert temp_db.get_patron_borrow_count('123456') == 1
+    assert temp_db.check_patron_counters() == []
+
+
+def test_status_report_includes_archived_history(temp_db):
+    temp_db.insert_book('Book', 'Author', '1234567890123', 5)
+    _loan(temp_db, '654321', 1, days_ago=800, returned_days_ago=790)
+    temp_db.archive_closed_loans(older_than_days=365, now=NOW)
+    report = library_service.get_patron_status_report('654321')
+    assert [h['title'] for h in report['borrowing_history']] == ['Book']
+
+
+def test_archive_reports_space_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'unused.db'))
+    path = str(tmp_path / 'gen.db')
+    datagen.generate_dataset(path, books=100, patrons=50, loans=5000, seed=5, as_of=NOW)
+    monkeypatch.setattr(database, 'DATABASE', path)
+
+    stats = database.archive_closed_loans(older_than_days=30, batch_size=1000, vacuum=True, now=NOW)
+    assert stats['moved'] > 1000 and stats['batches'] >= 2
+    if stats['before']['borrow_records_bytes'] is not None:
+        assert stats['after']['borrow_records_bytes'] < stats['before']['borrow_records_bytes']
+    assert database.check_patron_counters() == []
+    database.close_read_connections()
+
+
+def test_archive_loans_command(temp_db):
+    from app import create_app
+
+    temp_db.insert_book('Book', 'Author', '1234567890123', 5)
+    _loan(temp_db, '123456', 1, days_ago=2000, returned_days_ago=1990)
+    result = create_app({'TESTING': True}).test_cli_runner().invoke(args=['archive-loans'])
+    assert 'Moved 1 loans in 1 batches' in result.output
@@ -0,0 +1,122 @@
+# tests/test_batch_refunds.py
+import io
+
+from services.library_service import parse_refund_csv, refund_late_fee_payments_batch
+from services.payment_service import PaymentGateway
+
+
+def _gateway(mocker, ok=True):
+    gateway = mocker.Mock(spec=PaymentGateway)
+    gateway.refund_payment.side_effect = lambda txn, amount: (ok, f"Refund of ${amount:.2f} for {txn}")
+    return gateway
+
+
+def test_parse_refund_csv_skips_header_and_blank_lines():
+    text = "transaction_id,amount\ntxn_1,2.50\n\ntxn_2, 3\n"
+    assert parse_refund_csv(text) == [("txn_1", "2.50"), ("txn_2", "3")]
+
+
+def test_batch_validates_with_single_refund_rules(temp_db, mocker):
+    gateway = _gateway(mocker)
+    report = refund_late_fee_payments_batch(
+        [("bad_1", 1.0), ("txn_1", 0), ("txn_2", 16.0), ("txn_3", "abc"), ("txn_4", 5.0)],
+        gateway,
+    )
+    statuses = [r["status"] for r in report["results"]]
+    assert statuses == ["invalid", "invalid", "invalid", "invalid", "refunded"]
+    assert report["results"][0]["message"] == "Invalid transaction ID."
+    assert report["results"][2]["message"] == "Refund amount exceeds maximum late fee."
+    gateway.refund_payment.assert_called_once_with("txn_4", 5.0)
+
+
+def test_batch_refunds_concurrently_and_reports_in_input_order(temp_db, mocker):
+    gateway = _gateway(mocker)
+    items = [(f"txn_{i}", 1.0 + i % 5) for i in range(40)]
+    report = refund_late_fee_payments_batch(items, gateway, max_workers=8)
+    assert [r["transaction_id"] for r in report["results"]] == [t for t, _ in items]
+    assert report["summary"] == {"refunded": 40}
+    assert gateway.refund_payment.call_count == 40
+
+
+def test_batch_flags_duplicates(temp_db, mocker):
+    gateway = _gateway(mocker)
+    report = refund_late_fee_payments_batch([("txn_1", 1.0), ("txn_1", 1.0)], gateway)
+    assert [r["status"] for r in report["results"]] == ["refunded", "duplicate"]
+    gateway.refund_payment.assert_called_once()
+
+
+def test_batch_resumes_after_previous_run(temp_db, mocker):
+    first = refund_late_fee_payments_batch([("txn_1", 1.0), ("txn_2", 2.0)], _gateway(mocker, ok=False))
+    assert first["summary"] == {"failed": 2}
+
+    # txn_1 succeeds on retry; txn_3 was left pending by a crashed run
+    temp_db.upsert_refund_journal_entry("txn_3", 3.0, "pending")
+    gateway = _gateway(mocker)
+    second = refund_late_fee_payments_batch([("txn_1", 1.0), ("txn_3", 3.0)], gateway)
+    assert [r["status"] for r in second["results"]] == ["refunded", "unknown"]
+
+    third = refund_late_fee_payments_batch([("txn_1", 1.0)], gateway)
+    assert third["results"][0]["status"] == "skipped"
+    gateway.refund_payment.assert_called_once_with("txn_1", 1.0)
+
+
+def test_batch_gateway_exception_is_reported_per_item(temp_db, mocker):
+    gateway = mocker.Mock(spec=PaymentGateway)
+    gateway.refund_payment.side_effect = Exception("gateway down")
+    report = refund_late_fee_payments_batch([("txn_1", 1.0)], gateway)
+    assert report["results"][0]["status"] == "failed"
+    assert "error" in report["results"][0]["message"].lower()
+
+
+def test_batch_rejects_non_finite_and_unrounded_excess_amounts(temp_db, mocker):
+    gateway = _gateway(mocker)
+    report = refund_late_fee_payments_batch(
+        [("txn_1", "nan"), ("txn_2", float("inf")), ("txn_3", "15.004"), ("txn_4", "14.999")], gateway)
+    assert [r["status"] for r in report["results"]] == ["invalid", "invalid", "invalid", "refunded"]
+    assert report["results"][0] == {**report["results"][0], "amount": "nan",
+                                    "message": "Refund amount must be a number."}
+    assert report["results"][2]["message"] == "Refund amount exceeds maximum late fee."
+    gateway.refund_payment.assert_called_once_with("txn_4", 15.0)
+
+
+def test_batch_rejects_sub_cent_amounts_without_journaling_them(temp_db, mocker):
+    gateway = _gateway(mocker)
+    report = refund_late_fee_payments_batch([("txn_1", "0.004"), ("txn_2", 1e-9), ("txn_3", "0.005")], gateway)
+    assert [r["status"] for r in report["results"]] == ["invalid", "invalid", "refunded"]
+    assert report["results"][0]["message"] == "Refund amount must be greater than 0."
+    assert set(temp_db.get_refund_journal_entries(["txn_1", "txn_2", "txn_3"])) == {"txn_3"}
+    gateway.refund_payment.assert_called_once_with("txn_3", 0.01)
+
+
+def test_concurrent_batches_refund_a_transaction_once(temp_db, mocker):
+    import threading
+
+    barrier = threading.Barrier(4)
+    gateway = _gateway(mocker)
+    reports = []
+
+    def _run():
+        barrier.wait()
+        reports.append(refund_late_fee_payments_batch([("txn_1", 2.0)], gateway))
+
+    threads = [threading.Thread(target=_run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    gateway.refund_payment.assert_called_once_with("txn_1", 2.0)
+    statuses = sorted(r["results"][0]["status"] for r in reports)
+    assert statuses.count("refunded") == 1
+    assert set(statuses) <= {"refunded", "skipped", "unknown"}
+
+
+def test_batch_api_rejects_non_utf8_csv(temp_db):
+    from app import create_app
+
+    client = create_app({'TESTING': True}).test_client()
+    body = b'txn_1,\xff\xfe1.00\n'
+    response = client.post('/api/refunds/batch', data=body, content_type='text/csv')
+    assert response.status_code == 400 and response.get_json() == {'error': 'CSV must be UTF-8 encoded'}
+    response = client.post('/api/refunds/batch', data={'file': (io.BytesIO(body), 'refunds.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400 and response.get_json() == {'error': 'CSV must be UTF-8 encoded'}
@@ -0,0 +1,52 @@
+# tests/test_benchmarks.py
+from benchmarks.bench_library_service import compare_to_baseline
+
+
+def _report(**medians):
+    return {'results': {op: {'median_ms': ms} for op, ms in medians.items()}}
+
+
+def test_compare_flags_slowdown_beyond_tolerance():
+    baseline = _report(borrow_book_by_patron=2.0, search_books_in_catalog=10.0)
+    current = _report(borrow_book_by_patron=2.2, search_books_in_catalog=14.0)
+    regressions = compare_to_baseline(current, baseline, tolerance=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('search_books_in_catalog')
+
+
+def test_compare_ignores_noise_and_missing_ops():
+    baseline = _report(calculate_late_fee_for_book=0.01, get_patron_status_report=1.0)
+    current = _report(calculate_late_fee_for_book=0.03)
+    assert compare_to_baseline(current, baseline, tolerance=0.1) == []
+
+
+def test_misspell_makes_one_edit():
+    import random
+    from benchmarks.bench_search_index import misspell
+
+    rng = random.Random(1)
+    for _ in range(20):
+        typo = misspell('fitzgerald', rng)
+        assert abs(len(typo) - len('fitzgerald')) <= 1
+    assert misspell('the', rng) == 'the'
+
+
+def test_search_index_benchmark_runs_at_small_scale(monkeypatch, tmp_path):
+    import database
+    from benchmarks.bench_search_index import bench_size
+
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'unused.db'))
+    report = bench_size(books=300, iterations=5, time_limit=1.0, scan_queries=3, seed=1)
+    assert report['index']['titles'] == 300
+    assert set(report['results']) >= {'suggest_titles', 'inverted_search', 'fuzzy_search'}
+
+
+def test_writer_benchmark_runs_both_modes(monkeypatch, tmp_path):
+    import database
+    from benchmarks.bench_writer import bench_writes
+
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'unused.db'))
+    for mode in ('direct', 'group'):
+        run = bench_writes(clients=2, mode=mode, duration=0.2)
+        assert run['writes'] > 0 and run['locked_errors'] == 0
+    assert database._write_executor is None
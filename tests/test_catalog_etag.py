@@ -0,0 +1,70 @@
+# tests/test_catalog_etag.py
+import pytest
+
+import database
+import routes.catalog_routes as catalog_routes
+from app import create_app
+
+
+@pytest.fixture
+def client(temp_db):
+    temp_db.insert_book('Etag Book', 'Author', '1234567890123', 2)
+    return create_app({'TESTING': True}).test_client()
+
+
+@pytest.mark.parametrize('path', ['/catalog', '/search?q=etag', '/api/search?q=etag'])
+def test_matching_if_none_match_returns_304_without_reading_books(client, monkeypatch, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    def _fail(*args, **kwargs):
+        raise AssertionError('books table must not be read')
+    monkeypatch.setattr(catalog_routes, 'get_all_books', _fail)
+    monkeypatch.setattr(database, 'search_books_page', _fail)
+
+    second = client.get(path, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == etag
+    assert second.data == b''
+
+
+def test_book_writes_change_the_etag(client):
+    etag = client.get('/catalog').headers['ETag']
+    book_id = database.get_book_by_isbn('1234567890123')['id']
+
+    assert database.update_book_availability(book_id, -1)
+    after_borrow = client.get('/catalog', headers={'If-None-Match': etag})
+    assert after_borrow.status_code == 200
+    assert after_borrow.headers['ETag'] != etag
+
+    database.insert_book('Another', 'Author', '1234567890124', 1)
+    assert client.get('/catalog', headers={'If-None-Match': after_borrow.headers['ETag']}).status_code == 200
+
+
+def test_failed_availability_update_keeps_the_version(client):
+    version = database.get_catalog_version()
+    book_id = database.get_book_by_isbn('1234567890123')['id']
+    assert not database.update_book_availability(book_id, +1)  # already at total copies
+    assert database.get_catalog_version() == version
+
+
+def test_pages_with_flash_messages_are_not_cached(client):
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Borrowed!')]
+    response = client.get('/catalog', headers={'If-None-Match': '*'})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert 'Borrowed!' in response.get_data(as_text=True)
+
+
+def test_sample_data_changes_the_etag(temp_db):
+    client = create_app({'TESTING': True}).test_client()
+    etag = client.get('/catalog').headers['ETag']
+    assert database.add_sample_data() == 3
+    after = client.get('/catalog', headers={'If-None-Match': etag})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != etag
+    version = database.get_catalog_version()
+    assert database.add_sample_data() == 0
+    assert database.get_catalog_version() == version
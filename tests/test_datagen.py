@@ -0,0 +1,50 @@
+# tests/test_datagen.py
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import datagen
+
+AS_OF = datetime(2026, 1, 15)
+
+
+def _rows(path, sql):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+
+def test_generate_dataset_is_deterministic(tmp_path):
+    a, b = str(tmp_path / 'a.db'), str(tmp_path / 'b.db')
+    datagen.generate_dataset(a, books=300, patrons=50, loans=1000, seed=7, as_of=AS_OF)
+    datagen.generate_dataset(b, books=300, patrons=50, loans=1000, seed=7, as_of=AS_OF)
+    for sql in ('SELECT * FROM books ORDER BY id', 'SELECT * FROM borrow_records ORDER BY id'):
+        assert _rows(a, sql) == _rows(b, sql)
+
+
+def test_generate_dataset_respects_loan_invariants(tmp_path):
+    path = str(tmp_path / 'lib.db')
+    stats = datagen.generate_dataset(path, books=500, patrons=100, loans=3000,
+                                     overdue_ratio=0.5, active_ratio=0.1, seed=1, as_of=AS_OF)
+    assert stats['books'] == 500 and stats['loans'] == 3000
+    assert _rows(path, 'SELECT COUNT(DISTINCT isbn) FROM books')[0][0] == 500
+
+    # no patron over the borrow limit, no book over-lent, availability consistent
+    assert _rows(path, 'SELECT MAX(c) FROM (SELECT COUNT(*) c FROM borrow_records '
+                       'WHERE return_date IS NULL GROUP BY patron_id)')[0][0] <= 5
+    assert _rows(path, 'SELECT COUNT(*) FROM books b WHERE b.available_copies != b.total_copies - '
+                       '(SELECT COUNT(*) FROM borrow_records r WHERE r.book_id = b.id AND r.return_date IS NULL)'
+                 )[0][0] == 0
+    overdue = _rows(path, "SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL AND due_date < '2026-01-15'")
+    assert overdue[0][0] == stats['overdue_loans'] == stats['active_loans'] // 2
+
+
+def test_generate_dataset_refuses_to_overwrite_without_force(tmp_path):
+    path = str(tmp_path / 'lib.db')
+    datagen.generate_dataset(path, books=10, patrons=5, loans=10, seed=1)
+    with pytest.raises(ValueError):
+        datagen.generate_dataset(path, books=10, patrons=5, loans=10, seed=1)
+    datagen.generate_dataset(path, books=20, patrons=5, loans=10, seed=1, force=True)
+    assert _rows(path, 'SELECT COUNT(*) FROM books')[0][0] == 20
@@ -0,0 +1,137 @@
+# tests/test_db_writer.py
+import sqlite3
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+import db_writer
+from services import library_service
+
+
+@pytest.fixture
+def writer(temp_db):
+    w = db_writer.start()
+    yield w
+    db_writer.stop()
+
+
+def _insert_book(cur, title):
+    cur.execute("INSERT INTO books(title, author, isbn, total_copies, available_copies) "
+                "VALUES (?, 'A', ?, 1, 1)", (title, title.rjust(13, '0')))
+    return cur.lastrowid
+
+
+def _fail(cur):
+    cur.execute("INSERT INTO books(title, author, isbn, total_copies, available_copies) "
+                "VALUES ('partial', 'A', '9999999999999', 1, 1)")
+    raise ValueError('boom')
+
+
+def test_queued_writes_commit_in_one_batch(temp_db):
+    w = db_writer.GroupCommitWriter(temp_db.DATABASE)
+    futures = [w.submit(_insert_book, str(i)) for i in range(20)]
+    w.start()
+    try:
+        assert [f.result(5) for f in futures] == list(range(1, 21))
+    finally:
+        w.stop()
+    assert w.stats()['batches'] == 1
+    assert w.stats()['largest_batch'] == 20
+    assert len(temp_db.get_all_books()) == 20
+
+
+def test_failing_operation_is_rolled_back_alone(temp_db):
+    w = db_writer.GroupCommitWriter(temp_db.DATABASE)
+    ok = w.submit(_insert_book, 'kept')
+    bad = w.submit(_fail)
+    w.start()
+    try:
+        assert ok.result(5) == 1
+        with pytest.raises(ValueError):
+            bad.result(5)
+    finally:
+        w.stop()
+    assert [b['title'] for b in temp_db.get_all_books()] == ['kept']
+
+
+def test_database_writes_go_through_the_writer(writer, temp_db):
+    temp_db.insert_book('Book', 'Author', '1234567890123', 2)
+    book = temp_db.get_book_by_isbn('1234567890123')
+    assert library_service.borrow_book_by_patron('123456', book['id'])[0]
+    assert temp_db.get_book_by_id(book['id'])['available_copies'] == 1
+    assert library_service.return_book_by_patron('123456', book['id'])[0]
+    assert temp_db.get_book_by_id(book['id'])['available_copies'] == 2
+    assert writer.stats()['operations'] == 4
+
+
+def test_concurrent_availability_updates_never_oversell(writer, temp_db):
+    temp_db.insert_book('Popular', 'Author', '1234567890123', 5)
+    book_id = temp_db.get_book_by_isbn('1234567890123')['id']
+    results = []
+
+    def _take():
+        results.append(temp_db.update_book_availability(book_id, -1))
+
+    threads = [threading.Thread(target=_take) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 5
+    assert temp_db.get_book_by_id(book_id)['available_copies'] == 0
+
+
+def test_stop_restores_direct_writes(temp_db):
+    db_writer.start()
+    db_writer.stop()
+    assert temp_db._write_executor is None
+    temp_db.insert_book('Book', 'Author', '1234567890123', 1)
+    book_id = temp_db.get_book_by_isbn('1234567890123')['id']
+    assert temp_db.update_book_availability(book_id, -1)
+
+
+def test_create_app_starts_writer_when_enabled(temp_db):
+    from app import create_app
+
+    create_app({'GROUP_COMMIT': True})
+    try:
+        assert db_writer.get_writer() is not None and db_writer.get_writer().running
+    finally:
+        db_writer.stop()
+
+
+def test_locked_database_fails_queued_writes_instead_of_hanging(temp_db, monkeypatch):
+    real_connect = temp_db.get_db_connection
+
+    def _no_wait_connection(path=None):
+        conn = real_connect(path)
+        conn.execute('PRAGMA busy_timeout = 0')
+        return conn
+
+    monkeypatch.setattr(temp_db, 'get_db_connection', _no_wait_connection)
+    holder = sqlite3.connect(temp_db.DATABASE)
+    holder.execute('BEGIN IMMEDIATE')
+    w = db_writer.GroupCommitWriter(temp_db.DATABASE)
+    futures = [w.submit(_insert_book, str(i)) for i in range(3)]
+    w.start()
+    try:
+        for f in futures:
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                f.result(5)
+    finally:
+        holder.close()
+        w.stop()
+    assert temp_db.get_all_books() == []
+
+
+def test_call_timeout_cancels_a_write_that_is_still_queued(temp_db):
+    w = db_writer.GroupCommitWriter(temp_db.DATABASE)  # not started: nothing drains the queue
+    with pytest.raises(FutureTimeout):
+        w.call(_insert_book, 'late', timeout=0.01)
+    w.start()
+    try:
+        assert w.call(_insert_book, 'next') == 1
+    finally:
+        w.stop()
+    assert [b['title'] for b in temp_db.get_all_books()] == ['next']
@@ -0,0 +1,100 @@
+# tests/test_export.py
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import export_service
+
+START = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def export_db(temp_db):
+    """3 books; 10 loans on consecutive days, the first 4 archived, the last still open."""
+    for i in range(3):
+        temp_db.insert_book(f'Book {i}', 'Author, "Jr."', f'123456789012{i}', 2)
+    conn = temp_db.get_db_connection()
+    for i in range(10):
+        borrowed = START + timedelta(days=i)
+        row = (i + 1, f'{100000 + i}', i % 3 + 1, borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat())
+        if i < 4:
+            conn.execute("INSERT INTO borrow_records_archive(id, patron_id, book_id, borrow_date, due_date, "
+                         "return_date, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         row + (row[3], '2025-01-01T00:00:00'))
+        else:
+            conn.execute("INSERT INTO borrow_records(id, patron_id, book_id, borrow_date, due_date, return_date) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", row + (None if i == 9 else row[3],))
+    conn.commit()
+    conn.close()
+    return temp_db
+
+
+def _export(*args, **kwargs):
+    ok, blocks = export_service.export_records(*args, **kwargs)
+    assert ok, blocks
+    return list(blocks)
+
+
+def test_books_csv_round_trips(export_db):
+    rows = list(csv.DictReader(io.StringIO(''.join(_export('books', 'csv')))))
+    assert [r['isbn'] for r in rows] == ['1234567890120', '1234567890121', '1234567890122']
+    assert rows[0]['author'] == 'Author, "Jr."'
+    assert rows[0]['total_copies'] == '2'
+
+
+def test_rows_are_read_and_encoded_in_chunks(export_db):
+    blocks = _export('loans', 'ndjson', chunk_size=4)
+    assert [b.count('\n') for b in blocks] == [4, 2, 4]  # 6 live rows, then 4 archived
+    csv_blocks = _export('loans', 'csv', chunk_size=4)
+    assert csv_blocks[0].startswith('id,patron_id') and len(csv_blocks) == 4
+
+
+def test_loans_include_archive_and_filter_on_borrow_date(export_db):
+    loans = [json.loads(line) for line in ''.join(_export('loans', 'ndjson')).splitlines()]
+    assert sorted(l['id'] for l in loans) == list(range(1, 11))
+    assert [l['id'] for l in loans if l['archived_at']] == [1, 2, 3, 4]
+    assert next(l for l in loans if l['id'] == 10)['return_date'] is None
+
+    window = ''.join(_export('loans', 'ndjson', since='2024-01-03', until='2024-01-06'))
+    assert [json.loads(line)['id'] for line in window.splitlines()] == [5, 3, 4]
+    live = ''.join(_export('loans', 'ndjson', since='2024-01-03', include_archived=False))
+    assert len(live.splitlines()) == 6
+
+
+@pytest.mark.parametrize('args, error', [
+    (('shelves',), 'Unknown export'),
+    (('books', 'xml'), 'format must be'),
+    (('books', 'csv', '2024-01-01'), 'no date filter'),
+    (('loans', 'csv', 'yesterday'), 'since must be'),
+])
+def test_rejects_bad_requests(export_db, args, error):
+    ok, message = export_service.export_records(*args)
+    assert not ok and error in message
+
+
+def test_export_endpoint_streams(export_db):
+    from app import create_app
+
+    client = create_app({'TESTING': True}).test_client()
+    resp = client.get('/api/export/loans?format=ndjson&since=2024-01-05&archived=0')
+    assert resp.status_code == 200 and resp.is_streamed
+    assert resp.mimetype == 'application/x-ndjson'
+    assert 'loans.ndjson' in resp.headers['Content-Disposition']
+    assert len(resp.get_data(as_text=True).splitlines()) == 6
+    books = client.get('/api/export/books')
+    assert books.mimetype == 'text/csv' and len(books.get_data(as_text=True).splitlines()) == 4
+    assert client.get('/api/export/loans?until=soon').status_code == 400
+
+
+def test_export_command(export_db, tmp_path):
+    from app import create_app
+
+    runner = create_app({'TESTING': True}).test_cli_runner()
+    out = tmp_path / 'books.ndjson'
+    result = runner.invoke(args=['export', 'books', '--format', 'ndjson', '--out', str(out)])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)['title'] for line in out.read_text().splitlines()] == ['Book 0', 'Book 1', 'Book 2']
+    assert runner.invoke(args=['export', 'loans', '--since', 'bad']).exit_code == 1
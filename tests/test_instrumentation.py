@@ -0,0 +1,53 @@
+# tests/test_instrumentation.py
+import pytest
+
+import database
+import instrumentation
+from app import create_app
+
+
+@pytest.fixture
+def perf_client(temp_db):
+    app = create_app({'TESTING': True, 'PERF_INSTRUMENTATION': True, 'PERF_RING_SIZE': 5})
+    yield app.test_client()
+    database.remove_query_observer(instrumentation._on_query)
+
+
+def test_disabled_by_default_has_no_debug_endpoint(temp_db):
+    client = create_app({'TESTING': True}).test_client()
+    response = client.get('/catalog')
+    assert 'Server-Timing' not in response.headers
+    assert client.get('/debug/perf').status_code == 404
+
+
+def test_server_timing_header_counts_queries(perf_client):
+    response = perf_client.get('/catalog')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('app;dur=')
+    # catalog version lookup for the ETag + the books query
+    assert 'db;dur=' in timing and '"2 queries"' in timing
+
+
+def test_debug_perf_reports_ring_buffer_and_summary(perf_client):
+    for _ in range(7):
+        perf_client.get('/catalog')
+    perf_client.get('/api/late_fee/123456/1')
+    data = perf_client.get('/debug/perf').get_json()
+    assert data['capacity'] == 5
+    assert len(data['recent']) == 5  # oldest records evicted
+    assert data['recent'][-1]['endpoint'] == 'api.get_late_fee'
+    assert data['endpoints']['catalog.catalog']['count'] == 4
+    assert data['endpoints']['catalog.catalog']['sql_queries_mean'] == 2
+
+
+def test_timed_gateway_accumulates_only_inside_a_request(mocker):
+    with instrumentation.timed_gateway():
+        pass  # no active request: nothing recorded, no error
+    token = instrumentation._current.set(instrumentation.RequestStats())
+    try:
+        mocker.patch('instrumentation.time.perf_counter', side_effect=[1.0, 1.25])
+        with instrumentation.timed_gateway():
+            pass
+        assert instrumentation.current_stats().gateway_time == pytest.approx(0.25)
+    finally:
+        instrumentation._current.reset(token)
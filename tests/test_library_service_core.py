@@ -52,7 +52,7 @@ def test_add_book_db_error(mocker):
 def test_borrow_book_success(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book", "available_copies": 2
+        "id": 10, "title": "Test Book", "available_copies": 2, "total_copies": 2, "version": 0
     })
     mocker.patch("services.library_service.get_patron_borrow_count", return_value=0)
     mocker.patch("services.library_service.insert_borrow_record", return_value=True)
@@ -81,7 +81,7 @@ def test_borrow_book_not_found(mocker):
 def test_borrow_book_unavailable(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book", "available_copies": 0
+        "id": 10, "title": "Test Book", "available_copies": 0, "total_copies": 2, "version": 0
     })
     ok, msg = library_service.borrow_book_by_patron("123456", 10)
     assert ok is False
@@ -91,7 +91,7 @@ def test_borrow_book_unavailable(mocker):
 def test_borrow_book_over_limit(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book", "available_copies": 1
+        "id": 10, "title": "Test Book", "available_copies": 1, "total_copies": 2, "version": 0
     })
     mocker.patch("services.library_service.get_patron_borrow_count", return_value=5)
     ok, msg = library_service.borrow_book_by_patron("123456", 10)
@@ -102,20 +102,23 @@ def test_borrow_book_over_limit(mocker):
 def test_borrow_book_insert_record_fails(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book", "available_copies": 1
+        "id": 10, "title": "Test Book", "available_copies": 1, "total_copies": 2, "version": 0
     })
     mocker.patch("services.library_service.get_patron_borrow_count", return_value=0)
     mocker.patch("services.library_service.insert_borrow_record", return_value=False)
+    # The copy is taken before the record is written, then given back.
+    update = mocker.patch("services.library_service.update_book_availability", return_value=True)
 
     ok, msg = library_service.borrow_book_by_patron("123456", 10)
     assert ok is False
     assert "database error" in msg.lower()
+    assert [c.args for c in update.call_args_list] == [(10, -1), (10, 1)]
 
 
 def test_borrow_book_update_availability_fails(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book", "available_copies": 1
+        "id": 10, "title": "Test Book", "available_copies": 1, "total_copies": 2, "version": 0
     })
     mocker.patch("services.library_service.get_patron_borrow_count", return_value=0)
     mocker.patch("services.library_service.insert_borrow_record", return_value=True)
@@ -131,7 +134,7 @@ def test_borrow_book_update_availability_fails(mocker):
 def test_return_book_success_with_fee(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book"
+        "id": 10, "title": "Test Book", "available_copies": 1, "total_copies": 2, "version": 0
     })
     mocker.patch("services.library_service.update_borrow_record_return_date", return_value=True)
     mocker.patch("services.library_service.update_book_availability", return_value=True)
@@ -149,7 +152,7 @@ def test_return_book_success_with_fee(mocker):
 def test_return_book_success_no_fee(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
     mocker.patch("services.library_service.get_book_by_id", return_value={
-        "id": 10, "title": "Test Book"
+        "id": 10, "title": "Test Book", "available_copies": 1, "total_copies": 2, "version": 0
     })
     mocker.patch("services.library_service.update_borrow_record_return_date", return_value=True)
     mocker.patch("services.library_service.update_book_availability", return_value=True)
@@ -178,21 +181,29 @@ def test_return_book_not_found(mocker):
 
 def test_return_book_update_record_fails(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
-    mocker.patch("services.library_service.get_book_by_id", return_value={"id": 1, "title": "x"})
+    mocker.patch("services.library_service.get_book_by_id", return_value={
+        "id": 1, "title": "x", "available_copies": 0, "total_copies": 1, "version": 0
+    })
     mocker.patch("services.library_service.update_borrow_record_return_date", return_value=False)
+    # The copy is put back before the loan is closed, then taken again.
+    update = mocker.patch("services.library_service.update_book_availability", return_value=True)
     ok, msg = library_service.return_book_by_patron("123456", 1)
     assert ok is False
     assert "no active borrow record" in msg.lower()
+    assert [c.args for c in update.call_args_list] == [(1, 1), (1, -1)]
 
 
 def test_return_book_update_availability_fails(mocker):
     mocker.patch("services.library_service._is_valid_patron_id", return_value=True)
-    mocker.patch("services.library_service.get_book_by_id", return_value={"id": 1, "title": "x"})
-    mocker.patch("services.library_service.update_borrow_record_return_date", return_value=True)
+    mocker.patch("services.library_service.get_book_by_id", return_value={
+        "id": 1, "title": "x", "available_copies": 0, "total_copies": 1, "version": 0
+    })
+    close = mocker.patch("services.library_service.update_borrow_record_return_date", return_value=True)
     mocker.patch("services.library_service.update_book_availability", return_value=False)
     ok, msg = library_service.return_book_by_patron("123456", 1)
     assert ok is False
     assert "database error" in msg.lower()
+    close.assert_not_called()  # the loan stays open when the copy cannot be put back
 
 
 # ---------- R5: late fee calculation ----------
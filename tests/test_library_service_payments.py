@@ -8,7 +8,7 @@ from services.payment_service import PaymentGateway\
 
 # ---------- pay_late_fees tests ----------
 
-def test_pay_late_fees_success(mocker):
+def test_pay_late_fees_success(mocker, temp_db):
     # stub the late-fee lookup
     mocker.patch(
         "services.library_service.calculate_late_fee_for_book",
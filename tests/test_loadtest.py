@@ -0,0 +1,34 @@
+# tests/test_loadtest.py
+import pytest
+
+from benchmarks import loadtest
+
+
+def test_parse_mix_validates_operations():
+    assert loadtest.parse_mix('search=3, borrow=1') == {'search': 3, 'borrow': 1}
+    with pytest.raises(ValueError):
+        loadtest.parse_mix('teleport=1')
+    with pytest.raises(ValueError):
+        loadtest.parse_mix('search=0')
+
+
+def test_summarize_reports_percentiles_and_error_rate():
+    samples = [('search', float(ms), ms != 100) for ms in range(1, 101)]
+    report = loadtest.summarize(samples, elapsed=2.0)
+    assert report['search']['requests'] == 100
+    assert report['search']['errors'] == 1
+    assert report['search']['throughput_rps'] == 50.0
+    assert report['search']['p50_ms'] == 51.0
+    assert report['search']['p99_ms'] == 99.0
+    assert report['overall']['requests'] == 100
+
+
+def test_run_load_test_against_local_server(temp_db):
+    temp_db.insert_book('Load Test Book', 'Author', '1234567890123', 3)
+    report = loadtest.run_load_test(
+        patrons=2, duration=0.5, mix={'catalog': 1, 'late_fee': 1, 'borrow': 1},
+        books=1, patron_ids=['123456', '654321'], app_config={'TESTING': True},
+    )
+    ops = report['operations']
+    assert ops['overall']['requests'] > 0
+    assert ops['overall']['errors'] == 0
@@ -0,0 +1,91 @@
+# tests/test_metrics.py
+import threading
+
+import pytest
+
+import database
+import metrics
+from app import create_app
+from services import library_service
+
+
+def test_counter_merges_thread_shards():
+    counter = metrics.Counter('t_total', 'test', ('kind',))
+
+    def work():
+        for _ in range(1000):
+            counter.inc(('a',))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc(('b',), 2)
+    assert counter.collect() == {('a',): 8000.0, ('b',): 2.0}
+    assert counter.render() == ['t_total{kind="a"} 8000', 't_total{kind="b"} 2']
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram('t_seconds', 'test', (), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value)
+    assert hist.render() == [
+        't_seconds_bucket{le="0.1"} 2',
+        't_seconds_bucket{le="1"} 3',
+        't_seconds_bucket{le="+Inf"} 4',
+        't_seconds_sum 3.65',
+        't_seconds_count 4',
+    ]
+
+
+def test_outcome_label_strips_variable_detail():
+    assert metrics.outcome_label(True, 'Borrowed "X" successfully.') == 'success'
+    assert metrics.outcome_label(False, 'Payment failed: card declined') == 'Payment failed'
+    assert metrics.outcome_label(False, 'Book not found.') == 'Book not found.'
+
+
+def test_service_outcomes_are_counted(monkeypatch):
+    before = metrics.OPERATION_OUTCOMES.collect().get(('borrow', 'Book not found.'), 0)
+    monkeypatch.setattr(library_service, 'get_book_by_id', lambda book_id: None)
+    assert library_service.borrow_book_by_patron('123456', 1) == (False, 'Book not found.')
+    assert metrics.OPERATION_OUTCOMES.collect()[('borrow', 'Book not found.')] == before + 1
+
+
+def test_metrics_endpoint_exposes_request_and_db_latency(temp_db):
+    client = create_app({'TESTING': True}).test_client()
+    try:
+        client.get('/catalog')
+        response = client.get('/metrics')
+    finally:
+        database.remove_query_observer(metrics._on_query)
+        database.remove_connect_observer(metrics._on_connect)
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'library_http_request_duration_seconds_count{blueprint="catalog",endpoint="catalog.catalog"}' in body
+    assert 'library_http_requests_total{blueprint="catalog",endpoint="catalog.catalog",status="200"}' in body
+    assert 'library_db_query_seconds_count{verb="SELECT",phase="execute"}' in body
+    assert '# TYPE library_db_connect_seconds histogram' in body
+
+
+def test_cache_hit_ratio_gauge():
+    metrics.record_cache('unit_test', True)
+    metrics.record_cache('unit_test', True)
+    metrics.record_cache('unit_test', False)
+    assert metrics._cache_hit_ratios()[('unit_test',)] == pytest.approx(2 / 3)
+
+
+def test_serve_workers_label_their_samples(monkeypatch):
+    counter = metrics.Counter('t_total', 'test', ('kind',))
+    hist = metrics.Histogram('t_seconds', 'test', (), buckets=(1.0,))
+    registry = metrics.Registry()
+    registry.register(counter)
+    registry.register(hist)
+    counter.inc(('a',))
+    hist.observe(0.5)
+    assert 't_total{kind="a"} 1' in registry.render()
+    monkeypatch.setenv('LIBRARY_WORKER_ID', '3')
+    body = registry.render()
+    assert 't_total{kind="a",worker="3"} 1' in body
+    assert 't_seconds_bucket{worker="3",le="1"} 1' in body and 't_seconds_count{worker="3"} 1' in body
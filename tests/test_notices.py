@@ -0,0 +1,101 @@
+# tests/test_notices.py
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import notice_service
+
+AS_OF = datetime(2025, 6, 1, 10, 0)
+
+
+def _loan(conn, patron_id, book_id, due_in_days, returned=False):
+    due = AS_OF + timedelta(days=due_in_days)
+    conn.execute(
+        "INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)",
+        (patron_id, book_id, (due - timedelta(days=14)).isoformat(), due.isoformat(),
+         AS_OF.isoformat() if returned else None))
+
+
+@pytest.fixture
+def loans_db(temp_db):
+    temp_db.insert_book('Book One', 'Author', '1234567890123', 9)
+    temp_db.insert_book('Book Two', 'Author', '1234567890124', 9)
+    conn = temp_db.get_db_connection()
+    _loan(conn, '111111', 1, -10)               # overdue 10 days
+    _loan(conn, '111111', 2, 2)                 # due soon
+    _loan(conn, '222222', 1, -3)                # overdue 3 days
+    _loan(conn, '222222', 2, -30, returned=True)
+    _loan(conn, '333333', 1, 10)                # not due yet
+    for i in range(5):
+        _loan(conn, f'{400000 + i}', 2, 0)      # due today
+    conn.commit()
+    conn.close()
+    return temp_db
+
+
+def _outbox(db):
+    conn = db.get_db_connection()
+    rows = conn.execute('SELECT patron_id, kind, notice_date, payload FROM notice_outbox ORDER BY id').fetchall()
+    conn.close()
+    return [(r['patron_id'], r['kind'], r['notice_date'], json.loads(r['payload'])) for r in rows]
+
+
+def test_notices_grouped_by_patron_with_fees(loans_db):
+    stats = notice_service.generate_notices(AS_OF)
+    assert (stats['patrons'], stats['loans'], stats['queued'], stats['complete']) == (7, 8, 8, True)
+    notices = {(p, kind): payload for p, kind, _, payload in _outbox(loans_db)}
+    assert set(notices) == {('111111', 'overdue'), ('111111', 'due_soon'), ('222222', 'overdue')} | {
+        (f'{400000 + i}', 'due_soon') for i in range(5)}
+    overdue = notices[('111111', 'overdue')]
+    assert [(i['book_id'], i['days_overdue'], i['fee_amount']) for i in overdue['items']] == [(1, 10, 6.5)]
+    assert overdue['total_fee'] == 6.5
+    assert notices[('222222', 'overdue')]['total_fee'] == 1.5
+    assert notices[('111111', 'due_soon')]['items'][0]['title'] == 'Book Two'
+
+
+def test_rerun_on_the_same_day_queues_nothing_new(loans_db):
+    notice_service.generate_notices(AS_OF)
+    assert notice_service.generate_notices(AS_OF)['queued'] == 0
+    assert notice_service.generate_notices(AS_OF + timedelta(days=1))['queued'] == 8
+
+
+def test_time_budget_stops_between_batches_and_resumes(loans_db):
+    stats = notice_service.generate_notices(AS_OF, time_budget=0, batch_size=2)
+    assert not stats['complete'] and stats['resume_after'] == '222222'
+    assert stats['patrons'] == 2
+    rest = notice_service.generate_notices(AS_OF, time_budget=0, batch_size=100, after_patron=stats['resume_after'])
+    assert rest['complete'] and rest['patrons'] == 5
+    assert len(_outbox(loans_db)) == 8
+
+
+def test_open_loan_scan_uses_the_partial_index(loans_db):
+    conn = loans_db.get_db_connection()
+    plan = ' '.join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT br.id, br.book_id, br.due_date FROM borrow_records br "
+        "WHERE br.return_date IS NULL AND br.due_date < ? AND br.patron_id > ? ORDER BY br.patron_id, br.due_date",
+        ('2025-06-05', '')))
+    conn.close()
+    assert 'idx_borrow_records_open_due' in plan and 'TEMP B-TREE' not in plan
+
+
+def test_deliver_marks_notices_sent(loans_db, tmp_path):
+    notice_service.generate_notices(AS_OF)
+    batches = []
+    assert notice_service.deliver_notices(batches.append, limit=5, batch_size=3) == 5
+    assert [len(b) for b in batches] == [3, 2]
+    assert batches[0][0]['payload']['items']
+    out = tmp_path / 'mail.jsonl'
+    assert notice_service.deliver_notices(notice_service.jsonl_sender(str(out))) == 3
+    assert notice_service.deliver_notices(batches.append) == 0
+    assert len(out.read_text().splitlines()) == 3
+
+
+def test_notice_commands(loans_db, tmp_path):
+    from app import create_app
+
+    runner = create_app({'TESTING': True}).test_cli_runner()
+    result = runner.invoke(args=['generate-notices', '--as-of', '2025-06-01'])
+    assert 'Queued 8 notices for 7 patrons' in result.output
+    out = tmp_path / 'mail.jsonl'
+    assert 'Delivered 8' in runner.invoke(args=['deliver-notices', '--out', str(out)]).output
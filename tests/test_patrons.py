@@ -0,0 +1,159 @@
+# tests/test_patrons.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import datagen
+from services import library_service
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture(params=['app', 'triggers'])
+def counters_db(request, temp_db):
+    """A temp database maintaining patron counters in the write functions or via triggers."""
+    temp_db.use_patron_triggers(request.param == 'triggers')
+    temp_db.insert_book('Book One', 'Author', '1234567890123', 3)
+    temp_db.insert_book('Book Two', 'Author', '1234567890124', 3)
+    yield temp_db
+    temp_db.use_patron_triggers(False)
+
+
+def _overdue_loan(db, patron_id, book_id, days_overdue):
+    due = datetime.now() - timedelta(days=days_overdue)
+    db.insert_borrow_record(patron_id, book_id, due - timedelta(days=14), due)
+    db.update_book_availability(book_id, -1)
+
+
+def test_late_fee_sql_matches_service_rule(temp_db):
+    conn = temp_db.get_db_connection()
+    for days in range(0, 40):
+        due = datetime(2024, 1, 1, 18, 30)
+        returned = due + timedelta(days=days, hours=-12)
+        row = conn.execute(f"SELECT {temp_db._late_fee_sql('r')} FROM (SELECT ? AS due_date, ? AS return_date) r",
+                           (due.isoformat(), returned.isoformat())).fetchone()
+        expected = library_service._compute_fee((returned.date() - due.date()).days)
+        assert row[0] == pytest.approx(expected), days
+    conn.close()
+
+
+def test_borrow_and_return_maintain_counters(counters_db):
+    assert counters_db.get_patron('123456') is None
+    assert library_service.borrow_book_by_patron('123456', 1)[0]
+    assert library_service.borrow_book_by_patron('123456', 2)[0]
+    assert counters_db.get_patron('123456')['active_loans'] == 2
+    assert counters_db.get_patron_borrow_count('123456') == 2
+
+    assert library_service.return_book_by_patron('123456', 1)[0]
+    patron = counters_db.get_patron('123456')
+    assert (patron['active_loans'], patron['outstanding_fees']) == (1, 0.0)
+    assert counters_db.check_patron_counters() == []
+
+
+def test_overdue_return_adds_late_fee(counters_db):
+    _overdue_loan(counters_db, '654321', 1, days_overdue=10)
+    ok, message = library_service.return_book_by_patron('654321', 1)
+    assert ok and 'Late fee: $6.50' in message
+    patron = counters_db.get_patron('654321')
+    assert (patron['active_loans'], patron['outstanding_fees']) == (0, 6.5)
+    assert counters_db.check_patron_counters() == []
+
+
+def test_fee_payments_reduce_outstanding_fees(counters_db, mocker):
+    gateway = mocker.Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, 'txn_1', 'OK')
+    _overdue_loan(counters_db, '654321', 1, days_overdue=10)
+    _overdue_loan(counters_db, '654321', 2, days_overdue=3)
+    library_service.return_book_by_patron('654321', 1)
+    assert counters_db.get_patron('654321')['outstanding_fees'] == 6.5
+
+    # Paid while still on loan: a credit until the return assesses the fee.
+    assert library_service.pay_late_fees('654321', 2, gateway)[0]
+    assert counters_db.get_patron('654321')['outstanding_fees'] == 5.0
+    assert counters_db.check_patron_counters() == []
+    library_service.return_book_by_patron('654321', 2)
+    assert counters_db.get_patron('654321')['outstanding_fees'] == 6.5
+    assert not counters_db.record_fee_payment('654321', 2, 1.5, 'txn_1')  # recorded once
+
+    conn = counters_db.get_db_connection()
+    conn.execute("UPDATE patrons SET outstanding_fees = 8.0 WHERE patron_id = '654321'")
+    conn.commit()
+    conn.close()
+    assert [m['expected_outstanding_fees'] for m in counters_db.check_patron_counters(repair=True)] == [6.5]
+    assert counters_db.get_patron('654321')['outstanding_fees'] == 6.5
+
+
+def test_return_without_active_loan_leaves_counters(counters_db):
+    assert not counters_db.update_borrow_record_return_date('111111', 1, datetime.now())
+    assert counters_db.get_patron('111111') is None
+
+
+def test_borrow_limit_uses_counter(counters_db):
+    conn = counters_db.get_db_connection()
+    conn.execute("INSERT INTO patrons(patron_id, active_loans) VALUES ('222222', 5)")
+    conn.commit()
+    conn.close()
+    ok, message = library_service.borrow_book_by_patron('222222', 1)
+    assert not ok and 'maximum borrowing limit' in message
+
+
+def test_checker_finds_and_repairs_drift(counters_db):
+    library_service.borrow_book_by_patron('123456', 1)
+    _overdue_loan(counters_db, '654321', 2, days_overdue=3)
+    library_service.return_book_by_patron('654321', 2)
+    conn = counters_db.get_db_connection()
+    conn.execute("UPDATE patrons SET active_loans = 7 WHERE patron_id = '123456'")
+    conn.execute("DELETE FROM patrons WHERE patron_id = '654321'")
+    conn.execute("INSERT INTO patrons(patron_id, active_loans, outstanding_fees) VALUES ('999999', 2, 1.0)")
+    conn.commit()
+    conn.close()
+
+    drift = counters_db.check_patron_counters()
+    assert [(m['patron_id'], m['expected_active_loans'], m['expected_outstanding_fees']) for m in drift] == [
+        ('123456', 1, 0.0), ('654321', 0, 1.5), ('999999', 0, 0.0)]
+    assert counters_db.check_patron_counters(repair=True) == drift
+    assert counters_db.check_patron_counters() == []
+    assert counters_db.get_patron('654321')['outstanding_fees'] == 1.5
+
+
+def test_generated_dataset_has_consistent_counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'unused.db'))
+    path = str(tmp_path / 'gen.db')
+    stats = datagen.generate_dataset(path, books=200, patrons=50, loans=2000, seed=3)
+    monkeypatch.setattr(database, 'DATABASE', path)
+    assert database.check_patron_counters() == []
+    conn = database.get_db_connection()
+    assert conn.execute('SELECT SUM(active_loans) FROM patrons').fetchone()[0] == stats['active_loans']
+    conn.close()
+    database.close_read_connections()
+
+
+def test_check_patrons_command(counters_db):
+    from app import create_app
+
+    runner = create_app({'TESTING': True, 'PATRON_COUNTERS': 'app'}).test_cli_runner()
+    assert 'consistent' in runner.invoke(args=['check-patrons']).output
+    conn = counters_db.get_db_connection()
+    conn.execute("INSERT INTO patrons(patron_id, active_loans) VALUES ('999999', 1)")
+    conn.commit()
+    conn.close()
+    assert runner.invoke(args=['check-patrons']).exit_code == 1
+    assert 'Repaired 1' in runner.invoke(args=['check-patrons', '--repair']).output
+
+
+def test_migration_backfills_patrons_from_borrow_records(temp_db):
+    conn = temp_db.get_db_connection()
+    conn.execute("INSERT INTO books(title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('B', 'A', '1234567890123', 2, 1)")
+    conn.executemany(
+        "INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, 1, ?, ?, ?)",
+        [('333333', '2024-01-01T10:00:00', '2024-01-15T10:00:00', '2024-01-17T09:00:00'),
+         ('333333', '2024-02-01T10:00:00', '2024-02-15T10:00:00', None)])
+    conn.execute('DROP TABLE patrons')
+    conn.execute('PRAGMA user_version = 4')
+    conn.commit()
+    conn.close()
+
+    assert temp_db.init_database() == temp_db.SCHEMA_VERSION - 4
+    patron = temp_db.get_patron('333333')
+    assert (patron['active_loans'], patron['outstanding_fees']) == (1, 1.0)
@@ -10,7 +10,8 @@ def _make_book(book_id=1, title="Book Title", available=1, total=1):
         "author": "Author",
         "isbn": "1234567890123",
         "available_copies": available,
-        "total_copies": total
+        "total_copies": total,
+        "version": 0
     }
 
 def _patch_defaults(monkeypatch, *, book=None, borrow_count=0,
@@ -23,7 +24,7 @@ def _patch_defaults(monkeypatch, *, book=None, borrow_count=0,
     monkeypatch.setattr(library_service, 'get_book_by_id', lambda book_id: book)
     monkeypatch.setattr(library_service, 'get_patron_borrow_count', lambda patron_id: borrow_count)
     monkeypatch.setattr(library_service, 'insert_borrow_record', lambda patron_id, book_id, borrow_date, due_date: insert_success)
-    monkeypatch.setattr(library_service, 'update_book_availability', lambda book_id, delta: update_success)
+    monkeypatch.setattr(library_service, 'update_book_availability', lambda book_id, delta, expected_version=None: update_success)
 
 
 @pytest.mark.parametrize("patron_id", ["", "12345", "1234567", "ABC123", "12A456"])
@@ -127,7 +128,7 @@ def test_successful_borrow_records_and_message(monkeypatch):
         return True
 
     monkeypatch.setattr(library_service, 'insert_borrow_record', fake_insert)
-    monkeypatch.setattr(library_service, 'update_book_availability', lambda book_id, delta: True)
+    monkeypatch.setattr(library_service, 'update_book_availability', lambda book_id, delta, expected_version=None: True)
 
     success, message = library_service.borrow_book_by_patron("444444", 10)
     assert success is True
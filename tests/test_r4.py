@@ -1,6 +1,6 @@
 # tests/test_r4.py
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 from services import library_service
 
 def _make_book(book_id=1, title="Returned Book", author="Author", isbn="1234567890123", total=2, available=1):
@@ -10,7 +10,8 @@ def _make_book(book_id=1, title="Returned Book", author="Author", isbn="12345678
         "author": author,
         "isbn": isbn,
         "total_copies": total,
-        "available_copies": available
+        "available_copies": available,
+        "version": 0
     }
 
 def _patch_defaults(monkeypatch, *, book=None,
@@ -29,7 +30,7 @@ def _patch_defaults(monkeypatch, *, book=None,
     def fake_update_return(patron_id, book_id, return_date):
         return update_return_success
     monkeypatch.setattr(library_service, 'update_borrow_record_return_date', fake_update_return)
-    monkeypatch.setattr(library_service, 'update_book_availability', lambda bid, delta: update_avail_success)
+    monkeypatch.setattr(library_service, 'update_book_availability', lambda bid, delta, expected_version=None: update_avail_success)
     if fee_result is None:
         fee_result = {'fee_amount': 0.0, 'days_overdue': 0, 'status': 'No late fee'}
     monkeypatch.setattr(library_service, 'calculate_late_fee_for_book', lambda patron_id, book_id: fee_result)
@@ -121,7 +122,7 @@ def test_return_records_return_date(monkeypatch):
         recorded['return_date'] = return_date
         return True
     monkeypatch.setattr(library_service, 'update_borrow_record_return_date', fake_update_return)
-    monkeypatch.setattr(library_service, 'update_book_availability', lambda bid, delta: True)
+    monkeypatch.setattr(library_service, 'update_book_availability', lambda bid, delta, expected_version=None: True)
     monkeypatch.setattr(library_service, 'calculate_late_fee_for_book', lambda pid, bid: {'fee_amount': 0.0, 'days_overdue': 0, 'status': 'No late fee'})
 
     success, message = library_service.return_book_by_patron("555555", 5)
@@ -130,3 +131,20 @@ def test_return_records_return_date(monkeypatch):
     assert isinstance(recorded['return_date'], datetime)
     # return_date should be recent (within 10 seconds)
     assert (datetime.now() - recorded['return_date']).total_seconds() < 10
+
+
+def test_return_of_real_overdue_loan_reports_its_fee(temp_db):
+    """
+    Against a real database: the fee is assessed while the loan is still open, so a
+    returned overdue loan reports its fee (10 days overdue -> $6.50).
+    """
+    temp_db.insert_book("Overdue Book", "Author", "1234567890123", 1)
+    book_id = temp_db.get_book_by_isbn("1234567890123")['id']
+    due = datetime.now() - timedelta(days=10)
+    temp_db.insert_borrow_record("666666", book_id, due - timedelta(days=14), due)
+    temp_db.update_book_availability(book_id, -1)
+
+    success, message = library_service.return_book_by_patron("666666", book_id)
+    assert success is True
+    assert message == 'Return processed for "Overdue Book". Late fee: $6.50.'
+    assert temp_db.get_active_borrow_record("666666", book_id) is None
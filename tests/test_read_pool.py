@@ -0,0 +1,68 @@
+# tests/test_read_pool.py
+import sqlite3
+
+import pytest
+
+import database
+
+
+def test_read_connections_are_read_only_and_pooled(temp_db):
+    conn = temp_db.get_read_connection()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO books(title, author, isbn, total_copies, available_copies) "
+                     "VALUES ('x', 'y', '1234567890123', 1, 1)")
+    conn.close()
+    assert temp_db.get_read_connection() is conn
+
+
+def test_pool_keeps_at_most_read_pool_size_idle(temp_db):
+    conns = [temp_db.get_read_connection() for _ in range(temp_db.READ_POOL_SIZE + 3)]
+    for conn in conns:
+        conn.close()
+    assert len(temp_db._read_pool) == temp_db.READ_POOL_SIZE
+
+
+def test_database_uses_wal_and_readers_see_new_commits(temp_db):
+    conn = temp_db.get_db_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+    assert temp_db.get_all_books() == []  # leaves an idle pooled reader
+    temp_db.insert_book('Fresh', 'Author', '1234567890123', 1)
+    assert [b['title'] for b in temp_db.get_all_books()] == ['Fresh']
+
+
+def test_reads_do_not_wait_for_an_open_write_transaction(temp_db):
+    temp_db.insert_book('Committed', 'Author', '1234567890123', 1)
+    writer = sqlite3.connect(temp_db.DATABASE, timeout=0)
+    writer.execute('BEGIN IMMEDIATE')
+    writer.execute("UPDATE books SET available_copies = 0")
+    try:
+        book = temp_db.get_book_by_isbn('1234567890123')
+        assert book['available_copies'] == 1  # last committed state, no lock wait
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_changing_hooks_replaces_idle_readers(temp_db):
+    conn = temp_db.get_read_connection()
+    conn.close()
+    seen = []
+    hook = seen.append
+    temp_db.add_connection_hook(hook)
+    try:
+        assert temp_db.get_read_connection() is not conn
+        assert len(seen) == 1
+    finally:
+        temp_db.remove_connection_hook(hook)
+
+
+def test_unversioned_database_switches_to_wal(tmp_path, monkeypatch):
+    path = str(tmp_path / 'old.db')
+    sqlite3.connect(path).close()
+    monkeypatch.setattr(database, 'DATABASE', path)
+    database.init_database()
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+    database.close_read_connections()
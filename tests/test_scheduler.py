@@ -0,0 +1,161 @@
+# tests/test_scheduler.py
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import scheduler
+from scheduler import Cron, Every, Job, Scheduler
+
+
+def _ts(*args):
+    return datetime(*args).timestamp()
+
+
+@pytest.mark.parametrize('expr, after, expected', [
+    ('30 3 * * *', (2025, 6, 1, 2, 0), (2025, 6, 1, 3, 30)),
+    ('30 3 * * *', (2025, 6, 1, 3, 30), (2025, 6, 2, 3, 30)),
+    ('*/15 * * * *', (2025, 6, 1, 10, 7), (2025, 6, 1, 10, 15)),
+    ('0 9 * * 1-5', (2025, 6, 6, 10, 0), (2025, 6, 9, 9, 0)),     # Friday -> Monday
+    ('0 0 1 * *', (2025, 12, 15, 0, 0), (2026, 1, 1, 0, 0)),
+    ('0 0 29 2 *', (2025, 3, 1, 0, 0), (2028, 2, 29, 0, 0)),
+    ('0 12 13 * 5', (2025, 6, 1, 0, 0), (2025, 6, 6, 12, 0)),      # day 13 OR a Friday
+    ('5/20 * * * 7', (2025, 6, 1, 10, 50), (2025, 6, 1, 11, 5)),   # 7 is Sunday
+])
+def test_cron_next_run(expr, after, expected):
+    assert Cron(expr).next_after(_ts(*after)) == _ts(*expected)
+
+
+@pytest.mark.parametrize('expr', ['* * * *', '60 * * * *', '* * 0 * *', '*/0 * * * *', '5-1 * * * *'])
+def test_cron_rejects_bad_expressions(expr):
+    with pytest.raises(ValueError):
+        Cron(expr)
+
+
+def test_only_the_lease_holder_runs_jobs(temp_db):
+    runs = []
+    jobs = [Job('count', lambda: runs.append(1), Every(60))]
+    a, b = Scheduler(jobs, lease_ttl=30), Scheduler(jobs, lease_ttl=30)
+    now = time.time()
+    assert a.tick(now) == [] and a.leader          # first sighting schedules the job
+    assert b.tick(now + 20) == [] and not b.leader
+    assert a.tick(now + 40) == [] and a.leader     # renewed before b could take over
+    assert b.tick(now + 61) == [] and not b.leader
+    assert a.tick(now + 62) == ['count'] and runs == [1]
+    assert a.tick(now + 63) == []                  # next run is a minute after the last
+    # a stops renewing: b takes over once the lease has expired.
+    assert b.tick(now + 63 + 31) == [] and b.leader
+    assert b.tick(now + 200) == ['count'] and runs == [1, 1]
+    assert temp_db.get_lease('scheduler')['owner'] == b.owner
+
+
+def test_run_records_duration_status_and_errors(temp_db):
+    def _fail():
+        raise RuntimeError('disk full')
+
+    sched = Scheduler([Job('ok', lambda: time.sleep(0.02), Every(10)), Job('bad', _fail, Every(10))])
+    assert sched.run_job(sched.jobs[0]) == 'ok'
+    assert sched.run_job(sched.jobs[1]) == 'error'
+    states = temp_db.get_job_states()
+    assert states['ok']['last_status'] == 'ok' and states['ok']['last_duration'] >= 0.02
+    assert states['ok']['next_run_at'] > time.time() + 9
+    assert (states['bad']['last_error'], states['bad']['failures']) == ('RuntimeError: disk full', 1)
+
+
+def test_timed_out_job_is_not_restarted_while_still_running(temp_db):
+    release, calls = threading.Event(), []
+
+    def _slow():
+        calls.append(1)
+        release.wait(5)
+
+    sched = Scheduler([Job('slow', _slow, Every(1), timeout=0.05)])
+    sched.tick(time.time() - 10)
+    assert sched.tick(time.time() + 5) == ['slow']
+    state = temp_db.get_job_states()['slow']
+    assert state['last_status'] == 'timeout' and state['last_duration'] < 1
+    assert sched.tick(time.time() + 10) == []
+    release.set()
+    time.sleep(0.05)
+    assert sched.tick(time.time() + 20) == ['slow'] and len(calls) == 2
+
+
+def test_lost_lease_stops_the_tick(temp_db):
+    ran = []
+
+    def _lose_lease():
+        ran.append('first')
+        temp_db.acquire_lease('scheduler', 'other', 60, time.time() + 100)  # taken over
+        time.sleep(0.3)
+
+    sched = Scheduler([Job('first', _lose_lease, Every(1)), Job('second', lambda: ran.append('second'), Every(1))],
+                      lease_ttl=0.3)
+    now = time.time()
+    sched.tick(now - 10)
+    assert sched.tick(now) == ['first'] and not sched.leader
+    assert ran == ['first']
+    assert temp_db.get_lease('scheduler')['owner'] == 'other'
+
+
+def test_incomplete_job_is_recorded_as_partial(temp_db):
+    sched = Scheduler([Job('notices', lambda: {'complete': False, 'resume_after': '000042'}, Every(60))])
+    assert sched.run_job(sched.jobs[0]) == 'partial'
+    state = temp_db.get_job_states()['notices']
+    assert state['last_status'] == 'partial' and '000042' in state['last_error']
+
+
+def test_notices_job_resumes_until_complete(temp_db, monkeypatch):
+    from services import notice_service
+
+    calls = []
+    passes = iter([('000010', False), ('000020', False), (None, True)])
+
+    def _generate(as_of=None, time_budget=None, after_patron=None):
+        calls.append(after_patron)
+        resume_after, complete = next(passes)
+        return {'patrons': 10, 'loans': 20, 'queued': 10, 'batches': 1,
+                'complete': complete, 'resume_after': resume_after}
+    monkeypatch.setattr(notice_service, 'generate_notices', _generate)
+    stats = notice_service.run_notices()
+    assert calls == [None, '000010', '000020']
+    assert stats['complete'] and stats['passes'] == 3 and stats['patrons'] == 30
+
+
+def test_scheduler_thread_runs_due_jobs_and_releases_lease(temp_db):
+    done = threading.Event()
+    temp_db.schedule_job('ping', 0)
+    sched = scheduler.start([Job('ping', done.set, Every(3600))], poll_interval=0.01)
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert not sched.running and temp_db.get_lease('scheduler') is None
+
+
+def test_create_app_starts_scheduler_when_enabled(temp_db):
+    from app import create_app
+
+    create_app({'SCHEDULER': False})
+    assert scheduler.get_scheduler() is None
+    create_app({'SCHEDULER': True})
+    try:
+        sched = scheduler.get_scheduler()
+        assert sched is not None and sched.running
+        assert {j.name for j in sched.jobs} >= {'wal_checkpoint', 'optimize', 'archive_loans', 'notices'}
+    finally:
+        scheduler.stop()
+
+
+def test_default_jobs_run(temp_db):
+    sched = Scheduler(scheduler.default_jobs())
+    assert [sched.run_job(job) for job in sched.jobs] == ['ok'] * len(sched.jobs)
+
+
+def test_jobs_command(temp_db):
+    from app import create_app
+
+    runner = create_app({'TESTING': True}).test_cli_runner()
+    result = runner.invoke(args=['jobs', '--run', 'optimize'])
+    assert 'optimize: ok' in result.output and '1 runs' in result.output
+    assert runner.invoke(args=['jobs', '--run', 'nope']).exit_code == 1
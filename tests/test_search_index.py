@@ -0,0 +1,144 @@
+# tests/test_search_index.py
+import sqlite3
+
+import pytest
+
+from app import create_app
+from services import search_index
+
+
+@pytest.fixture
+def catalog(temp_db):
+    temp_db.insert_book('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3)
+    temp_db.insert_book('Great Expectations', 'Charles Dickens', '9780141439563', 1)
+    temp_db.insert_book('Grapes of Wrath', 'John Steinbeck', '9780143039433', 2)
+    temp_db.insert_book('Tender Is the Night', 'F. Scott Fitzgerald', '9780684801544', 1)
+    search_index.reset_index()
+    yield temp_db
+    search_index.reset_index()
+
+
+@pytest.fixture
+def client(catalog):
+    return create_app({'TESTING': True}).test_client()
+
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert search_index.normalize('  Café—Society: A  Novel! ') == 'cafe society a novel'
+
+
+def test_prefix_index_returns_matches_in_key_order():
+    index = search_index.PrefixIndex()
+    for key, value in [('beta', 2), ('alpha', 1), ('alphabet', 3), ('gamma', 4)]:
+        index.add(key, value)
+    assert index.prefix('alp', 10) == [1, 3]
+    assert index.prefix('alp', 1) == [1]
+    assert index.prefix('zeta', 10) == []
+
+
+def test_suggest_titles_and_distinct_authors(client):
+    titles = client.get('/api/suggest?q=gr').get_json()['suggestions']
+    assert [s['title'] for s in titles] == ['Grapes of Wrath', 'Great Expectations']
+
+    authors = client.get('/api/suggest?q=f. scott&type=author').get_json()['suggestions']
+    assert authors == [{'author': 'F. Scott Fitzgerald'}]
+
+
+def test_insert_book_is_indexed_immediately(client, catalog):
+    client.get('/api/suggest?q=x')  # build the index
+    catalog.insert_book('Great Gatsby Annotated', 'Editor', '9780000000001', 1)
+    titles = client.get('/api/suggest?q=great g').get_json()['suggestions']
+    assert [s['title'] for s in titles] == ['Great Gatsby Annotated']
+
+
+def test_sync_picks_up_books_inserted_by_other_processes(catalog):
+    index = search_index.get_index()
+    conn = sqlite3.connect(catalog.DATABASE)
+    conn.execute("INSERT INTO books(title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Graceling', 'Kristin Cashore', '9780152063962', 1, 1)")
+    conn.commit()
+    conn.close()
+    assert index.suggest_titles('grac') == []
+    assert index.sync(force=True) == 1
+    assert len(index.suggest_titles('grac')) == 1
+
+
+def test_stats_report_memory(catalog):
+    stats = search_index.get_index().stats()
+    assert stats['titles'] == 4 and stats['authors'] == 3
+    assert all(n > 0 for n in stats['memory_bytes'].values())
+
+
+@pytest.mark.parametrize('query', ['q=a&type=isbn', 'q=a&limit=0', 'q=a&limit=51'])
+def test_invalid_suggest_parameters(client, query):
+    assert client.get(f'/api/suggest?{query}').status_code == 400
+
+
+def test_inverted_index_and_or_semantics():
+    index = search_index.InvertedIndex()
+    index.add(1, ['great', 'gatsby'])
+    index.add(2, ['great', 'expectations'])
+    index.add(3, ['gatsby', 'annotated'])
+    assert index.search(['gatsby', 'great']) == [1]
+    assert index.search(['gatsby', 'great'], match='any') == [1, 2, 3]
+    assert index.search(['gat']) == [1, 3]  # prefix term
+    assert index.search(['gat'], prefix=False) == []
+    assert index.search(['great', 'missing']) == []
+
+
+def test_inverted_index_keeps_postings_sorted_for_out_of_order_ids():
+    index = search_index.InvertedIndex()
+    for book_id in (5, 2, 9, 7):
+        index.add(book_id, ['word'])
+    assert index.search(['word']) == [2, 5, 7, 9]
+
+
+def test_index_engine_matches_words_in_any_order(catalog):
+    from services import library_service
+
+    results = library_service.search_books_in_catalog('gatsby great', 'title', engine='index')
+    assert [b['title'] for b in results] == ['The Great Gatsby']
+    results = library_service.search_books_in_catalog('scott fitz', 'author', engine='index')
+    assert [b['title'] for b in results] == ['The Great Gatsby', 'Tender Is the Night']
+    results = library_service.search_books_in_catalog('wrath night', 'title', engine='index', match='any')
+    assert [b['title'] for b in results] == ['Grapes of Wrath', 'Tender Is the Night']
+
+
+def test_search_page_uses_configured_engine(catalog):
+    client = create_app({'TESTING': True, 'SEARCH_ENGINE': 'index'}).test_client()
+    html = client.get('/search?q=expectations+great').get_data(as_text=True)
+    assert 'Great Expectations' in html
+    assert 'Gatsby' not in html
+
+
+def test_trigram_similarity_finds_misspelled_words():
+    index = search_index.InvertedIndex()
+    index.add(1, ['fitzgerald'])
+    index.add(2, ['orwell'])
+    index.add(3, ['dickens'])
+    assert [t for t, _ in index.similar_tokens('fitzgerld')] == ['fitzgerald']
+    assert [t for t, _ in index.similar_tokens('orwel')] == ['orwell']
+    assert index.similar_tokens('zzzz') == []
+
+
+def test_fuzzy_ranks_books_by_similarity(catalog):
+    ranked = search_index.get_index().fuzzy('Fitzgerld')
+    assert [book_id for book_id, _ in ranked] == [1, 4]
+    assert 0.3 <= ranked[0][1] < 1.0
+
+    ranked = search_index.get_index().fuzzy('the grate gatsbee')
+    assert ranked[0][0] == 1
+
+
+def test_fuzzy_search_type_through_service_and_api(client, catalog):
+    from services import library_service
+
+    results = library_service.search_books_in_catalog('Steinbek', 'fuzzy')
+    assert [b['title'] for b in results] == ['Grapes of Wrath']
+    assert 'score' in results[0]
+
+    data = client.get('/api/search?q=dickins&type=fuzzy&fields=title').get_json()
+    assert data['results'][0]['title'] == 'Great Expectations'
+    assert set(data['results'][0]) == {'title', 'score'}
+    html = client.get('/search?q=expectatons&type=fuzzy').get_data(as_text=True)
+    assert 'Great Expectations' in html
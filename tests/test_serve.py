@@ -0,0 +1,110 @@
+# tests/test_serve.py
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import serve
+from conftest import PROJECT_ROOT
+
+
+def _get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_pooled_server_serves_app(temp_db):
+    from app import create_app
+
+    app = create_app({'TESTING': True, 'INIT_DATABASE': False})
+    server = serve.PooledWSGIServer('127.0.0.1', 0, app, threads=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        statuses = [_get(server.server_port, '/catalog')[0] for _ in range(5)]
+    finally:
+        server.shutdown()
+        thread.join()
+        server.drain()
+    assert statuses == [200] * 5
+
+
+def test_create_app_can_skip_database_init(tmp_path, monkeypatch):
+    import database
+    from app import create_app
+
+    db_path = tmp_path / 'library.db'
+    monkeypatch.setattr(database, 'DATABASE', str(db_path))
+    create_app({'TESTING': True, 'INIT_DATABASE': False})
+    assert not db_path.exists()
+
+
+def test_post_fork_sets_worker_id(monkeypatch):
+    monkeypatch.delenv('LIBRARY_WORKER_ID', raising=False)
+    serve.post_fork(3)
+    assert os.environ['LIBRARY_WORKER_ID'] == '3'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='pre-fork mode needs os.fork')
+def test_prefork_master_serves_and_shuts_down(tmp_path):
+    proc = subprocess.Popen(
+        [sys.executable, 'serve.py', '--port', '0', '--workers', '2', '--threads', '2',
+         '--db', str(tmp_path / 'library.db')],
+        cwd=PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        line = proc.stdout.readline()
+        port = int(line.split('http://', 1)[1].split()[0].rsplit(':', 1)[1])
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                status, _ = _get(port, '/catalog')
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        assert status == 200
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=15) == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='pre-fork mode needs os.fork')
+def test_fresh_container_restores_snapshot_on_start(temp_db, tmp_path):
+    import backup
+
+    temp_db.insert_book('Snapshot Book', 'Author', '1234567890123', 1)
+    snap = tmp_path / 'library.db.gz'
+    backup.backup_database(str(snap), compress=True)
+    proc = subprocess.Popen(
+        [sys.executable, 'serve.py', '--port', '0', '--workers', '1', '--threads', '2',
+         '--db', str(tmp_path / 'fresh' / 'library.db')],
+        cwd=PROJECT_ROOT, env=dict(os.environ, LIBRARY_RESTORE_FROM=str(snap)),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        assert proc.stdout.readline().startswith(f'Restored {snap}')
+        line = proc.stdout.readline()
+        port = int(line.split('http://', 1)[1].split()[0].rsplit(':', 1)[1])
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                status, body = _get(port, '/catalog')
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        assert status == 200 and b'Snapshot Book' in body
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=15) == 0
@@ -0,0 +1,64 @@
+# tests/test_sqltrace.py
+import logging
+
+import pytest
+
+import database
+import sqltrace
+from app import create_app
+from services import library_service
+
+
+@pytest.fixture
+def tracer(temp_db):
+    tracer = sqltrace.enable(slow_ms=0.0)
+    yield tracer
+    sqltrace.disable()
+
+
+def test_normalize_sql_collapses_literals_and_in_lists():
+    sql = "SELECT * FROM books  WHERE id IN (?, ?, ?) AND title = 'x''y' AND n > 10"
+    assert sqltrace.normalize_sql(sql) == 'SELECT * FROM books WHERE id IN (?...) AND title = ? AND n > ?'
+
+
+def test_param_shape_reports_types_not_values():
+    assert sqltrace.param_shape(('123456', 5)) == '(str, int)'
+    assert sqltrace.param_shape({'id': 1.5}) == '{id: float}'
+    assert sqltrace.param_shape(None) == '()'
+
+
+def test_disabled_tracing_installs_no_hooks():
+    sqltrace.disable()
+    assert sqltrace.get_tracer() is None
+    assert database._connection_hooks == []
+
+
+def test_tracer_aggregates_statements_and_sees_implicit_commits(tracer):
+    database.get_book_by_id(1)
+    database.get_book_by_id(2)
+    database.insert_book('T', 'A', '1234567890123', 1)
+    stats = tracer.stats()
+    by_sql = {s['sql']: s for s in stats['statements']}
+    assert by_sql['SELECT * FROM books WHERE id = ?']['count'] == 2
+    assert by_sql['SELECT * FROM books WHERE id = ?']['param_shape'] == '(int)'
+    assert any(sql.startswith('COMMIT') for sql in stats['sqlite_statements'])
+
+
+def test_slow_queries_are_logged_with_caller(tracer, caplog):
+    with caplog.at_level(logging.WARNING, logger='library.sql'):
+        library_service.get_patron_status_report('123456')
+    messages = [r.getMessage() for r in caplog.records]
+    assert any('caller=library_service.py:get_patron_status_report' in m for m in messages)
+    assert any('params=(str)' in m for m in messages)
+
+
+def test_debug_sql_endpoint(temp_db):
+    app = create_app({'TESTING': True, 'METRICS_ENABLED': False, 'SQL_TRACE': True})
+    try:
+        client = app.test_client()
+        client.get('/catalog')
+        data = client.get('/debug/sql').get_json()
+    finally:
+        sqltrace.disable()
+    assert any(s['sql'] == 'SELECT * FROM books ORDER BY id' for s in data['statements'])
+    assert client.get('/debug/perf').status_code == 404
@@ -0,0 +1,48 @@
+# tests/test_startup.py
+import sqlite3
+
+import database
+from app import create_app
+
+
+def test_init_database_applies_migrations_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'library.db'))
+    assert database.init_database() == database.SCHEMA_VERSION
+    assert database.get_schema_version() == database.SCHEMA_VERSION
+    assert database.init_database() == 0
+
+
+def test_init_database_upgrades_unversioned_database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, '
+                 'author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, '
+                 'available_copies INTEGER NOT NULL)')
+    conn.execute("INSERT INTO books(title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Old', 'Author', '1234567890123', 1, 1)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DATABASE', path)
+
+    database.init_database()
+    assert database.get_schema_version() == database.SCHEMA_VERSION
+    assert [b['title'] for b in database.get_all_books()] == ['Old']
+
+
+def test_create_app_does_not_seed_by_default(temp_db):
+    app = create_app({'TESTING': True})
+    assert temp_db.get_all_books() == []
+    timings = app.extensions['startup_timings']
+    assert {'config', 'schema', 'seed', 'hooks', 'blueprints', 'total'} <= set(timings)
+
+
+def test_create_app_seeds_when_enabled(temp_db):
+    create_app({'TESTING': True, 'SEED_SAMPLE_DATA': True})
+    create_app({'TESTING': True, 'SEED_SAMPLE_DATA': True})
+    assert len(temp_db.get_all_books()) == 3
+
+
+def test_seed_sample_command(temp_db):
+    runner = create_app({'TESTING': True}).test_cli_runner()
+    assert 'Added 3 sample books' in runner.invoke(args=['seed-sample']).output
+    assert 'nothing added' in runner.invoke(args=['seed-sample']).output
@@ -0,0 +1,86 @@
+# tests/test_status_history.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import library_service
+
+START = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def history_db(temp_db):
+    """30 loans for one patron: the older half archived, two sharing a borrow_date."""
+    temp_db.insert_book('Book', 'Author', '1234567890123', 5)
+    conn = temp_db.get_db_connection()
+    dates = [START + timedelta(days=i) for i in range(29)] + [START + timedelta(days=28)]
+    for i, borrowed in enumerate(dates):
+        row = (i + 1, borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat(),
+               (borrowed + timedelta(days=3)).isoformat())
+        if i < 15:
+            conn.execute("INSERT INTO borrow_records_archive(id, patron_id, book_id, borrow_date, due_date, "
+                         "return_date, archived_at) VALUES (?, '123456', 1, ?, ?, ?, ?)", row + (START.isoformat(),))
+        else:
+            conn.execute("INSERT INTO borrow_records(id, patron_id, book_id, borrow_date, due_date, return_date) "
+                         "VALUES (?, '123456', 1, ?, ?, ?)", row)
+    conn.execute("INSERT INTO borrow_records(patron_id, book_id, borrow_date, due_date) "
+                 "VALUES ('654321', 1, ?, ?)", (START.isoformat(), START.isoformat()))
+    conn.commit()
+    conn.close()
+    return temp_db
+
+
+def _all_pages(patron_id, limit):
+    cursor, seen = None, []
+    while True:
+        ok, page = library_service.get_patron_history_page(patron_id, cursor, limit)
+        assert ok, page
+        seen.extend(page['history'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize('limit', [1, 7, 15, 30, 200])
+def test_pages_cover_live_and_archived_loans_once(history_db, limit):
+    rows = _all_pages('123456', limit)
+    assert len(rows) == 30
+    keys = [(r['borrow_date'], r['due_date']) for r in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert rows[-1]['borrow_date'] == START.isoformat()
+    assert {r['isbn'] for r in rows} == {'1234567890123'}
+
+
+def test_rejects_bad_cursor_and_limit(history_db):
+    assert library_service.get_patron_history_page('123456', 'garbage', 5) == (False, 'Invalid history cursor')
+    assert library_service.get_patron_history_page('123456', '\u00b2:2024-01-01', 5) == (False, 'Invalid history cursor')
+    assert not library_service.get_patron_history_page('123456', None, 0)[0]
+    assert not library_service.get_patron_history_page('12345', None, 5)[0]
+    report = library_service.get_patron_status_report('123456', history_cursor='x:y')
+    assert report['error'] == 'Invalid history cursor'
+
+
+def test_status_report_pages_history(history_db):
+    first = library_service.get_patron_status_report('123456', history_limit=20)
+    assert len(first['borrowing_history']) == 20 and first['history_next_cursor']
+    rest = library_service.get_patron_status_report('123456', first['history_next_cursor'], 20)
+    assert len(rest['borrowing_history']) == 10 and rest['history_next_cursor'] is None
+    assert len(library_service.get_patron_status_report('123456')['borrowing_history']) == 30
+
+
+def test_status_page_renders_first_page_with_load_more(history_db):
+    from app import create_app
+
+    client = create_app({'TESTING': True}).test_client()
+    resp = client.get('/status?patron_id=123456')
+    assert resp.status_code == 200
+    html = resp.get_data(as_text=True)
+    assert html.count('<td>[1] Book') == library_service.HISTORY_PAGE_SIZE
+    assert 'Load more' in html and 'history_cursor=' in html
+
+    api = client.get('/api/patrons/123456/history?limit=25').get_json()
+    assert len(api['history']) == 25 and api['next_cursor']
+    last = client.get(f"/api/patrons/123456/history?cursor={api['next_cursor']}").get_json()
+    assert len(last['history']) == 5 and last['next_cursor'] is None
+    assert client.get('/api/patrons/123456/history?cursor=bad').status_code == 400
+    assert client.get('/api/patrons/123456/history?cursor=%C2%B2:2024-01-01T00:00:00').status_code == 400
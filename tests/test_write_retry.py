@@ -0,0 +1,105 @@
+# tests/test_write_retry.py
+import sqlite3
+
+import pytest
+
+import database
+import metrics
+
+
+@pytest.fixture
+def observed():
+    calls = []
+
+    def _observer(operation, retries, waited, succeeded):
+        calls.append((operation, retries, succeeded))
+
+    database.add_retry_observer(_observer)
+    yield calls
+    database.remove_retry_observer(_observer)
+
+
+def _flaky(failures, message='database is locked'):
+    state = {'calls': 0}
+
+    @database.retry_on_busy(attempts=5, base_delay=0.001, max_delay=0.002, deadline=5)
+    def write():
+        state['calls'] += 1
+        if state['calls'] <= failures:
+            raise sqlite3.OperationalError(message)
+        return 'ok'
+    return write, state
+
+
+def test_busy_write_is_retried_until_it_succeeds(observed):
+    write, state = _flaky(2)
+    assert write() == 'ok'
+    assert state['calls'] == 3
+    assert observed == [('write', 2, True)]
+
+
+def test_uncontended_write_is_not_reported(observed):
+    write, _ = _flaky(0)
+    assert write() == 'ok'
+    assert observed == []
+
+
+def test_other_operational_errors_are_not_retried(observed):
+    write, state = _flaky(1, 'no such table: books')
+    with pytest.raises(sqlite3.OperationalError):
+        write()
+    assert state['calls'] == 1
+    assert observed == []
+
+
+def test_gives_up_after_max_attempts(observed):
+    write, state = _flaky(10)
+    with pytest.raises(sqlite3.OperationalError, match='locked'):
+        write()
+    assert state['calls'] == 5
+    assert observed == [('write', 4, False)]
+
+
+def test_deadline_stops_retries_early():
+    calls = []
+
+    @database.retry_on_busy(attempts=100, base_delay=0.05, max_delay=0.05, deadline=0.0)
+    def write():
+        calls.append(1)
+        raise sqlite3.OperationalError('database is locked')
+
+    with pytest.raises(sqlite3.OperationalError):
+        write()
+    assert len(calls) == 1
+
+
+def test_database_write_retries_when_another_connection_holds_the_lock(temp_db, monkeypatch, observed):
+    temp_db.insert_book('Book', 'Author', '1234567890123', 1)
+    book_id = temp_db.get_book_by_isbn('1234567890123')['id']
+    real_connect = temp_db.get_db_connection
+    holder = sqlite3.connect(temp_db.DATABASE)
+    holder.execute('BEGIN IMMEDIATE')
+    attempts = []
+
+    def _no_wait_connection(path=None):
+        conn = real_connect(path)
+        conn.execute('PRAGMA busy_timeout = 0')
+        attempts.append(1)
+        if len(attempts) == 2:
+            holder.rollback()  # released once the first retry connects
+        return conn
+
+    monkeypatch.setattr(temp_db, 'get_db_connection', _no_wait_connection)
+    monkeypatch.setattr(temp_db, 'WRITE_RETRY_BASE_DELAY', 0.001)
+    try:
+        assert temp_db.update_book_availability(book_id, -1)
+    finally:
+        holder.close()
+    assert len(attempts) == 2
+    assert observed == [('update_book_availability', 1, True)]
+
+
+def test_retry_metrics_record_retries_and_wait():
+    metrics._on_retry('insert_borrow_record', 3, 0.02, True)
+    assert metrics.DB_WRITE_RETRIES.collect()[('insert_borrow_record', 'success')] >= 3
+    assert ('insert_borrow_record', 'success') in metrics.DB_LOCK_WAIT.collect()